@@ -0,0 +1,312 @@
+"""
+评测链路吞吐量基准测试
+
+用可调延迟的模拟评测机替换真实评测机,只测量 Python 侧编排
+(submit → 评测队列 → Judge → 解析结果 → update_result_from_pending)的开销。
+
+示例:
+    python benchmark_judge.py --submissions 500 --concurrency 16 --workers 4 --latency-ms 50
+    python benchmark_judge.py --output-format text --output before.json
+    python benchmark_judge.py --daemon --output after.json
+
+结果以 JSON 输出,便于比较不同版本的数据。
+"""
+import os
+import sys
+import json
+import time
+import stat
+import random
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+# 模拟评测机: 支持单次模式(judge,文本或 jsonl 输出)和常驻模式(serve)
+FAKE_JUDGER = r'''
+import os, sys, json, time, random
+
+LATENCY = float(os.getenv("FAKE_JUDGER_LATENCY_MS", "50")) / 1000
+JITTER = float(os.getenv("FAKE_JUDGER_JITTER_MS", "0")) / 1000
+TESTCASES = int(os.getenv("FAKE_JUDGER_TESTCASES", "5"))
+AC_RATIO = float(os.getenv("FAKE_JUDGER_AC_RATIO", "0.6"))
+
+
+def verdict():
+    status = "Accepted" if random.random() < AC_RATIO else "WrongAnswer"
+    cases = TESTCASES if status == "Accepted" else random.randint(1, TESTCASES)
+    return status, cases
+
+
+def judge_jsonl():
+    status, cases = verdict()
+    max_time = 0
+    for index in range(1, cases + 1):
+        time.sleep(max(LATENCY + random.uniform(-JITTER, JITTER), 0) / TESTCASES)
+        case_status = status if index == cases else "Accepted"
+        case_time = round(random.uniform(1, 100), 1)
+        max_time = max(max_time, case_time)
+        print(json.dumps({"type": "testcase", "index": index, "status": case_status,
+                          "time_ms": case_time, "memory_bytes": 4096 * index}), flush=True)
+    print(json.dumps({"type": "summary", "status": status, "time_ms": max_time,
+                      "memory_bytes": 4096 * cases}), flush=True)
+
+
+def judge_text():
+    status, cases = verdict()
+    time.sleep(max(LATENCY + random.uniform(-JITTER, JITTER), 0))
+    print("Compiling...")
+    print(f"Running {cases} testcases")
+    print(status)
+    print(f"Max time: {round(random.uniform(1, 100), 1)}ms, Max memory: {4096 * cases} bytes")
+
+
+if sys.argv[1] == "serve":
+    for line in sys.stdin:
+        judge_jsonl()
+elif "--output-format" in sys.argv:
+    judge_jsonl()
+else:
+    judge_text()
+'''
+
+
+def percentiles(values):
+    """最近秩法计算 p50/p95/p99,单位与输入一致"""
+    if not values:
+        return {"count": 0, "p50": None, "p95": None, "p99": None, "mean": None, "max": None}
+    values = sorted(values)
+
+    def rank(p):
+        return values[min(len(values) - 1, max(0, int(round(p / 100 * len(values))) - 1))]
+
+    return {
+        "count": len(values),
+        "p50": rank(50),
+        "p95": rank(95),
+        "p99": rank(99),
+        "mean": sum(values) / len(values),
+        "max": values[-1],
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="评测链路吞吐量基准测试")
+    parser.add_argument("--submissions", type=int, default=200, help="提交总数")
+    parser.add_argument("--users", type=int, default=20, help="用户数")
+    parser.add_argument("--problems", type=int, default=5, help="题目数")
+    parser.add_argument("--contests", type=int, default=1, help="进行中的比赛数,所有用户参加所有比赛")
+    parser.add_argument("--contest-ratio", type=float, default=0.5, help="比赛提交占比")
+    parser.add_argument("--concurrency", type=int, default=8, help="并发提交的客户端数")
+    parser.add_argument("--workers", type=int, default=4, help="评测 worker 线程数")
+    parser.add_argument("--inline", action="store_true", help="在提交请求内直接评测(JUDGE_INLINE)")
+    parser.add_argument("--daemon", action="store_true", help="使用常驻评测机(JUDGER_DAEMON)")
+    parser.add_argument("--output-format", choices=["jsonl", "text"], default="jsonl", help="评测机输出格式")
+    parser.add_argument("--latency-ms", type=float, default=50, help="模拟评测耗时(毫秒)")
+    parser.add_argument("--jitter-ms", type=float, default=10, help="评测耗时的随机抖动(毫秒)")
+    parser.add_argument("--testcases", type=int, default=5, help="每个提交的测试点数")
+    parser.add_argument("--ac-ratio", type=float, default=0.6, help="通过的比例")
+    parser.add_argument("--dedup-window", type=int, default=0, help="SUBMIT_DEDUP_WINDOW,默认关闭去重")
+    parser.add_argument("--judger", default=None, help="使用自定义的模拟评测机,而不是内置脚本")
+    parser.add_argument("--timeout", type=float, default=600, help="等待全部出结果的最长时间(秒)")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    parser.add_argument("--output", default=None, help="结果写入的 JSON 文件,默认输出到标准输出")
+    return parser.parse_args()
+
+
+def prepare_environment(args, workdir):
+    """在导入 online_judge 之前设置环境变量,使用独立的数据库和评测机目录"""
+    judger_path = os.path.join(workdir, "judger")
+    binary = args.judger or os.path.join(judger_path, "target", "bench", "judger")
+    if not args.judger:
+        os.makedirs(os.path.dirname(binary))
+        with open(binary, "w") as f:
+            f.write(f"#!{sys.executable}\n{FAKE_JUDGER}")
+        os.chmod(binary, os.stat(binary).st_mode | stat.S_IEXEC)
+    os.makedirs(judger_path, exist_ok=True)
+
+    os.environ["DATABASE_FILE"] = os.path.join(workdir, "benchmark.db")
+    os.environ["JUDGER_PATH"] = judger_path
+    os.environ["JUDGER_BINARY"] = binary
+    os.environ["COMPILE_CACHE_DIR"] = ""
+    os.environ["FAKE_JUDGER_LATENCY_MS"] = str(args.latency_ms)
+    os.environ["FAKE_JUDGER_JITTER_MS"] = str(args.jitter_ms)
+    os.environ["FAKE_JUDGER_TESTCASES"] = str(args.testcases)
+    os.environ["FAKE_JUDGER_AC_RATIO"] = str(args.ac_ratio)
+
+
+def seed_data(args):
+    from flask_jwt_extended import create_access_token
+    from online_judge import db
+    from online_judge.models import Problem, Contest, ContestUser
+
+    db.drop_all()
+    db.create_all()
+    problems = [Problem(title=f"Problem {i}", statement="benchmark", user_id=1, user_name="admin",
+                        difficulty=1, is_public=True) for i in range(1, args.problems + 1)]
+    db.session.add_all(problems)
+    contests = [Contest(title=f"Contest {i}", start_time=datetime.now() - timedelta(hours=1),
+                        end_time=datetime.now() + timedelta(hours=5), holder_id=1, holder_name="admin")
+                for i in range(1, args.contests + 1)]
+    db.session.add_all(contests)
+    db.session.commit()
+    for contest in contests:
+        contest.problems = problems
+        db.session.add_all([ContestUser(contest_id=contest.id, user_id=uid) for uid in range(1, args.users + 1)])
+    db.session.commit()
+
+    tokens = {
+        uid: create_access_token(identity=str(uid), expires_delta=timedelta(days=1),
+                                 additional_claims={"aud": str(uid), "power": "1", "username": f"user{uid}"})
+        for uid in range(1, args.users + 1)
+    }
+    return [p.id for p in problems], [c.id for c in contests], tokens
+
+
+def run_benchmark(args):
+    from sqlalchemy import event
+    from online_judge import app, db
+    from online_judge.models import Submission, JudgeTask
+    from online_judge.judge import run_worker
+
+    app.config['TESTING'] = True
+    app.config['JUDGE_INLINE'] = args.inline
+    app.config['JUDGER_DAEMON'] = args.daemon
+    app.config['JUDGER_OUTPUT_FORMAT'] = args.output_format
+    app.config['SUBMIT_DEDUP_WINDOW'] = args.dedup_window
+    app.config['JUDGE_POLL_INTERVAL'] = 0.01
+    random.seed(args.seed)
+
+    # 按线程所处阶段统计事务提交次数
+    phase = threading.local()
+    commits = {"submit": 0, "judge": 0, "other": 0}
+    commits_lock = threading.Lock()
+
+    def count_commit(session):
+        with commits_lock:
+            commits[getattr(phase, "name", "other")] += 1
+
+    with app.app_context():
+        problem_ids, contest_ids, tokens = seed_data(args)
+        db.session.remove()
+    event.listen(db.session, "after_commit", count_commit)
+
+    stop_event = threading.Event()
+
+    def worker(index):
+        phase.name = "judge"
+        with app.app_context():
+            run_worker(worker_id=f"bench-w{index}", stop_event=stop_event)
+
+    workers = []
+    if not args.inline:
+        for index in range(args.workers):
+            thread = threading.Thread(target=worker, args=(index,), daemon=True)
+            thread.start()
+            workers.append(thread)
+
+    plan = []
+    for _ in range(args.submissions):
+        in_contest = contest_ids and random.random() < args.contest_ratio
+        plan.append({
+            "user_id": random.randint(1, args.users),
+            "problem_id": random.choice(problem_ids),
+            "contest_id": random.choice(contest_ids) if in_contest else 0,
+            "code": f"int main() {{ return {random.randint(0, 10 ** 9)}; }}",
+        })
+
+    submit_times = {}
+    submit_latency = []
+    errors = []
+    record_lock = threading.Lock()
+
+    def submit(item):
+        phase.name = "submit"
+        client = app.test_client()
+        sent = time.time()
+        start = time.perf_counter()
+        resp = client.post('/api/problem/submit', json={
+            'problem_id': item["problem_id"],
+            'contest_id': item["contest_id"],
+            'code': item["code"],
+            'language': 'cpp',
+        }, headers={'token': tokens[item["user_id"]]})
+        elapsed = (time.perf_counter() - start) * 1000
+        with record_lock:
+            if resp.status_code != 200:
+                errors.append({"status_code": resp.status_code, "body": resp.get_data(as_text=True)[:200]})
+                return
+            submit_latency.append(elapsed)
+            submit_times[resp.json["submission_id"]] = sent
+
+    started = time.time()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(submit, plan))
+    submitted = time.time()
+
+    # 等待全部出结果
+    with app.app_context():
+        deadline = time.time() + args.timeout
+        while time.time() < deadline:
+            pending = Submission.query.filter_by(status="Pending").count()
+            db.session.remove()
+            if pending == 0:
+                break
+            time.sleep(0.05)
+    finished = time.time()
+    stop_event.set()
+    for thread in workers:
+        thread.join()
+    event.remove(db.session, "after_commit", count_commit)
+
+    with app.app_context():
+        rows = db.session.query(Submission.id, Submission.status, JudgeTask.finish_time) \
+            .outerjoin(JudgeTask, JudgeTask.submission_id == Submission.id).all()
+        db.session.remove()
+    status_counts = {}
+    time_to_verdict = []
+    last_verdict = started
+    for submission_id, status, finish_time in rows:
+        status_counts[status] = status_counts.get(status, 0) + 1
+        if finish_time is not None and submission_id in submit_times and status != "Pending":
+            finish = finish_time.timestamp()
+            last_verdict = max(last_verdict, finish)
+            time_to_verdict.append((finish - submit_times[submission_id]) * 1000)
+
+    judged = len(rows) - status_counts.get("Pending", 0)
+    total_commits = sum(commits.values())
+    return {
+        "config": vars(args),
+        "submissions": len(submit_times),
+        "errors": errors[:10],
+        "error_count": len(errors),
+        "status_counts": status_counts,
+        "submit_phase_seconds": submitted - started,
+        "total_seconds": finished - started,
+        "verdicts_per_minute": judged * 60 / (last_verdict - started) if last_verdict > started else None,
+        "submit_latency_ms": percentiles(submit_latency),
+        "time_to_verdict_ms": percentiles(time_to_verdict),
+        "db_commits": {
+            "total": total_commits,
+            "submit": commits["submit"],
+            "judge": commits["judge"],
+            "per_submission": total_commits / len(submit_times) if submit_times else None,
+        },
+    }
+
+
+def main():
+    args = parse_args()
+    with tempfile.TemporaryDirectory(prefix="judge-bench-") as workdir:
+        prepare_environment(args, workdir)
+        result = run_benchmark(args)
+    text = json.dumps(result, indent=2, ensure_ascii=False, default=str)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+提交记录读取量基准测试
+
+比较 Submission 源代码/编译信息列在立即加载(改动前的映射)和延迟加载(默认)两种方式下,
+常见读取路径每次请求从数据库读入的字节数和耗时:
+    - listing_page: 以 ORM 对象读取一页提交记录(列表类接口)
+    - status_check: 按ID读取提交并检查状态(评测 worker 抢占任务后、写回后刷新)
+    - detail: 详情接口,使用 get_with_source 显式加载源代码
+
+示例:
+    python benchmark_submission_listing.py --submissions 500 --code-kb 100 --page-size 20
+    python benchmark_submission_listing.py --output listing.json
+
+结果以 JSON 输出,便于比较不同版本的数据。
+"""
+import os
+import json
+import time
+import random
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="提交记录读取量基准测试")
+    parser.add_argument("--submissions", type=int, default=200, help="提交总数")
+    parser.add_argument("--code-kb", type=float, default=100, help="每份源代码的大小(KB)")
+    parser.add_argument("--ce-kb", type=float, default=4, help="每条编译信息的大小(KB)")
+    parser.add_argument("--page-size", type=int, default=20, help="列表每页条数")
+    parser.add_argument("--seed", type=int, default=0, help="生成源代码的随机种子")
+    parser.add_argument("--repeat", type=int, default=50, help="每种读取路径重复的次数")
+    parser.add_argument("--output", default=None, help="结果写入的 JSON 文件,默认输出到标准输出")
+    return parser.parse_args()
+
+
+SOURCE_KEYWORDS = ["int", "long long", "for", "while", "if", "else", "return", "auto", "const", "vector<int>",
+                   "std::sort", "std::min", "std::max", "cin >>", "cout <<", "break", "continue"]
+
+
+def random_source(rng, size):
+    """生成约 size 字节、互不相同的类 C++ 源代码
+
+    重复字符压缩后几乎不占空间,相同代码又会被 source_blob 去重,都无法反映真实提交的读取量;
+    这里用随机的标识符、关键字和数字拼成代码行,压缩率接近真实源代码。
+    """
+    lines = []
+    length = 0
+    while length < size:
+        depth = rng.randint(0, 3)
+        words = [rng.choice(SOURCE_KEYWORDS) if rng.random() < 0.4 else
+                 "".join(rng.choice("abcdefghijklmnopqrstuvwxyz_") for _ in range(rng.randint(1, 8)))
+                 for _ in range(rng.randint(2, 7))]
+        operator = rng.choice(["=", "+=", "<", "==", "-", "*", "%"])
+        line = "    " * depth + " ".join(words) + f" {operator} {rng.randint(0, 10 ** rng.randint(1, 9))};"
+        lines.append(line)
+        length += len(line) + 1
+    return "\n".join(lines)[:size]
+
+
+def seed_data(args):
+    from online_judge import db
+    from online_judge.models import Problem, Submission
+
+    db.drop_all()
+    db.create_all()
+    db.session.add(Problem(title="Problem 1", statement="benchmark", user_id=1, user_name="admin",
+                           difficulty=1, is_public=True))
+    db.session.commit()
+    rng = random.Random(args.seed)
+    code_size = int(args.code_kb * 1024)
+    ce_info = "e" * int(args.ce_kb * 1024)
+    start = datetime.now() - timedelta(days=1)
+    for i in range(args.submissions):
+        submission = Submission(code=random_source(rng, code_size), language="cpp", user_id=1 + i % 20, problem_id=1, contest_id=None,
+                                submit_time=start + timedelta(seconds=i))
+        submission.status = "CompileError" if i % 10 == 0 else "Accepted"
+        submission.compile_error_info = ce_info if i % 10 == 0 else ""
+        db.session.add(submission)
+    db.session.commit()
+
+
+def loaded_bytes(objects):
+    """已加载到对象中的列值的字节数(包括一并加载的 source_blob),未加载的延迟列不计入"""
+    total = 0
+    for obj in objects:
+        for key, value in vars(obj).items():
+            if key == "_sa_instance_state" or key == "_source" or value is None:
+                continue
+            if isinstance(value, str):
+                total += len(value.encode("utf-8"))
+            elif isinstance(value, bytes):
+                total += len(value)
+            elif hasattr(value, "_sa_instance_state"):
+                total += loaded_bytes([value])
+            else:
+                total += 8
+    return total
+
+
+def measure(args, load):
+    from online_judge import db
+
+    elapsed, read = [], []
+    for i in range(args.repeat):
+        db.session.expunge_all()
+        begin = time.perf_counter()
+        objects = load(i)
+        elapsed.append((time.perf_counter() - begin) * 1000)
+        read.append(loaded_bytes(objects))
+    return {
+        "bytes_per_request": sum(read) / len(read),
+        "mean_ms": round(sum(elapsed) / len(elapsed), 3),
+    }
+
+
+def run_benchmark(args):
+    from sqlalchemy.orm import undefer_group, joinedload
+    from online_judge import app, db
+    from online_judge.models import Submission
+
+    with app.app_context():
+        seed_data(args)
+        newest = args.submissions
+        # 立即加载即改动前的映射: 每次读取 Submission 都带上源代码和编译信息
+        modes = {"eager": [undefer_group("source"), joinedload(Submission.blob)], "deferred": []}
+        result = {"config": vars(args), "paths": {}}
+        for mode, options in modes.items():
+            paths = {
+                "listing_page": lambda i: Submission.query.options(*options)
+                    .order_by(Submission.submit_time.desc(), Submission.id.desc())
+                    .limit(args.page_size).all(),
+                "status_check": lambda i: [db.session.get(Submission, newest - i % newest, options=options)],
+                "detail": lambda i: [Submission.get_with_source(newest - i % newest)],
+            }
+            for name, load in paths.items():
+                result["paths"].setdefault(name, {})[mode] = measure(args, load)
+        db.drop_all()
+    return result
+
+
+def main():
+    args = parse_args()
+    with tempfile.TemporaryDirectory(prefix="listing-bench-") as workdir:
+        # 在导入 online_judge 之前设置,使用独立的数据库
+        os.environ["DATABASE_FILE"] = os.path.join(workdir, "benchmark.db")
+        result = run_benchmark(args)
+    text = json.dumps(result, indent=2, ensure_ascii=False, default=str)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -27,7 +27,71 @@ else:
 db_path = os.path.join(os.path.dirname(app.root_path), os.getenv('DATABASE_FILE', 'data.db'))
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev')
 app.config['SQLALCHEMY_DATABASE_URI'] = sqlite_prefix + db_path
+# 旧提交的归档库,单独的数据库文件,只在读取归档数据时打开
+archive_db_path = os.path.join(os.path.dirname(app.root_path), os.getenv('ARCHIVE_DATABASE_FILE', 'archive.db'))
+app.config['SQLALCHEMY_BINDS'] = {'archive': sqlite_prefix + archive_db_path}
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# 多个评测进程并发写库时等待锁释放,而不是立即报 database is locked
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'connect_args': {'timeout': 30}}
+
+# 评测队列配置
+app.config['JUDGE_INLINE'] = os.getenv('JUDGE_INLINE', '0') == '1'  # 是否在提交请求内直接评测(开发/测试用)
+app.config['JUDGE_LEASE_SECONDS'] = int(os.getenv('JUDGE_LEASE_SECONDS', '60'))  # worker 抢占任务的租约时长
+app.config['JUDGE_POLL_INTERVAL'] = float(os.getenv('JUDGE_POLL_INTERVAL', '0.5'))  # 队列为空时的轮询间隔
+app.config['JUDGE_MAX_ATTEMPTS'] = int(os.getenv('JUDGE_MAX_ATTEMPTS', '3'))  # 单个任务最多被抢占评测的次数
+app.config['JUDGE_WORKERS'] = int(os.getenv('JUDGE_WORKERS', '0'))  # 评测进程数,0 表示物理核心数
+app.config['JUDGE_PRACTICE_MAX_WAIT'] = float(os.getenv('JUDGE_PRACTICE_MAX_WAIT', '30'))  # practice 通道最长等待(秒),超过后可以插队
+app.config['JUDGE_PRACTICE_BOOST_EVERY'] = int(os.getenv('JUDGE_PRACTICE_BOOST_EVERY', '4'))  # 每评测多少个任务最多让一个超时的 practice 任务插队
+app.config['JUDGER_OUTPUT_FORMAT'] = os.getenv('JUDGER_OUTPUT_FORMAT', 'text')  # text: 旧版文本输出; jsonl: 逐测试点的结构化输出
+app.config['JUDGER_PROFILE'] = os.getenv('JUDGER_PROFILE', 'debug')  # 评测机的构建配置,对应 $JUDGER_PATH/target/<profile>/judger
+app.config['JUDGER_BINARY'] = os.getenv('JUDGER_BINARY', '')  # 评测机可执行文件的完整路径,设置后忽略 JUDGER_PROFILE
+app.config['JUDGER_DAEMON'] = os.getenv('JUDGER_DAEMON', '0') == '1'  # 是否使用常驻评测机进程(judger serve)
+app.config['JUDGER_DAEMON_MAX_JOBS'] = int(os.getenv('JUDGER_DAEMON_MAX_JOBS', '200'))  # 常驻评测机处理多少个任务后重启
+app.config['JUDGE_REPORT_INTERVAL'] = int(os.getenv('JUDGE_REPORT_INTERVAL', '60'))  # supervisor 输出统计的间隔(秒)
+app.config['SUBMIT_DEDUP_WINDOW'] = int(os.getenv('SUBMIT_DEDUP_WINDOW', '300'))  # 相同代码重复提交沿用已有结果的时间窗口(秒),0 表示关闭
+app.config['SUBMIT_DEDUP_IN_CONTEST'] = os.getenv('SUBMIT_DEDUP_IN_CONTEST', '1') == '1'  # 比赛提交是否也去重
+
+# 提交状态推送配置
+app.config['SUBMISSION_STREAM_POLL_INTERVAL'] = float(os.getenv('SUBMISSION_STREAM_POLL_INTERVAL', '0.5'))  # 所有订阅共享的状态轮询间隔(秒)
+app.config['SUBMISSION_STREAM_KEEPALIVE'] = float(os.getenv('SUBMISSION_STREAM_KEEPALIVE', '15'))  # SSE 心跳间隔(秒)
+app.config['SUBMISSION_STREAM_MAX_IDS'] = int(os.getenv('SUBMISSION_STREAM_MAX_IDS', '50'))  # 单个连接最多订阅的提交数
+app.config['SUBMISSION_WAIT_MAX_TIMEOUT'] = float(os.getenv('SUBMISSION_WAIT_MAX_TIMEOUT', '60'))  # 长轮询最长等待(秒)
+
+# 排行榜缓存配置
+app.config['RANKLIST_CACHE_SIZE'] = int(os.getenv('RANKLIST_CACHE_SIZE', '128'))  # 每个进程最多缓存多少场比赛的排行榜
+app.config['RANKLIST_CACHE_DIR'] = os.getenv('RANKLIST_CACHE_DIR', '')  # 多进程共享的排行榜缓存目录,为空时只使用进程内缓存
+app.config['RANKLIST_PAGE_SIZE'] = int(os.getenv('RANKLIST_PAGE_SIZE', '50'))  # 排行榜默认每页人数
+app.config['RANKLIST_MAX_PAGE_SIZE'] = int(os.getenv('RANKLIST_MAX_PAGE_SIZE', '200'))
+app.config['RANKLIST_MAX_NEIGHBOURS'] = int(os.getenv('RANKLIST_MAX_NEIGHBOURS', '20'))  # 查询自己名次时最多返回前后多少名
+
+# 实时排行榜配置
+app.config['SCOREBOARD_FREEZE_MINUTES'] = int(os.getenv('SCOREBOARD_FREEZE_MINUTES', '0'))  # 比赛最后多少分钟封榜,0 表示不封榜
+app.config['SCOREBOARD_POLL_INTERVAL'] = float(os.getenv('SCOREBOARD_POLL_INTERVAL', '1'))  # 同一比赛的所有连接共享的事件读取间隔(秒)
+app.config['SCOREBOARD_KEEPALIVE'] = float(os.getenv('SCOREBOARD_KEEPALIVE', '15'))  # SSE 心跳间隔(秒)
+
+# 参赛者名单导入配置
+app.config['ROSTER_IMPORT_CHUNK_SIZE'] = int(os.getenv('ROSTER_IMPORT_CHUNK_SIZE', '500'))  # 每条语句处理的用户数,需小于 SQLite 的绑定参数上限(旧版本为 999)
+
+# 比赛提交记录列表配置
+app.config['SUBMISSION_FEED_LIMIT'] = int(os.getenv('SUBMISSION_FEED_LIMIT', '100'))  # 游标分页的默认每页条数
+app.config['SUBMISSION_FEED_MAX_LIMIT'] = int(os.getenv('SUBMISSION_FEED_MAX_LIMIT', '1000'))
+app.config['SUBMISSION_FEED_BATCH_SIZE'] = int(os.getenv('SUBMISSION_FEED_BATCH_SIZE', '500'))  # NDJSON 流式导出时每批读取的行数
+
+# 提交记录筛选配置
+app.config['SUBMISSION_FILTER_LIMIT'] = int(os.getenv('SUBMISSION_FILTER_LIMIT', '20'))  # /api/submission/filter 默认每页条数
+app.config['SUBMISSION_FILTER_MAX_LIMIT'] = int(os.getenv('SUBMISSION_FILTER_MAX_LIMIT', '100'))
+
+# 用户做题进度配置
+app.config['USER_PROGRESS_MAX_IDS'] = int(os.getenv('USER_PROGRESS_MAX_IDS', '500'))  # 单次查询最多的题目数
+
+# 提交记录归档配置
+app.config['SUBMISSION_ARCHIVE_DAYS'] = int(os.getenv('SUBMISSION_ARCHIVE_DAYS', '180'))  # 超过多少天的提交移入归档库
+
+# 编译结果缓存配置
+app.config['COMPILE_CACHE_DIR'] = os.getenv('COMPILE_CACHE_DIR', os.path.join(os.path.dirname(app.root_path), 'compile_cache'))  # 为空时禁用
+app.config['COMPILE_CACHE_MAX_BYTES'] = int(os.getenv('COMPILE_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+app.config['JUDGE_COMPILE_FLAGS'] = os.getenv('JUDGE_COMPILE_FLAGS', '')  # 评测机的编译参数,参与缓存key计算,修改后旧缓存自动失效
+app.config['COMPILE_CACHE_BINARIES'] = os.getenv('COMPILE_CACHE_BINARIES', '0') == '1'  # 评测机支持 --binary-path 时开启,缓存编译成功的可执行文件
 
 
 app.config["JWT_SECRET_KEY"] = '123456'
@@ -47,6 +111,9 @@ from .models import *
 from .click import *
 
 register_commands(app)
+register_judge_commands(app)
+register_migrate_commands(app)
+register_archive_commands(app)
 @app.route("/protected", methods=["GET"])
 @jwt_required()
 def protected():
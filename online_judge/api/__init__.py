@@ -13,4 +13,4 @@ from .problem import *
 from .submission import *
 from .homework import *
 from .questions import *
-
+from .judge import *
\ No newline at end of file
@@ -1,3 +1,4 @@
 from .show import *
 from .update import *
-from .gen_contest import *
\ No newline at end of file
+from .gen_contest import *
+from .scoreboard import *
\ No newline at end of file
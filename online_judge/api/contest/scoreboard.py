@@ -0,0 +1,130 @@
+from flask import Response,jsonify,stream_with_context
+from online_judge import app,db,jwt_required,get_jwt
+from online_judge.api import User
+from online_judge.models.contests import Contest
+from online_judge.models.ranklist_cache import ranklist_cache
+from online_judge.models.scoreboard import scoreboard_feed, is_frozen, is_frozen_event, frozen_ranklist
+from datetime import datetime
+import time
+
+
+def scoreboard_snapshot(contest, now=None):
+    """当前可公开的排行榜,封榜期间为封榜时的排行榜"""
+    if is_frozen(contest, now):
+        return True, frozen_ranklist(contest)
+    return False, ranklist_cache.get_entry(contest).ranklist
+
+
+def with_rank(contest, delta, now=None):
+    """为增量附带用户当前的通过题数、罚时和名次,封榜期间不附带以免泄露封榜后的成绩"""
+    if is_frozen(contest, now):
+        return delta
+    row = ranklist_cache.get_entry(contest).lookup(delta["user_id"])
+    if row is None:
+        return delta
+    return dict(delta, score=row["score"], penalty=row["penalty"], rank=row["rank"])
+
+
+def sse(event, data):
+    return f"event: {event}\ndata: {app.json.dumps(data)}\n\n"
+
+
+@app.route('/api/contest/scoreboard/stream/<int:contest_id>', methods=['GET'])
+@jwt_required()
+def stream_scoreboard(contest_id):
+    """
+    (要求jwt_token)
+    以 Server-Sent Events 推送实时排行榜,供投影和观众使用,替代定时刷新 getinfo
+
+    连接建立后先推送一次完整排行榜(ranklist 事件),之后每次评测结果改变某个参赛者某道题的成绩时
+    推送一条增量(delta 事件);重测、增删参赛者或题目时重新推送完整排行榜。
+    所有连接共享按比赛缓存的事件读取和排行榜,连接数增加不会增加排行榜计算。
+
+    封榜(SCOREBOARD_FREEZE_MINUTES > 0): 比赛最后若干分钟内提交引起的增量暂不推送,
+    排行榜为封榜时的状态,比赛结束后推送一次完整的最终排行榜(ranklist 事件)。
+    /api/contest/ranklist、myrank、stats 和 getinfo 在封榜期间同样只返回封榜时的状态。
+
+    Args:
+        contest_id (int): 路径参数,比赛唯一标识符
+
+    Returns:
+        text/event-stream: 事件格式：
+            event: ranklist
+            data: {"frozen": false, "last_event_id": 12, "ranklist": [...]}   // 格式同 /api/contest/ranklist 中的行
+
+            event: delta
+            data: {
+                "event_id": 13,
+                "kind": "delta",
+                "user_id": 2,
+                "problem_id": 1,
+                "solve_time": 95,       // 通过时间(分钟),未通过为 -1
+                "attempts": 1,          // 通过前的错误次数
+                "submit_time": "Wed, 26 Feb 2025 09:35:00 GMT",
+                "score": 3,             // 以下三项为用户当前成绩,封榜期间不附带
+                "penalty": 260,
+                "rank": 4
+            }
+        空闲时定期发送 ": keepalive" 注释行保持连接。
+    """
+    user = User(get_jwt())
+    contest = Contest.query.filter_by(id=contest_id).first()
+    if contest is None:
+        return jsonify({"error": "contest not found"}), 404
+    if not contest.is_allowed_view(user):
+        return jsonify({"error": f"user_id = {user.id} can't view contest(id = {contest_id})"}), 404
+
+    poll_interval = app.config['SCOREBOARD_POLL_INTERVAL']
+    keepalive = app.config['SCOREBOARD_KEEPALIVE']
+
+    def generate():
+        # 先读游标再取排行榜,两者之间的事件会重复推送一次;增量为该题的最新成绩,重复应用不影响结果
+        cursor = scoreboard_feed.latest_id(contest_id)
+        contest = db.session.get(Contest, contest_id)
+        frozen, ranklist = scoreboard_snapshot(contest)
+        yield sse("ranklist", {"frozen": frozen, "last_event_id": cursor, "ranklist": ranklist})
+        end_time = contest.end_time
+        last_sent = time.monotonic()
+        held = []  # 封榜期间暂不推送的增量
+        try:
+            while True:
+                messages = []
+                events = scoreboard_feed.events_after(contest_id, cursor)
+                now = datetime.now()
+                # 比赛结束时若推送过封榜排行榜或有暂存的增量,改为重新推送完整排行榜:
+                # 连接之前的封榜期间成绩不在 held 中,只补发 held 会遗漏
+                release = (frozen or bool(held)) and now >= end_time
+                if events or release:
+                    # 每轮重新读取比赛,取得最新的排行榜版本号
+                    contest = db.session.get(Contest, contest_id)
+                for event in events:
+                    cursor = event["event_id"]
+                    if event["kind"] == "reset":
+                        frozen, ranklist = scoreboard_snapshot(contest, now)
+                        messages.append(sse("ranklist", {"frozen": frozen, "last_event_id": cursor,
+                                                         "ranklist": ranklist}))
+                    elif is_frozen_event(contest, event, now):
+                        held.append(event)
+                    else:
+                        messages.append(sse("delta", with_rank(contest, event, now)))
+                if release:
+                    frozen, ranklist = scoreboard_snapshot(contest, now)
+                    messages.append(sse("ranklist", {"frozen": frozen, "last_event_id": cursor,
+                                                     "ranklist": ranklist}))
+                    held = []
+                # 结束本轮的读事务,避免长连接一直持有数据库快照
+                db.session.remove()
+
+                for message in messages:
+                    yield message
+                if messages:
+                    last_sent = time.monotonic()
+                elif time.monotonic() - last_sent >= keepalive:
+                    yield ": keepalive\n\n"
+                    last_sent = time.monotonic()
+                time.sleep(poll_interval)
+        finally:
+            db.session.remove()
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
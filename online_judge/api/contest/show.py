@@ -1,11 +1,102 @@
-from flask import Flask,jsonify,request
-from online_judge import app,jwt,jwt_required,get_jwt
+from flask import Flask,Response,jsonify,request,stream_with_context
+from online_judge import app,db,jwt,jwt_required,get_jwt
 from online_judge.api import User
 from online_judge.models.problems import Problem
 from online_judge.models.submissions import Submission
-from online_judge.models.contests import Contest,ContestUser
+from online_judge.models.contests import Contest,ContestUser,ContestUserProblem,ContestProblemStat,contest_problem
+from online_judge.models.ranklist_cache import ranklist_cache
+from online_judge.models.scoreboard import is_frozen, frozen_state, freeze_start
+from online_judge.models.archive import ArchivedSubmission,merge_tiers,archive_available
+from sqlalchemy import and_
+from itertools import islice
 import json
 
+def parse_page_args():
+    """解析分页参数,非法时返回 (None, None)"""
+    page = request.args.get('page', 1, type=int)
+    size = request.args.get('size', app.config['RANKLIST_PAGE_SIZE'], type=int)
+    if page < 1 or size < 1:
+        return None, None
+    return page, min(size, app.config['RANKLIST_MAX_PAGE_SIZE'])
+
+def hides_frozen(contest, user):
+    """封榜期间除比赛管理者外只能看到封榜时的排行榜和统计"""
+    return is_frozen(contest) and not contest.is_allowed_edit(user)
+
+def frozen_response(data):
+    """封榜视图的 ETag 由内容生成,不随封榜后的评测结果变化"""
+    response = jsonify(dict(data, frozen=True))
+    response.add_etag()
+    return response.make_conditional(request)
+
+# 提交记录列表只查询这些列,不加载源代码和编译信息
+SUBMISSION_FEED_COLUMNS = ("id", "problem_id", "user_id", "language", "submit_time", "status", "time_used",
+                           "memory_used")
+
+def submission_feed_row(row, hide_after=None, viewer_id=None):
+    """hide_after 不为空时,其他用户在该时间之后的提交显示为 Pending(封榜)"""
+    row = {
+        'submission_id': row.id,
+        'problem_id': row.problem_id,
+        'user_id': row.user_id,
+        'language': row.language,
+        'submit_time': row.submit_time,
+        'status': row.status,
+        'time_used': row.time_used,
+        'memory_used': row.memory_used
+    }
+    if hide_after is not None and row['submit_time'] >= hide_after and row['user_id'] != viewer_id:
+        row.update(status="Pending", time_used=0, memory_used=0)
+    return row
+
+def submission_feed_query(model, filters, after):
+    return db.session.query(*(getattr(model, name) for name in SUBMISSION_FEED_COLUMNS)) \
+        .filter_by(**filters) \
+        .filter(model.id > after) \
+        .order_by(model.id)
+
+def submission_feed_response(archived=False, hide_after=None, viewer_id=None, **filters):
+    """按提交ID游标分页或以 NDJSON 流式返回满足条件的提交记录
+
+    未传分页参数时返回完整列表,与旧接口一致。
+    archived 为 True 时(比赛已结束)同时读取归档库,两边都按提交ID排序后归并。
+    hide_after/viewer_id 见 submission_feed_row。
+    """
+    def feed_row(row):
+        return submission_feed_row(row, hide_after, viewer_id)
+
+    after = request.args.get('after', 0, type=int)
+    queries = [submission_feed_query(Submission, filters, after)]
+    if archived and archive_available():
+        queries.append(submission_feed_query(ArchivedSubmission, filters, after))
+
+    def merged(queries):
+        if len(queries) == 1:
+            return iter(queries[0])
+        return merge_tiers(*queries, key=lambda row: row.id)
+
+    if request.args.get('format') == 'ndjson':
+        def generate():
+            # yield_per 分批从游标读取,逐行序列化,不会一次性加载全部记录
+            batch_size = app.config['SUBMISSION_FEED_BATCH_SIZE']
+            for row in merged([query.yield_per(batch_size) for query in queries]):
+                yield app.json.dumps(feed_row(row)) + "\n"
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+    if 'after' not in request.args and 'limit' not in request.args:
+        return jsonify([feed_row(row) for row in merged(queries)])
+
+    limit = request.args.get('limit', app.config['SUBMISSION_FEED_LIMIT'], type=int)
+    if limit < 1:
+        return jsonify({"error": "limit must be a positive integer"}), 400
+    limit = min(limit, app.config['SUBMISSION_FEED_MAX_LIMIT'])
+    rows = list(islice(merged([query.limit(limit + 1) for query in queries]), limit + 1))
+    next_cursor = rows[limit - 1].id if len(rows) > limit else None
+    return jsonify({
+        "submissions": [feed_row(row) for row in rows[:limit]],
+        "next_cursor": next_cursor,
+    })
+
 @app.route('/api/contest/filter', methods=['POST'])
 def filter_contests():
     """
@@ -57,10 +148,14 @@ def get_contestinfo(contest_id):
     
     Args:
         contest_id(int): 比赛编号
+        with_ranklist (str, 可选): URL参数,为 1 时附带完整排行榜;
+            默认不附带,排行榜请使用分页的 /api/contest/ranklist/<contest_id>。
+            封榜期间除比赛管理者外附带的是封榜时的排行榜
     
     Returns:
         dict: 比赛信息 (包含比赛id, 比赛标题, 管理人id, 管理人名字, 起始时间, 结束时间, 比赛信息, 题目编号, 排行榜)
         TODO: 加一个ranklist例子
+        响应带有 ETag,请求头 If-None-Match 与之相同时返回 304
     """
     user = User(get_jwt())
     contest = Contest.query.filter_by(id=contest_id).first()    
@@ -78,10 +173,178 @@ def get_contestinfo(contest_id):
         'end_time': contest.end_time,
         'information': contest.information,
         'problem_ids': contest.get_problems(),
-        'ranklist': contest.get_ranklist(),
     }
+    if request.args.get('with_ranklist') == '1':
+        if hides_frozen(contest, user):
+            contest_data['ranklist'] = frozen_state(contest).entry.ranklist
+        else:
+            contest_data['ranklist'] = ranklist_cache.get(contest)[1]
+
+    response = jsonify(contest_data)
+    response.add_etag()
+    return response.make_conditional(request)
 
-    return jsonify(contest_data)
+@app.route('/api/contest/ranklist/<int:contest_id>', methods=['GET'])
+@jwt_required()
+def get_contest_ranklist(contest_id):
+    """
+    (要求jwt_token)
+    分页获取比赛排行榜,排行榜未变化时返回 304
+
+    ETag 由排行榜版本号生成,If-None-Match 命中时不读取也不计算排行榜。
+    封榜期间(SCOREBOARD_FREEZE_MINUTES)除比赛管理者外返回封榜时的排行榜,
+    响应不含 version,带有 "frozen": true,ETag 由内容生成。
+
+    Args:
+        contest_id (int): 路径参数,比赛唯一标识符
+        page (int, 可选): URL参数,页码,从 1 开始,默认 1
+        size (int, 可选): URL参数,每页人数,默认 RANKLIST_PAGE_SIZE,最大 RANKLIST_MAX_PAGE_SIZE
+
+    Returns:
+        dict: {
+            "version": 12,          // 排行榜版本号
+            "total": 500,           // 参赛人数
+            "page": 1,
+            "size": 50,
+            "ranklist": [{
+                "rank": 1,          // 名次,通过题数和罚时都相同的用户名次相同
+                "user_id": 2,
+                "score": 3,         // 通过题数
+                "penalty": 260,     // 罚时(分钟)
+                "score_details": {"<problem_id>": {"solve_time": 120, "attempts": 1}}
+            }]
+        }
+    """
+    user = User(get_jwt())
+    contest = Contest.query.filter_by(id=contest_id).first()
+    if contest is None:
+        return jsonify({"error": "contest not found"}), 404
+    if not contest.is_allowed_view(user):
+        return jsonify({"error": f"user_id = {user.id} can't view contest(id = {contest_id})"}), 404
+
+    page, size = parse_page_args()
+    if page is None:
+        return jsonify({"error": "page and size must be positive integers"}), 400
+
+    if hides_frozen(contest, user):
+        entry = frozen_state(contest).entry
+        return frozen_response({"total": len(entry), "page": page, "size": size,
+                                "ranklist": entry.page(page, size)})
+
+    etag = f"ranklist-{contest.id}-{contest.ranklist_version or 0}"
+    if etag in request.if_none_match:
+        response = app.response_class(status=304)
+        response.set_etag(etag)
+        return response
+
+    entry = ranklist_cache.get_entry(contest)
+    response = jsonify({
+        "version": entry.version,
+        "total": len(entry),
+        "page": page,
+        "size": size,
+        "ranklist": entry.page(page, size),
+    })
+    response.set_etag(f"ranklist-{contest.id}-{entry.version}")
+    return response
+
+@app.route('/api/contest/myrank/<int:contest_id>', methods=['GET'])
+@jwt_required()
+def get_contest_myrank(contest_id):
+    """
+    (要求jwt_token)
+    获取当前用户在比赛中的名次及前后相邻的用户
+
+    名次通过缓存排行榜的 user_id 索引直接定位,不需要遍历排行榜。
+    封榜期间除比赛管理者外按封榜时的排行榜计算名次,响应不含 version,带有 "frozen": true。
+
+    Args:
+        contest_id (int): 路径参数,比赛唯一标识符
+        neighbours (int, 可选): URL参数,返回前后各多少名,默认 2,最大 RANKLIST_MAX_NEIGHBOURS
+        (通过JWT Token获取用户身份)
+
+    Returns:
+        dict: {
+            "version": 12,
+            "total": 500,
+            "rank": 37,             // 名次
+            "position": 36,         // 在排行榜中的下标,从 0 开始
+            "neighbours": [...]     // 包含自己在内的相邻用户,格式同 ranklist 中的行
+        }
+        用户不是参赛者时返回 404
+    """
+    user = User(get_jwt())
+    contest = Contest.query.filter_by(id=contest_id).first()
+    if contest is None:
+        return jsonify({"error": "contest not found"}), 404
+    if not contest.is_allowed_view(user):
+        return jsonify({"error": f"user_id = {user.id} can't view contest(id = {contest_id})"}), 404
+
+    neighbours = request.args.get('neighbours', 2, type=int)
+    if neighbours < 0:
+        return jsonify({"error": "neighbours must be a non-negative integer"}), 400
+    neighbours = min(neighbours, app.config['RANKLIST_MAX_NEIGHBOURS'])
+
+    frozen = hides_frozen(contest, user)
+    entry = frozen_state(contest).entry if frozen else ranklist_cache.get_entry(contest)
+    found = entry.around(user.id, neighbours)
+    if found is None:
+        return jsonify({"error": f"user_id = {user.id} is not in the ranklist of contest(id = {contest_id})"}), 404
+    position, rank, rows = found
+    data = {"total": len(entry), "rank": rank, "position": position, "neighbours": rows}
+    if frozen:
+        return frozen_response(data)
+    return jsonify(dict(data, version=entry.version))
+
+@app.route('/api/contest/stats/<int:contest_id>', methods=['GET'])
+@jwt_required()
+def get_contest_stats(contest_id):
+    """
+    (要求jwt_token)
+    获取比赛各题目的统计: 尝试/通过人数、一血、平均通过时间、通过前错误次数的分布
+
+    统计在评测写回时增量维护,读取时不扫描提交记录;成绩未变化时返回 304。
+    封榜期间除比赛管理者外只统计封榜前的提交,响应不含 version,带有 "frozen": true。
+
+    Args:
+        contest_id (int): 路径参数,比赛唯一标识符
+
+    Returns:
+        dict: {
+            "version": 12,                  // 排行榜版本号,统计随成绩一起变化
+            "problems": [{
+                "problem_id": 1,
+                "tried": 40,                // 提交过该题的参赛者人数
+                "solved": 25,               // 通过人数
+                "submissions": 70,          // 计入成绩的提交数(通过前的错误提交和首次通过)
+                "average_solve_time": 83.5, // 平均通过时间(分钟),无人通过时为 null
+                "first_solve": {"user_id": 7, "solve_time": 12, "submission_id": 130},  // 无人通过时为 null
+                "attempts": {"0": 15, "1": 6, "10": 1}   // 通过前错误次数 -> 人数,最后一档为该次数及以上
+            }]
+        }
+    """
+    user = User(get_jwt())
+    contest = Contest.query.filter_by(id=contest_id).first()
+    if contest is None:
+        return jsonify({"error": "contest not found"}), 404
+    if not contest.is_allowed_view(user):
+        return jsonify({"error": f"user_id = {user.id} can't view contest(id = {contest_id})"}), 404
+
+    if hides_frozen(contest, user):
+        return frozen_response({"problems": frozen_state(contest).stats})
+
+    etag = f"stats-{contest.id}-{contest.ranklist_version or 0}"
+    if etag in request.if_none_match:
+        response = app.response_class(status=304)
+        response.set_etag(etag)
+        return response
+
+    response = jsonify({
+        "version": contest.ranklist_version or 0,
+        "problems": ContestProblemStat.for_contest(contest),
+    })
+    response.set_etag(etag)
+    return response
 
 @app.route('/api/contest/get_contest_user_solved_problem/<int:contest_id>', methods=['POST'])
 @jwt_required()
@@ -106,16 +369,14 @@ def get_contest_user_solved_problem(contest_id):
         return jsonify({"error": "contest not found"}), 404    
     if not contest.is_allowed_view(user):
         return jsonify({"error": f"user_id = {user.id} can't view contest(id = {contest_id})"}), 404
-    contestuser = ContestUser.query.filter_by(contest_id=contest_id,user_id=user.id).first()    
-
-    solved_problem = []
-    problem_ids = Contest.query.filter_by(id=contest_id).first().get_problems()
-    score_details = json.loads(contestuser.score_details)
-
-    for problem_id in problem_ids:
-        if problem_id in score_details:
-            if score_details[problem_id]["solve_time"] != -1:
-                solved_problem.append(problem_id)
+    solved_problem = [problem_id for problem_id, in
+                      db.session.query(ContestUserProblem.problem_id)
+                      .join(contest_problem, and_(contest_problem.c.contest_id == ContestUserProblem.contest_id,
+                                                  contest_problem.c.problem_id == ContestUserProblem.problem_id))
+                      .filter(ContestUserProblem.contest_id == contest_id,
+                              ContestUserProblem.user_id == user.id,
+                              ContestUserProblem.solve_time != -1)
+                      .order_by(ContestUserProblem.solve_time, ContestUserProblem.problem_id)]
 
     return jsonify(solved_problem)
 
@@ -153,9 +414,14 @@ def get_contest_all_submission(contest_id):
     Args:
         contest_id (int): 路径参数,比赛唯一标识符
         (通过JWT Token获取用户身份)
+        after (int, 可选): URL参数,游标,只返回提交ID大于该值的记录
+        limit (int, 可选): URL参数,每页条数,最大 SUBMISSION_FEED_MAX_LIMIT;
+            传入 after 或 limit 时返回 {"submissions": [...], "next_cursor": <int|null>}
+        format (str, 可选): URL参数,为 ndjson 时以 application/x-ndjson 逐行流式返回全部记录(可配合 after),
+            内存占用与记录数无关,适合导出整场比赛的提交记录
     
     Returns:
-        list[dict]: 提交记录列表,每个字典包含:
+        list[dict]: 提交记录列表(按提交ID升序),每个字典包含:
             - submission_id (int): 提交唯一标识符
             - problem_id (int): 题目唯一标识符
             - submit_time (str): 提交时间(Wed, 26 Feb 2025 08:00:00 GMT)
@@ -181,24 +447,10 @@ def get_contest_all_submission(contest_id):
     if not contest.is_allowed_view(user):
         return jsonify({"error": f"user_id = {user.id} can't view contest(id = {contest_id})"}), 404
 
-    submissions = Submission.query.filter_by(contest_id=contest_id).all()
-    submission_list = []
-
-    for submission in submissions:
-        submission_data = {
-            'submission_id': submission.id,
-            'problem_id': submission.problem_id,
-            'user_id': submission.user_id,
-            'language': submission.language,
-            'submit_time': submission.submit_time,
-            'status': submission.status,
-            'time_used': submission.time_used,
-            'memory_used': submission.memory_used
-        }
-
-        submission_list.append(submission_data)
-
-    return jsonify(submission_list)
+    # 封榜期间其他选手封榜后的提交结果不可见,否则可以据此还原实时排行榜
+    hide_after = freeze_start(contest) if hides_frozen(contest, user) else None
+    return submission_feed_response(archived=contest.is_ended(), hide_after=hide_after, viewer_id=user.id,
+                                    contest_id=contest_id)
 
 @app.route('/api/contest/get_contest_user_submission/<int:contest_id>', methods=['GET'])
 @jwt_required()
@@ -209,9 +461,14 @@ def get_contest_user_submission(contest_id):
     Args:
         contest_id (int): 路径参数,比赛唯一标识符
         (通过JWT Token获取用户身份)
+        after (int, 可选): URL参数,游标,只返回提交ID大于该值的记录
+        limit (int, 可选): URL参数,每页条数,最大 SUBMISSION_FEED_MAX_LIMIT;
+            传入 after 或 limit 时返回 {"submissions": [...], "next_cursor": <int|null>}
+        format (str, 可选): URL参数,为 ndjson 时以 application/x-ndjson 逐行流式返回全部记录(可配合 after),
+            内存占用与记录数无关,适合导出整场比赛的提交记录
     
     Returns:
-        list[dict]: 提交记录列表,每个字典包含:
+        list[dict]: 提交记录列表(按提交ID升序),每个字典包含:
             - submission_id (int): 提交唯一标识符
             - problem_id (int): 题目唯一标识符
             - submit_time (str): 提交时间(Wed, 26 Feb 2025 08:00:00 GMT)
@@ -237,21 +494,4 @@ def get_contest_user_submission(contest_id):
     if not contest.is_allowed_view(user):
         return jsonify({"error": f"user_id = {user.id} can't view contest(id = {contest_id})"}), 404
 
-    submissions = Submission.query.filter_by(contest_id=contest_id,user_id=user.id).all()
-    submission_list = []
-
-    for submission in submissions:
-        submission_data = {
-            'submission_id': submission.id,
-            'problem_id': submission.problem_id,
-            'user_id': submission.user_id,
-            'language': submission.language,
-            'submit_time': submission.submit_time,
-            'status': submission.status,
-            'time_used': submission.time_used,
-            'memory_used': submission.memory_used
-        }
-
-        submission_list.append(submission_data)
-
-    return jsonify(submission_list)
\ No newline at end of file
+    return submission_feed_response(archived=contest.is_ended(), contest_id=contest_id, user_id=user.id)
\ No newline at end of file
@@ -4,8 +4,13 @@ from online_judge.models.problems import Problem
 from online_judge.models.contests import Contest,ContestUser
 from online_judge.api import User
 from sqlalchemy.exc import SQLAlchemyError
+import codecs
+import csv
 import json
 
+# 导入结果中最多列出多少个无法解析的行号
+ROSTER_MAX_REPORTED_ERRORS = 20
+
 @app.route('/api/contest/update_contest_info/<int:contest_id>', methods=['POST'])
 @jwt_required()
 def update_contest_info(contest_id):
@@ -108,6 +113,89 @@ def update_contest_user(contest_id):
         # 全局异常捕获
         return jsonify({"error": str(e)}), 500
 
+def read_roster(stream, report, strict=False):
+    """逐行读取 CSV 名单,产出用户ID
+
+    取 user_id 列(有表头时)或第一列;空行跳过,无法解析的行计入 report。
+    strict 为 True 时遇到无法解析的行抛出 ValueError,导入在提交前中止。
+    上传内容按块解码,不会整体读入内存。
+    """
+    lines = codecs.iterdecode(stream, 'utf-8-sig')
+    column = 0
+    for line_no, row in enumerate(csv.reader(lines), start=1):
+        if not row or not any(cell.strip() for cell in row):
+            continue
+        if line_no == 1 and 'user_id' in [cell.strip() for cell in row]:
+            column = [cell.strip() for cell in row].index('user_id')
+            continue
+        report["rows"] += 1
+        try:
+            yield int(row[column].strip())
+        except (ValueError, IndexError):
+            if strict:
+                raise ValueError(f"invalid user id at line {line_no}")
+            report["invalid"] += 1
+            if len(report["invalid_lines"]) < ROSTER_MAX_REPORTED_ERRORS:
+                report["invalid_lines"].append(line_no)
+
+@app.route('/api/contest/import_users/<int:contest_id>', methods=['POST'])
+@jwt_required()
+def import_contest_users(contest_id):
+    """
+    以 CSV 批量导入比赛的参赛者名单
+
+    上传内容边读边按 ROSTER_IMPORT_CHUNK_SIZE 分块写入,已是参赛者的用户直接忽略,
+    适合数千人的课程比赛。所有变更在一个事务中提交。
+    要求有效的JWT认证且用户可以编辑该比赛。
+
+    Args:
+        contest_id (int): 路径参数,目标比赛的唯一标识符
+        mode (str, 可选): URL参数, add(默认,只添加) / remove(只移除) / replace(使参赛者与名单一致,
+                          名单中有无法解析的行时返回 400 且不做任何修改)
+        file: multipart 表单中的 CSV 文件;也可以直接以 text/csv 作为请求体上传。
+              每行一个用户ID,有表头时取 user_id 列
+
+    Returns:
+        JSON响应:
+        - 成功 (200):
+            {
+                "success": True,
+                "mode": "replace",
+                "rows": 5000,            # 名单中的有效行数(不含表头和空行)
+                "invalid": 1,            # 无法解析的行数
+                "invalid_lines": [17],   # 无法解析的行号,最多列出 20 个
+                "added": 120,            # 本次新增的用户数
+                "removed": 3,            # 本次移除的用户数
+                "total": 4998            # 导入后的参赛人数
+            }
+    """
+    user = User(get_jwt())
+    contest = Contest.query.filter_by(id=contest_id).first()
+    if contest is None:
+        return jsonify({"error": "contest not found"}), 404
+    if not contest.is_allowed_edit(user):
+        return jsonify({"error": f"user_id = {user.id} can't update contest(id = {contest_id})"}), 403
+
+    mode = request.args.get('mode', 'add')
+    if mode not in ("add", "remove", "replace"):
+        return jsonify({"error": "mode must be one of add, remove, replace"}), 400
+    stream = request.files['file'].stream if 'file' in request.files else request.stream
+
+    report = {"rows": 0, "invalid": 0, "invalid_lines": []}
+    try:
+        # replace 会移除名单外的参赛者,名单有错误行时整体拒绝,避免误删
+        result = contest.import_users(read_roster(stream, report, strict=(mode == "replace")), mode=mode)
+    except UnicodeDecodeError:
+        db.session.rollback()
+        return jsonify({"error": "roster must be UTF-8 encoded CSV"}), 400
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
+    except SQLAlchemyError:
+        db.session.rollback()
+        return jsonify({"error": "Failed to edit database"}), 500
+    return jsonify(dict(success=True, mode=mode, **report, **result)), 200
+
 @app.route('/api/contest/update_problems/<int:contest_id>', methods=['POST'])
 @jwt_required()
 def update_contest_problems(contest_id):
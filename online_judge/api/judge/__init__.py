@@ -0,0 +1 @@
+from .queue import *
\ No newline at end of file
@@ -0,0 +1,75 @@
+from flask import jsonify, request
+from online_judge import app, jwt_required, get_jwt
+from online_judge.models.judge_queue import JudgeTask
+from online_judge.judge.compile_cache import get_compile_cache
+
+
+@app.route('/api/judge/queue', methods=['GET'])
+@jwt_required()
+def get_judge_queue():
+    """
+    (要求jwt_token)
+    查询评测队列深度
+
+    Returns:
+        JSON: 各状态的任务数量,格式：
+            {
+                "queued": 3,   // 等待评测的任务数
+                "running": 1   // 正在评测的任务数
+            }
+    """
+    return jsonify(JudgeTask.depth()), 200
+
+
+@app.route('/api/judge/stats', methods=['GET'])
+@jwt_required()
+def get_judge_stats():
+    """
+    (要求jwt_token)
+    查询评测吞吐量和各通道的等待时间
+
+    Args:
+        window (int, optional): URL参数,统计窗口(秒),默认60
+
+    Returns:
+        JSON: 统计结果,格式：
+            {
+                "window_seconds": 60,
+                "verdicts_per_minute": 42.0,
+                "lanes": {
+                    "contest": {"finished": 30, "avg_wait": 0.8, "max_wait": 2.1, "queued": 2, "running": 1},
+                    "practice": {"finished": 12, "avg_wait": 5.3, "max_wait": 20.4, "queued": 9, "running": 3}
+                }
+            }
+    """
+    window = request.args.get('window', 60, type=int)
+    if window <= 0:
+        return jsonify({"error": "window must be positive"}), 400
+    return jsonify(JudgeTask.stats(window_seconds=window)), 200
+
+
+@app.route('/api/judge/compile_cache', methods=['GET'])
+@jwt_required()
+def get_compile_cache_stats():
+    """
+    (要求jwt_token)
+    查询编译缓存的命中率和占用空间
+
+    Returns:
+        JSON: 统计结果,格式：
+            {
+                "enabled": true,
+                "binaries": true,    // 是否缓存编译成功的可执行文件(COMPILE_CACHE_BINARIES)
+                "hits": 12,          // 使用缓存的编译错误或可执行文件、跳过编译的次数
+                "misses": 30,
+                "hit_ratio": 0.29,
+                "entries": 25,       // 缓存条目数
+                "bytes": 10240       // 缓存占用的磁盘空间(字节)
+            }
+    """
+    result = JudgeTask.compile_cache_stats()
+    cache = get_compile_cache()
+    result["enabled"] = cache is not None
+    result["binaries"] = cache is not None and app.config['COMPILE_CACHE_BINARIES']
+    result.update(cache.disk_usage() if cache is not None else {"entries": 0, "bytes": 0})
+    return jsonify(result), 200
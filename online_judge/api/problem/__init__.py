@@ -1,4 +1,6 @@
 from .data import *
 from .problem import *
 from .submit import *
-from .filter import *
\ No newline at end of file
+from .filter import *
+from .rejudge import *
+from .progress import *
\ No newline at end of file
@@ -43,6 +43,8 @@ def update_problem_data(problem_id):
            |--1.in
            |--1.ans
         2. 数据要求：从1开始编号，最多30个测试点，一个.in对应一个.ans
+        3. 更新成功后题目的数据版本加一，旧数据上的评测结果不再参与重复提交去重，
+           已有提交可通过 /api/problem/rejudge/<problem_id> 重测
     """
     # 获取当前用户
     current_user = User(get_jwt())
@@ -127,6 +129,7 @@ def update_problem_data(problem_id):
                 dst = os.path.join(data_dir, item)
                 shutil.move(src, dst)
 
+            problem.bump_data_version()
             return jsonify({"OK": "data update success", "testcase_count": len(testcases)}), 200
 
     except PermissionError:
@@ -46,7 +46,7 @@ def get_problem_statement():
         contestuser = ContestUser.query.filter_by(contest_id=contest_id,user_id=user.id).first()
         if contestuser is None:
             return jsonify({"error": "the contest is not available for the user"}),404    
-        if problem_id not in Contest.query.filter_by(id=contest_id).first().get_problems():
+        if not Contest.contains_problem(contest_id, problem_id):
             return jsonify({"error": "the contest don't have this problem"}),404
     else:
         if not problem.is_public:
@@ -282,10 +282,8 @@ def delete_problem(problem_id):
         return jsonify({"error": "没有权限删除此题目"}), 404
     
     # 检查题目是否在任何比赛中
-    contests = Contest.query.all()
-    for contest in contests:
-        if problem_id in contest.get_problems():
-            return jsonify({"error": "题目正在被比赛使用中，无法删除"}), 404
+    if Contest.is_problem_used(problem_id):
+        return jsonify({"error": "题目正在被比赛使用中，无法删除"}), 404
     
     try:
         # 删除题目文件夹
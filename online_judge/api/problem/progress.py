@@ -0,0 +1,52 @@
+from flask import jsonify,request
+from online_judge import app,jwt_required,get_jwt
+from online_judge.models import UserProblemProgress
+from online_judge.api import User
+
+
+@app.route('/api/problem/progress', methods=['POST'])
+@jwt_required()
+def get_problem_progress():
+    """
+    (要求jwt_token)
+    批量查询用户在一组题目上的做题进度,用于题目列表的"已通过/尝试过"标记
+
+    结果来自按评测结果维护的 user_problem_progress,一次查询返回,不扫描提交记录。
+
+    Args (JSON Body):
+        problem_ids (list[int], optional): 要查询的题目ID,最多 USER_PROGRESS_MAX_IDS 个;为空时返回用户的全部进度
+        user_id (int, optional): 查询其他用户,仅管理员可用,默认为当前用户
+
+    Returns:
+        JSON响应:
+        - 200 OK:
+            {
+                "user_id": 2,
+                "solved": [1, 5],                 // 已通过的题目
+                "attempted": [3],                 // 提交过但未通过的题目
+                "first_ac_time": {                // 每道已通过题目的最早通过时间
+                    "1": "Wed, 26 Feb 2025 09:35:00 GMT",
+                    "5": "Thu, 27 Feb 2025 10:00:00 GMT"
+                }
+            }
+        - 400 Bad Request: {"error": "problem_ids 格式错误或数量过多"}
+        - 403 Forbidden: {"error": "无权查询其他用户"}
+    """
+    user = User(get_jwt())
+    data = request.get_json(silent=True) or {}
+
+    user_id = data.get('user_id', user.id)
+    if not isinstance(user_id, int):
+        return jsonify({"error": "user_id must be an integer"}), 400
+    if user_id != user.id and user.power < 2:
+        return jsonify({"error": "user can't view other users' progress"}), 403
+
+    problem_ids = data.get('problem_ids')
+    if problem_ids is not None:
+        if not isinstance(problem_ids, list) or not all(isinstance(pid, int) for pid in problem_ids):
+            return jsonify({"error": "problem_ids must be a list of integers"}), 400
+        if len(problem_ids) > app.config['USER_PROGRESS_MAX_IDS']:
+            return jsonify({"error": f"at most {app.config['USER_PROGRESS_MAX_IDS']} problem_ids"}), 400
+
+    progress = UserProblemProgress.for_user(user_id, problem_ids)
+    return jsonify(dict(progress, user_id=user_id)), 200
@@ -0,0 +1,101 @@
+from flask import jsonify
+from online_judge import app,jwt_required,get_jwt
+from online_judge.models import Problem,Contest,RejudgeJob
+from online_judge.api import User
+
+
+@app.route('/api/problem/rejudge/<int:problem_id>', methods=['POST'])
+@jwt_required()
+def rejudge_problem(problem_id):
+    """
+    (要求jwt_token,需题目创建者或管理员权限)
+    重测题目的全部提交,一般在通过 update_problem_data 替换测试数据后调用
+
+    提交被分批重置为Pending并放入低优先级评测通道,全部评测完成后统一重算
+    题目的提交/通过数和相关比赛的成绩。
+
+    Args:
+        problem_id (int): 路径参数,需要重测的题目ID
+
+    Returns:
+        JSON响应:
+        - 200 OK: 重测任务信息,格式同 /api/problem/rejudge/status/<job_id>
+        - 403 Forbidden: {"error": "权限不足"}
+        - 404 Not Found: {"error": "题目不存在"}
+        - 409 Conflict: {"error": "该题目已有进行中的重测", "job_id": 3}
+    """
+    user = User(get_jwt())
+    problem = Problem.query.filter_by(id=problem_id).first()
+    if problem is None:
+        return jsonify({"error": "the problem is not available"}), 404
+    if not problem.is_allowed_edit(user):
+        return jsonify({"error": "the user is not permitted to rejudge the problem"}), 403
+
+    running = RejudgeJob.running_for(problem_id=problem_id)
+    if running is not None:
+        return jsonify({"error": "the problem is being rejudged", "job_id": running.id}), 409
+
+    job = RejudgeJob.create(user.id, problem_id=problem_id)
+    return jsonify(job.to_dict()), 200
+
+
+@app.route('/api/contest/rejudge/<int:contest_id>', methods=['POST'])
+@jwt_required()
+def rejudge_contest(contest_id):
+    """
+    (要求jwt_token,需比赛创建者或管理员权限)
+    重测比赛的全部提交,完成后统一重算比赛成绩和相关题目的提交/通过数
+
+    Args:
+        contest_id (int): 路径参数,需要重测的比赛ID
+
+    Returns:
+        JSON响应:
+        - 200 OK: 重测任务信息,格式同 /api/problem/rejudge/status/<job_id>
+        - 403 Forbidden: {"error": "权限不足"}
+        - 404 Not Found: {"error": "比赛不存在"}
+        - 409 Conflict: {"error": "该比赛已有进行中的重测", "job_id": 3}
+    """
+    user = User(get_jwt())
+    contest = Contest.query.filter_by(id=contest_id).first()
+    if contest is None:
+        return jsonify({"error": "contest not found"}), 404
+    if not contest.is_allowed_edit(user):
+        return jsonify({"error": f"user_id = {user.id} can't rejudge contest(id = {contest_id})"}), 403
+
+    running = RejudgeJob.running_for(contest_id=contest_id)
+    if running is not None:
+        return jsonify({"error": "the contest is being rejudged", "job_id": running.id}), 409
+
+    job = RejudgeJob.create(user.id, contest_id=contest_id)
+    return jsonify(job.to_dict()), 200
+
+
+@app.route('/api/problem/rejudge/status/<int:job_id>', methods=['GET'])
+@jwt_required()
+def get_rejudge_status(job_id):
+    """
+    (要求jwt_token)
+    查询重测进度
+
+    Args:
+        job_id (int): 路径参数,重测任务ID
+
+    Returns:
+        JSON: 重测进度,格式：
+            {
+                "id": 3,
+                "problem_id": 1,        // 按题目重测时有值
+                "contest_id": null,     // 按比赛重测时有值
+                "state": "running",     // running / done
+                "total": 20000,
+                "done": 5000,
+                "eta_seconds": 120.5,   // 按当前速度估算的剩余时间,尚无完成任务时为null
+                "create_time": "2025-01-01T08:00:00",
+                "finish_time": null
+            }
+    """
+    job = RejudgeJob.query.filter_by(id=job_id).first()
+    if job is None:
+        return jsonify({"error": "rejudge job not found"}), 404
+    return jsonify(job.to_dict()), 200
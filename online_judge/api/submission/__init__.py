@@ -1 +1,2 @@
-from .show import *
\ No newline at end of file
+from .show import *
+from .stream import *
\ No newline at end of file
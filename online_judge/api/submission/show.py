@@ -1,29 +1,60 @@
 from flask import Flask,jsonify,request
-from online_judge import app,jwt_required,get_jwt
-from online_judge.models import Submission,Contest,Problem
+from online_judge import app,db,jwt_required,get_jwt
+from online_judge.models import Submission,Contest,Problem,TestcaseResult,ArchivedSubmission
+from online_judge.models.archive import find_submission,merge_tiers,archive_available
 from online_judge.api import User
+from sqlalchemy import tuple_
+from datetime import datetime
+from itertools import islice
+
+# 筛选结果只查询这些列,不加载源代码和编译信息
+SUBMISSION_FILTER_COLUMNS = ("id", "problem_id", "user_id", "contest_id", "language", "submit_time", "status",
+                             "time_used", "memory_used")
+SUBMISSION_STATUS = Submission.__table__.c.status.type.enums
+
+def encode_cursor(row):
+    return f"{row.submit_time.isoformat()},{row.id}"
+
+def decode_cursor(cursor):
+    """解析游标,返回 (submit_time, id),格式错误时抛出 ValueError"""
+    submit_time, _, submission_id = str(cursor).rpartition(",")
+    return datetime.fromisoformat(submit_time), int(submission_id)
+
+def parse_time(value):
+    return datetime.fromisoformat(value) if value else None
 
 @app.route('/api/submission/filter', methods=['POST'])
 @jwt_required()
 def submission_filter():
     """根据多条件筛选提交记录
     
-    支持通过组合多个查询参数过滤提交记录，返回分页后的结果集
+    支持通过组合多个查询参数过滤提交记录，按提交时间从新到旧以游标分页返回,
+    结果包括已移入归档库的旧提交
+
+    游标为上一页最后一条记录的 (submit_time, id),下一页直接从索引中该位置继续读取,
+    每页的查询时间和响应大小与提交总数无关。常用的筛选组合(用户+题目、比赛+用户、题目+状态)
+    都有以 submit_time 结尾的联合索引,排序不需要额外扫描。
 
     Args:
         user_id (int, optional): 筛选指定用户的提交记录
         problem_id (int, optional): 筛选指定题目的提交记录
         contest_id (int, optional): 筛选指定比赛的提交记录
         language (str, optional): 按编程语言过滤（枚举值：python/cpp）
+        status (str | list[str], optional): 按判题状态过滤,可传入多个状态
+        start_time (str, optional): 提交时间下限(含),ISO 格式,如 "2023-08-20T14:00:00"
+        end_time (str, optional): 提交时间上限(不含),ISO 格式
+        cursor (str, optional): 上一页返回的 next_cursor,为空时从最新的提交开始
+        limit (int, optional): 每页条数,默认 SUBMISSION_FILTER_LIMIT,最大 SUBMISSION_FILTER_MAX_LIMIT
 
     Returns:
-        JSON: 包含分页信息的提交记录列表
+        JSON: 一页提交记录及下一页的游标
         {
             "submissions": [
                 {
                     "id": 123,
                     "problem_id": 456,
                     "user_id": 789,
+                    "contest_id": null,
                     "language": "python",
                     "submit_time": "2023-08-20T14:30:00",
                     "status": "Accepted",
@@ -32,56 +63,84 @@ def submission_filter():
                 },
                 ...
             ],
-            "pagination": {
-                "total": 100,
-                "current_page": 1,
-                "per_page": 20
-            }
+            "next_cursor": "2023-08-20T14:30:00,123"   // 没有更多记录时为 null
         }
 
     Raises:
         400 Bad Request: 参数格式错误
-        500 Internal Server Error: 数据库查询异常
 
     """
-    data = request.get_json()
+    data = request.get_json(silent=True) or {}
 
     # 从请求体中提取所需的数据  
     user_id = data.get('user_id')
     problem_id = data.get('problem_id')
     contest_id = data.get('contest_id')
     language = data.get('language')
-    
-    # 构建基本查询
-    query = Submission.query
-
-    # 根据参数是否存在来动态构建查询条件
-    if user_id:
-        query = query.filter_by(user_id=user_id)
-    if problem_id:
-        query = query.filter_by(problem_id=problem_id)
-    if contest_id:
-        query = query.filter_by(contest_id=contest_id)
-    if language:
-        query = query.filter(language=language)
-
-    submissions = query.all()
+    status = data.get('status')
+    if isinstance(status, str):
+        status = [status]
+    if status and not set(status) <= set(SUBMISSION_STATUS):
+        return jsonify({"error": f"status must be in {list(SUBMISSION_STATUS)}"}), 400
+    try:
+        start_time = parse_time(data.get('start_time'))
+        end_time = parse_time(data.get('end_time'))
+        cursor = decode_cursor(data['cursor']) if data.get('cursor') else None
+        limit = int(data.get('limit') or app.config['SUBMISSION_FILTER_LIMIT'])
+    except (TypeError, ValueError):
+        return jsonify({"error": "invalid start_time, end_time, cursor or limit"}), 400
+    if limit < 1:
+        return jsonify({"error": "limit must be a positive integer"}), 400
+    limit = min(limit, app.config['SUBMISSION_FILTER_MAX_LIMIT'])
+
+    def build_query(model):
+        # 构建基本查询
+        query = db.session.query(*(getattr(model, name) for name in SUBMISSION_FILTER_COLUMNS))
+
+        # 根据参数是否存在来动态构建查询条件
+        if user_id:
+            query = query.filter(model.user_id == user_id)
+        if problem_id:
+            query = query.filter(model.problem_id == problem_id)
+        if contest_id:
+            query = query.filter(model.contest_id == contest_id)
+        if language:
+            query = query.filter(model.language == language)
+        if status:
+            query = query.filter(model.status.in_(status))
+        if start_time:
+            query = query.filter(model.submit_time >= start_time)
+        if end_time:
+            query = query.filter(model.submit_time < end_time)
+        if cursor:
+            query = query.filter(tuple_(model.submit_time, model.id) < cursor)
+        return query.order_by(model.submit_time.desc(), model.id.desc()).limit(limit + 1)
+
+    # 主库和归档库各取一页,按 (submit_time, id) 归并;没有归档数据时只查询主库
+    if archive_available():
+        rows = list(islice(merge_tiers(build_query(Submission), build_query(ArchivedSubmission),
+                                       key=lambda row: (row.submit_time, row.id), reverse=True), limit + 1))
+    else:
+        rows = build_query(Submission).all()
     submission_list = []
 
-    for submission in submissions:
+    for row in rows[:limit]:
         submission_data = {
-            'problem_id': submission.problem_id,
-            'user_id': submission.user_id,
-            'language': submission.language,
-            'submit_time': submission.submit_time,
-            'status': submission.status,
-            'time_used': submission.time_used,
-            'memory_used': submission.memory_used
+            'id': row.id,
+            'problem_id': row.problem_id,
+            'user_id': row.user_id,
+            'contest_id': row.contest_id,
+            'language': row.language,
+            'submit_time': row.submit_time,
+            'status': row.status,
+            'time_used': row.time_used,
+            'memory_used': row.memory_used
         }
 
         submission_list.append(submission_data)
 
-    return jsonify(submission_list),200
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return jsonify({"submissions": submission_list, "next_cursor": next_cursor}),200
 
 @app.route('/api/submission/get/<int:submission_id>', methods=['GET'])
 @jwt_required()
@@ -104,7 +163,10 @@ def get_submission(submission_id):
             "status": "Accepted",
             "time_used": 100,      // 单位：毫秒
             "memory_used": 2048,   // 单位：KB
-            "compile_error_info": ""  // 编译错误信息（如有）
+            "compile_error_info": "",  // 编译错误信息（如有）
+            "testcases": [              // 已完成的测试点结果（评测机使用结构化输出时）,评测中也会逐步增加
+                {"case_index": 1, "status": "Accepted", "time_used": 12.0, "memory_used": 1024}
+            ]
         }
 
     Raises:
@@ -116,26 +178,28 @@ def get_submission(submission_id):
     """
     current_user = User(get_jwt())
 
-    submission = Submission.query.get(submission_id)
+    # 主库中不存在时读取归档库
+    submission, testcases = find_submission(submission_id)
+    if submission is None:
+        return jsonify({"error": "Submission not found"}), 404
+
     # 添加权限过滤
     if current_user.power < 2:  # 普通用户只能查自己
         if submission.user_id != current_user.id:
             return jsonify({"error": "user can't view this submission"}), 404
 
-    if submission is None:
-        return jsonify({"error": "Submission not found"}), 404
-    else:
-        submission_json = {
-            "id": submission.id,
-            "code": submission.code,
-            "language": submission.language,
-            "user_id": submission.user_id,
-            "problem_id": submission.problem_id,
-            "submit_time": submission.submit_time,
-            "contest_id": submission.contest_id,
-            "status": submission.status,
-            "time_used": submission.time_used,
-            "memory_used": submission.memory_used,
-            "compile_error_info": submission.compile_error_info
-        }
-        return jsonify(submission_json),200
\ No newline at end of file
+    submission_json = {
+        "id": submission.id,
+        "code": submission.code,
+        "language": submission.language,
+        "user_id": submission.user_id,
+        "problem_id": submission.problem_id,
+        "submit_time": submission.submit_time,
+        "contest_id": submission.contest_id,
+        "status": submission.status,
+        "time_used": submission.time_used,
+        "memory_used": submission.memory_used,
+        "compile_error_info": submission.compile_error_info,
+        "testcases": [case.to_dict() for case in testcases]
+    }
+    return jsonify(submission_json),200
\ No newline at end of file
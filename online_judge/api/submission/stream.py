@@ -0,0 +1,137 @@
+from flask import Response,jsonify,request
+from online_judge import app,db,jwt_required,get_jwt
+from online_judge.models import Submission
+from online_judge.api import User
+from online_judge.judge.broker import submission_broker, is_final
+from sqlalchemy import func
+import json
+import time
+import queue
+
+
+def parse_submission_ids(value):
+    try:
+        submission_ids = sorted({int(x) for x in value.split(',') if x.strip()})
+    except ValueError:
+        return None
+    return submission_ids
+
+
+def check_watch_permission(user, submission_ids):
+    """返回错误响应,校验通过时返回 None。普通用户只能订阅自己的提交"""
+    if not submission_ids:
+        return jsonify({"error": "ids is required"}), 400
+    if len(submission_ids) > app.config['SUBMISSION_STREAM_MAX_IDS']:
+        return jsonify({"error": f"at most {app.config['SUBMISSION_STREAM_MAX_IDS']} submissions per request"}), 400
+    rows = db.session.query(Submission.user_id, func.count(Submission.id)) \
+        .filter(Submission.id.in_(submission_ids)) \
+        .group_by(Submission.user_id) \
+        .all()
+    if sum(count for _, count in rows) != len(submission_ids):
+        return jsonify({"error": "Submission not found"}), 404
+    if user.power < 2 and any(user_id != user.id for user_id, _ in rows):
+        return jsonify({"error": "user can't view this submission"}), 404
+    return None
+
+
+@app.route('/api/submission/stream', methods=['GET'])
+@jwt_required()
+def stream_submission_status():
+    """以 Server-Sent Events 推送提交的状态变化,替代前端定时轮询 /api/submission/get/<id>
+
+    连接建立后先推送每个提交的当前状态,之后每次状态变化(排队 → 评测到第k个测试点 → 最终结果)
+    推送一条 status 事件;所有提交都出结果后服务端关闭连接。
+    所有连接共享同一个后台查询,观察同一提交的连接越多,平均每个连接的数据库开销越小。
+
+    Args:
+        ids (str): URL参数,逗号分隔的提交ID,如 ids=1,2,3
+
+    Returns:
+        text/event-stream: 事件格式：
+            event: status
+            data: {
+                "submission_id": 1,
+                "status": "Pending",
+                "phase": "running",     // queued / running / finished
+                "testcase": 3,          // 已完成的测试点数(评测机使用结构化输出时)
+                "time_used": 0,
+                "memory_used": 0,
+                "version": "Pending:running:3"
+            }
+        空闲时定期发送 ": keepalive" 注释行保持连接。
+
+    Raises:
+        400 Bad Request: ids 缺失或格式错误
+        404 Not Found: 提交不存在或无权查看
+    """
+    user = User(get_jwt())
+    submission_ids = parse_submission_ids(request.args.get('ids', ''))
+    if submission_ids is None:
+        return jsonify({"error": "ids must be comma separated integers"}), 400
+    error = check_watch_permission(user, submission_ids)
+    if error is not None:
+        return error
+
+    subscription = submission_broker.subscribe(submission_ids)
+    keepalive = app.config['SUBMISSION_STREAM_KEEPALIVE']
+
+    def generate():
+        pending = set(submission_ids)
+        try:
+            while pending:
+                try:
+                    snapshot = subscription.events.get(timeout=keepalive)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: status\ndata: {json.dumps(snapshot)}\n\n"
+                if is_final(snapshot):
+                    pending.discard(snapshot["submission_id"])
+        finally:
+            submission_broker.unsubscribe(subscription)
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@app.route('/api/submission/wait/<int:submission_id>', methods=['GET'])
+@jwt_required()
+def wait_submission_status(submission_id):
+    """长轮询获取提交状态,供无法使用 SSE 的客户端使用
+
+    状态的 version 与 last 不同(或已出最终结果)时立即返回,否则最多等待 timeout 秒,
+    超时后返回当前状态,客户端带上新的 version 再次请求即可。
+
+    Args:
+        submission_id (int): 路径参数,提交ID
+        last (str, optional): URL参数,客户端上次拿到的 version
+        timeout (float, optional): URL参数,最长等待秒数,默认25,不超过 SUBMISSION_WAIT_MAX_TIMEOUT
+
+    Returns:
+        JSON: 格式同 /api/submission/stream 的 status 事件
+
+    Raises:
+        404 Not Found: 提交不存在或无权查看
+    """
+    user = User(get_jwt())
+    error = check_watch_permission(user, [submission_id])
+    if error is not None:
+        return error
+    last = request.args.get('last')
+    timeout = min(request.args.get('timeout', 25, type=float), app.config['SUBMISSION_WAIT_MAX_TIMEOUT'])
+
+    subscription = submission_broker.subscribe([submission_id])
+    snapshot = None
+    try:
+        deadline = time.monotonic() + timeout
+        while snapshot is None or (snapshot["version"] == last and not is_final(snapshot)):
+            try:
+                snapshot = subscription.events.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                break
+    finally:
+        submission_broker.unsubscribe(subscription)
+    if snapshot is None:
+        # 一直没有收到推送(如后台查询线程异常),直接读取数据库中的当前状态
+        snapshot = submission_broker.query_snapshots([submission_id])[submission_id]
+    return jsonify(snapshot), 200
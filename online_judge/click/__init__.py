@@ -1 +1,4 @@
-from .gen_database import *
\ No newline at end of file
+from .gen_database import *
+from .judge_worker import *
+from .migrate import *
+from .archive import *
\ No newline at end of file
@@ -0,0 +1,27 @@
+import click
+import os
+from flask.cli import with_appcontext
+from sqlalchemy import text
+from online_judge import db, db_path
+from online_judge.models import archive_submissions as archive_old_submissions
+from .migrate import upgrade_schema
+
+
+def register_archive_commands(app):
+    @app.cli.command("archive_submissions")
+    @click.option("--days", type=int, default=None, help="归档超过多少天的提交,默认为 SUBMISSION_ARCHIVE_DAYS")
+    @click.option("--batch-size", type=int, default=500, help="每批处理的提交数")
+    @click.option("--vacuum/--no-vacuum", default=False, help="归档后执行 VACUUM 回收主库文件空间")
+    @with_appcontext
+    def archive_submissions(days, batch_size, vacuum):
+        """Move finished submissions older than --days into the archive database"""
+        # 创建归档库中的表,并为旧数据库补充新增的列
+        upgrade_schema()
+        file_size = os.path.getsize(db_path)
+        archived = archive_old_submissions(days=days, batch_size=batch_size)
+        click.secho(f"归档 {archived} 条提交", fg='green')
+        if vacuum:
+            db.session.remove()
+            with db.engine.connect() as connection:
+                connection.execute(text("VACUUM"))
+            click.secho(f"数据库文件 {file_size} -> {os.path.getsize(db_path)} 字节", fg='green')
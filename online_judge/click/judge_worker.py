@@ -0,0 +1,46 @@
+import signal
+import threading
+import click
+from flask.cli import with_appcontext
+from online_judge.judge import run_worker, JudgeSupervisor
+
+
+def register_judge_commands(app):
+    @app.cli.command("judge_worker")
+    @click.option("--worker-id", default=None, help="worker 标识,默认 <hostname>-<pid>")
+    @click.option("--poll-interval", type=float, default=None, help="队列为空时的轮询间隔(秒)")
+    @click.option("--max-jobs", type=int, default=None, help="处理多少个任务后退出")
+    @with_appcontext
+    def judge_worker(worker_id, poll_interval, max_jobs):
+        """Run a judge worker that consumes the judge queue"""
+        stop_event = threading.Event()
+
+        def handle_signal(signum, frame):
+            click.echo("收到退出信号,当前任务完成后退出")
+            stop_event.set()
+
+        signal.signal(signal.SIGINT, handle_signal)
+        signal.signal(signal.SIGTERM, handle_signal)
+
+        click.echo("评测 worker 已启动")
+        handled = run_worker(worker_id=worker_id, poll_interval=poll_interval,
+                             max_jobs=max_jobs, stop_event=stop_event)
+        click.secho(f"评测 worker 已退出,共处理 {handled} 个任务", fg='green')
+
+    @app.cli.command("judge_supervisor")
+    @click.option("--workers", type=int, default=None, help="评测进程数,默认 JUDGE_WORKERS 或物理核心数")
+    @click.option("--report-interval", type=int, default=None, help="输出吞吐量统计的间隔(秒)")
+    @with_appcontext
+    def judge_supervisor(workers, report_interval):
+        """Run a pool of judge worker processes"""
+        supervisor = JudgeSupervisor(workers=workers, report_interval=report_interval, report=click.echo)
+
+        def handle_signal(signum, frame):
+            click.echo("收到退出信号,等待所有 worker 完成当前任务")
+            supervisor.stop()
+
+        signal.signal(signal.SIGINT, handle_signal)
+        signal.signal(signal.SIGTERM, handle_signal)
+
+        supervisor.run()
+        click.secho("评测 supervisor 已退出", fg='green')
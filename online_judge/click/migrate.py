@@ -0,0 +1,127 @@
+import click
+import os
+from flask.cli import with_appcontext
+from sqlalchemy import inspect, text
+from online_judge import db, db_path
+from online_judge.models import ContestUser, ContestUserProblem, ContestStanding, ContestProblemStat, Submission
+from online_judge.models.rejudge import recompute_user_progress
+
+
+def upgrade_schema():
+    """创建缺少的表,并为已有的表补充模型中新增的列(可以重复执行)
+
+    create_all 不会修改已有的表,旧数据库缺少新增列时所有相关查询都会失败,
+    因此每个迁移命令都先调用本函数。新增列写入模型中的默认值(如 data_version = 0)。
+    contest_user 缺少唯一索引 uq_contest_user 时先删除重复记录再建立索引,
+    导入参赛者的 ON CONFLICT 依赖该索引;其余新增的索引由 create_indexes 创建。
+
+    Returns:
+        list[str]: 新增的列,格式为 "表名.列名"
+    """
+    db.create_all()
+    inspector = inspect(db.engine)
+    added = []
+    with db.engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                column_type = column.type.compile(dialect=db.engine.dialect)
+                connection.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}'))
+                if column.default is not None and column.default.is_scalar:
+                    connection.execute(table.update().values({column.name: column.default.arg}))
+                added.append(f"{table.name}.{column.name}")
+    if "uq_contest_user" not in {index["name"] for index in inspector.get_indexes(ContestUser.__tablename__)}:
+        ContestUser.deduplicate()
+    return added
+
+
+def register_migrate_commands(app):
+    @app.cli.command("upgrade_schema")
+    @with_appcontext
+    def upgrade_schema_command():
+        """Add columns introduced by newer models to an existing database"""
+        added = upgrade_schema()
+        click.secho(f"新增 {len(added)} 列: {', '.join(added)}" if added else "数据库结构已是最新", fg='green')
+
+    @app.cli.command("migrate_score_details")
+    @click.option("--batch-size", type=int, default=500, help="每批处理的参赛记录数")
+    @with_appcontext
+    def migrate_score_details(batch_size):
+        """Convert contest_user.score_details JSON into contest_user_problem rows"""
+        # 创建新增的 contest_user_problem 表,并为旧数据库补充新增的列
+        upgrade_schema()
+        migrated = ContestUserProblem.migrate_score_details(batch_size=batch_size)
+        click.secho(f"迁移完成,写入 {migrated} 条题目成绩", fg='green')
+
+    @app.cli.command("backfill_standings")
+    @with_appcontext
+    def backfill_standings():
+        """Materialize final standings snapshots for all finished contests"""
+        # 创建新增的 contest_standing 表,并为旧数据库补充新增的列
+        upgrade_schema()
+        built = ContestStanding.backfill()
+        click.secho(f"生成 {built} 场比赛的最终成绩快照", fg='green')
+
+    @app.cli.command("recompute_contest_stats")
+    @click.option("--contest-id", type=int, default=None, help="只重算指定比赛")
+    @with_appcontext
+    def recompute_contest_stats(contest_id):
+        """Rebuild per-problem contest statistics from contest_user_problem"""
+        # 创建新增的统计表,并为旧数据库补充新增的列
+        upgrade_schema()
+        rebuilt = ContestProblemStat.backfill(contest_id)
+        click.secho(f"重算 {rebuilt} 场比赛的题目统计", fg='green')
+
+    @app.cli.command("rebuild_user_progress")
+    @click.option("--user-id", type=int, default=None, help="只重建指定用户")
+    @with_appcontext
+    def rebuild_user_progress(user_id):
+        """Rebuild the per-user solved/attempted problem index from submissions"""
+        # 创建新增的 user_problem_progress 表,并为旧数据库补充新增的列
+        upgrade_schema()
+        rebuilt = recompute_user_progress(user_id=user_id)
+        db.session.commit()
+        click.secho(f"写入 {rebuilt} 条做题进度", fg='green')
+
+    @app.cli.command("dedupe_contest_users")
+    @with_appcontext
+    def dedupe_contest_users():
+        """Remove duplicate contest_user rows and create the (contest_id, user_id) unique index"""
+        upgrade_schema()
+        removed = ContestUser.deduplicate()
+        click.secho(f"删除 {removed} 条重复的参赛记录,已建立唯一索引", fg='green')
+
+    @app.cli.command("create_indexes")
+    @with_appcontext
+    def create_indexes():
+        """Create indexes declared on models that are missing from existing tables"""
+        # create_all 只创建缺少的表,已有表上新增的索引需要单独创建;
+        # contest_user 有重复记录时先执行 dedupe_contest_users;索引可能建在新增的列上,先补充列
+        upgrade_schema()
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(db.engine, checkfirst=True)
+        click.secho("索引已创建", fg='green')
+
+    @app.cli.command("migrate_sources")
+    @click.option("--batch-size", type=int, default=500, help="每批处理的提交数")
+    @click.option("--vacuum/--no-vacuum", default=False, help="迁移后执行 VACUUM 回收数据库文件空间")
+    @with_appcontext
+    def migrate_sources(batch_size, vacuum):
+        """Move inline submission source code into the compressed source_blob store"""
+        # 创建 source_blob 表,并为已有的 submission 表补充 code_hash/code_size 等列
+        upgrade_schema()
+
+        file_size = os.path.getsize(db_path)
+        report = Submission.migrate_sources(batch_size=batch_size)
+        saved = report["inline_bytes"] - report["blob_bytes"]
+        click.secho(f"迁移 {report['submissions']} 条提交: 源代码 {report['inline_bytes']} 字节, "
+                    f"去重压缩后新增 {report['blobs']} 个 blob 共 {report['blob_bytes']} 字节, 节省 {saved} 字节",
+                    fg='green')
+        if vacuum:
+            db.session.remove()
+            with db.engine.connect() as connection:
+                connection.execute(text("VACUUM"))
+            click.secho(f"数据库文件 {file_size} -> {os.path.getsize(db_path)} 字节", fg='green')
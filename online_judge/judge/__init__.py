@@ -0,0 +1,6 @@
+from .compile_cache import *
+from .broker import *
+from .daemon import *
+from .judger import *
+from .worker import *
+from .supervisor import *
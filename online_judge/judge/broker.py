@@ -0,0 +1,157 @@
+from online_judge import app, db
+from online_judge.models.submissions import Submission, TestcaseResult
+from online_judge.models.judge_queue import JudgeTask
+from sqlalchemy import func
+import queue
+import logging
+import threading
+
+# 不再变化的最终状态
+FINAL_STATUS = ("Accepted", "WrongAnswer", "TimeLimitExceeded", "IdlenessLimitExceeded",
+                "RuntimeError", "SystemError", "CompileError")
+
+
+def is_final(snapshot):
+    return snapshot is not None and snapshot["status"] in FINAL_STATUS
+
+
+class Subscription:
+    """一个客户端订阅的若干提交,状态变化通过 events 队列推送"""
+
+    def __init__(self, submission_ids):
+        self.submission_ids = set(submission_ids)
+        self.events = queue.Queue()
+
+
+class SubmissionBroker:
+    """进程内的提交状态发布/订阅
+
+    所有订阅者共享一个后台轮询线程: 每个周期只用一条查询读取所有被订阅提交的状态,
+    与上次结果比较后把变化推送给订阅了该提交的客户端。N 个客户端观察同一提交时
+    只产生一次查询,而不是每个客户端各自轮询。
+
+    评测写回路径在写回后调用 notify(),让轮询线程立即刷新,不必等到下个周期。
+    评测 worker 运行在其他进程时,由轮询周期兜底。
+    """
+
+    def __init__(self, poll_interval=0.5):
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._subscribers = {}   # submission_id -> set(Subscription)
+        self._snapshots = {}     # submission_id -> 最近一次的状态
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def query_snapshots(submission_ids):
+        """一次查询读取多个提交的状态
+
+        Returns:
+            dict: submission_id -> {"submission_id", "status", "phase", "testcase", "time_used", "memory_used", "version"}
+                phase 为 queued/running/finished, testcase 为已完成的最大测试点编号,
+                version 在状态、阶段或测试点变化时改变,供长轮询比较
+        """
+        if not submission_ids:
+            return {}
+        last_case = db.session.query(TestcaseResult.submission_id,
+                                     func.max(TestcaseResult.case_index).label("testcase")) \
+            .filter(TestcaseResult.submission_id.in_(submission_ids)) \
+            .group_by(TestcaseResult.submission_id) \
+            .subquery()
+        rows = db.session.query(Submission.id, Submission.status, Submission.time_used, Submission.memory_used,
+                                JudgeTask.state, last_case.c.testcase) \
+            .outerjoin(JudgeTask, JudgeTask.submission_id == Submission.id) \
+            .outerjoin(last_case, last_case.c.submission_id == Submission.id) \
+            .filter(Submission.id.in_(submission_ids)) \
+            .all()
+        snapshots = {}
+        for submission_id, status, time_used, memory_used, task_state, testcase in rows:
+            if status in FINAL_STATUS:
+                phase = "finished"
+            elif task_state == "running":
+                phase = "running"
+            else:
+                phase = "queued"
+            testcase = testcase or 0
+            snapshots[submission_id] = {
+                "submission_id": submission_id,
+                "status": status,
+                "phase": phase,
+                "testcase": testcase,
+                "time_used": time_used,
+                "memory_used": memory_used,
+                "version": f"{status}:{phase}:{testcase}",
+            }
+        return snapshots
+
+    def subscribe(self, submission_ids):
+        """订阅并立即推送一次当前状态"""
+        subscription = Subscription(submission_ids)
+        with self._lock:
+            for submission_id in subscription.submission_ids:
+                self._subscribers.setdefault(submission_id, set()).add(subscription)
+            self._ensure_thread()
+        for submission_id, snapshot in self.query_snapshots(list(subscription.submission_ids)).items():
+            with self._lock:
+                if self._snapshots.get(submission_id) == snapshot:
+                    subscription.events.put(snapshot)
+                    continue
+                # 状态已变化,同时推送给该提交的其他订阅者
+                self._snapshots[submission_id] = snapshot
+                for subscriber in self._subscribers.get(submission_id, ()):
+                    subscriber.events.put(snapshot)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for submission_id in subscription.submission_ids:
+                subscribers = self._subscribers.get(submission_id)
+                if subscribers is None:
+                    continue
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[submission_id]
+                    self._snapshots.pop(submission_id, None)
+
+    def notify(self, submission_id=None):
+        """提示状态可能已变化,没有订阅者时不产生任何查询"""
+        if self._subscribers and (submission_id is None or submission_id in self._subscribers):
+            self._wakeup.set()
+
+    def poll(self):
+        """读取所有被订阅提交的状态并推送变化,返回推送的事件数"""
+        with self._lock:
+            submission_ids = list(self._subscribers)
+        if not submission_ids:
+            return 0
+        snapshots = self.query_snapshots(submission_ids)
+        published = 0
+        with self._lock:
+            for submission_id, snapshot in snapshots.items():
+                if self._snapshots.get(submission_id) == snapshot:
+                    continue
+                self._snapshots[submission_id] = snapshot
+                for subscription in self._subscribers.get(submission_id, ()):
+                    subscription.events.put(snapshot)
+                    published += 1
+        return published
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+            with app.app_context():
+                try:
+                    self.poll()
+                except Exception as e:
+                    logging.error(f"Submission broker poll failed: {str(e)}")
+                finally:
+                    db.session.remove()
+
+
+submission_broker = SubmissionBroker(app.config['SUBMISSION_STREAM_POLL_INTERVAL'])
@@ -0,0 +1,159 @@
+from online_judge import app
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+import tempfile
+
+# 需要编译的语言,只有这些语言的编译结果会被缓存
+COMPILED_LANGUAGES = {"cpp"}
+
+# 条目中可执行文件的文件名
+BINARY_NAME = "binary"
+
+
+class CompileCache:
+    """按内容寻址的编译结果缓存
+
+    key 为 sha256(语言 + 编译参数 + 源代码),每个条目存放在 ``<root>/<key[:2]>/<key>/`` 目录下:
+    meta.json 记录编译结果,编译成功的条目还包含可执行文件 ``binary``。
+    meta.json 的修改时间作为最近使用时间,总大小超过 max_bytes 时按最近最少使用顺序淘汰。
+    多个评测进程可以共享同一个缓存目录。
+    """
+
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._bytes = None
+        os.makedirs(root, exist_ok=True)
+
+    @staticmethod
+    def key(code, language, flags=""):
+        digest = hashlib.sha256()
+        for part in (language, flags, code):
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def _entry_dir(self, key):
+        return os.path.join(self.root, key[:2], key)
+
+    def get(self, key):
+        """读取缓存条目,命中时刷新其最近使用时间
+
+        Returns:
+            dict | None: {"status": "CompileError", "message": "..."} 或
+                {"status": "Compiled", "binary": "<可执行文件路径>"},未命中返回 None
+        """
+        entry_dir = self._entry_dir(key)
+        meta_path = os.path.join(entry_dir, 'meta.json')
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            os.utime(meta_path)
+        except (OSError, ValueError):
+            return None
+        if entry.get("status") == "Compiled":
+            binary_path = os.path.join(entry_dir, BINARY_NAME)
+            if not os.path.isfile(binary_path):
+                return None
+            entry["binary"] = binary_path
+        return entry
+
+    def put(self, key, status, message="", binary=None):
+        """写入缓存条目
+
+        Args:
+            key (str): CompileCache.key() 的结果
+            status (str): "CompileError" 或 "Compiled"
+            message (str): 编译错误信息
+            binary (str, optional): 编译成功时评测机输出的可执行文件,复制到缓存中
+        """
+        entry_dir = self._entry_dir(key)
+        os.makedirs(os.path.dirname(entry_dir), exist_ok=True)
+        # 先写临时目录再改名,其他进程不会读到写了一半的条目
+        tmp_dir = tempfile.mkdtemp(dir=os.path.dirname(entry_dir))
+        meta_path = os.path.join(tmp_dir, 'meta.json')
+        try:
+            if binary is not None:
+                binary_path = os.path.join(tmp_dir, BINARY_NAME)
+                shutil.copyfile(binary, binary_path)
+                os.chmod(binary_path, 0o755)
+            with open(meta_path, 'w', encoding='utf-8') as f:
+                json.dump({"status": status, "message": message, "created": time.time()}, f)
+        except OSError as e:
+            logging.error(f"Failed to write compile cache entry {key}: {str(e)}")
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            return
+        size = self._entry_size(tmp_dir)
+        try:
+            os.rename(tmp_dir, entry_dir)
+        except OSError:
+            # 其他进程已写入相同条目
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            return
+
+        if self._bytes is None:
+            self._bytes = self.disk_usage()["bytes"]
+        else:
+            self._bytes += size
+        if self._bytes > self.max_bytes:
+            self.evict()
+
+    @staticmethod
+    def _entry_size(entry_dir):
+        size = 0
+        for name in ('meta.json', BINARY_NAME):
+            try:
+                size += os.path.getsize(os.path.join(entry_dir, name))
+            except OSError:
+                pass
+        return size
+
+    def _entries(self):
+        for prefix in os.listdir(self.root):
+            prefix_dir = os.path.join(self.root, prefix)
+            if not os.path.isdir(prefix_dir):
+                continue
+            for key in os.listdir(prefix_dir):
+                entry_dir = os.path.join(prefix_dir, key)
+                try:
+                    mtime = os.stat(os.path.join(entry_dir, 'meta.json')).st_mtime
+                except OSError:
+                    continue
+                yield entry_dir, mtime, self._entry_size(entry_dir)
+
+    def evict(self):
+        """按最近使用时间从旧到新淘汰,直到总大小不超过 max_bytes"""
+        entries = sorted(self._entries(), key=lambda entry: entry[1])
+        total = sum(size for _, _, size in entries)
+        for path, _, size in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+        self._bytes = total
+
+    def disk_usage(self):
+        entries = list(self._entries())
+        return {"entries": len(entries), "bytes": sum(size for _, _, size in entries)}
+
+
+_compile_cache = None
+
+
+def get_compile_cache():
+    """返回按 app.config 构建的缓存实例,COMPILE_CACHE_DIR 为空时禁用缓存"""
+    global _compile_cache
+    root = app.config['COMPILE_CACHE_DIR']
+    if not root:
+        return None
+    if _compile_cache is None or _compile_cache.root != root:
+        try:
+            _compile_cache = CompileCache(root, app.config['COMPILE_CACHE_MAX_BYTES'])
+        except OSError as e:
+            logging.error(f"Failed to init compile cache at {root}: {str(e)}")
+            return None
+    return _compile_cache
@@ -0,0 +1,165 @@
+from online_judge import app
+import os
+import json
+import logging
+import tempfile
+import threading
+import subprocess
+
+
+def judger_binary():
+    """评测机可执行文件路径
+
+    优先使用 JUDGER_BINARY,否则为 ``$JUDGER_PATH/target/<JUDGER_PROFILE>/judger``。
+    """
+    if app.config['JUDGER_BINARY']:
+        return app.config['JUDGER_BINARY']
+    return os.path.join(os.getenv('JUDGER_PATH', ''), "target", app.config['JUDGER_PROFILE'], "judger")
+
+
+class JudgerDaemon:
+    """常驻的评测机进程
+
+    以 ``judger serve --output-format jsonl`` 启动,通过 stdin 逐行接收任务:
+        {"problem_slug": "1", "language": "cpp", "src_path": "/tmp/.../submission_1.cpp"}
+    开启 COMPILE_CACHE_BINARIES 时任务还带有 binary_path,含义与命令行的 ``--binary-path`` 相同。
+    每个任务按结构化协议输出若干 testcase 记录,以一条 summary 记录结束。
+    进程在多个任务之间保持运行,省去每次评测的进程启动和配置/题目信息加载。
+
+    处理 max_jobs 个任务后自动重启;进程崩溃或超时被杀死后,下一个任务会重新拉起进程。
+    """
+
+    def __init__(self, binary, cwd, max_jobs=200):
+        self.binary = binary
+        self.cwd = cwd
+        self.max_jobs = max_jobs
+        self.process = None
+        self.jobs = 0
+        self._stderr = None
+        self._lock = threading.Lock()
+
+    def _start(self):
+        self._stderr = tempfile.TemporaryFile()
+        self.process = subprocess.Popen([self.binary, "serve", "--output-format", "jsonl"], cwd=self.cwd,
+                                        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=self._stderr,
+                                        text=True, bufsize=1)
+        self.jobs = 0
+        logging.info(f"Started judger daemon pid={self.process.pid}")
+
+    def _ensure_running(self):
+        if self.process is not None and (self.process.poll() is not None or self.jobs >= self.max_jobs):
+            self.stop()
+        if self.process is None:
+            self._start()
+
+    def stop(self):
+        """关闭 stdin 让评测机自行退出,超时未退出时强制结束"""
+        process, self.process = self.process, None
+        if process is None:
+            return
+        try:
+            if process.poll() is None:
+                process.stdin.close()
+                try:
+                    process.wait(timeout=5)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+                    process.wait()
+        except OSError:
+            pass
+        finally:
+            process.stdout.close()
+            if self._stderr is not None:
+                self._stderr.close()
+                self._stderr = None
+
+    def _stderr_text(self):
+        if self._stderr is None:
+            return ""
+        self._stderr.seek(0)
+        return self._stderr.read().decode('utf-8', 'replace')
+
+    def run_job(self, job, on_testcase, timeout=30):
+        """提交一个任务并逐行消费输出,语义与 stream_verdict 相同
+
+        on_testcase 抛出的异常原样抛出,评测机进程被杀死,下个任务重新拉起。
+
+        Raises:
+            subprocess.TimeoutExpired: 评测超时,评测机进程被杀死
+            subprocess.CalledProcessError: 评测机在输出 summary 之前退出
+        """
+        # 避免循环导入
+        from online_judge.judge.judger import parse_result_line
+
+        with self._lock:
+            self._ensure_running()
+            process = self.process
+            self.jobs += 1
+            timed_out = threading.Event()
+
+            def kill():
+                timed_out.set()
+                process.kill()
+
+            timer = threading.Timer(timeout, kill)
+            timer.start()
+            summary = None
+            try:
+                try:
+                    process.stdin.write(json.dumps(job) + "\n")
+                    process.stdin.flush()
+                except OSError:
+                    pass  # 进程已退出,下面读到 EOF 后按崩溃处理
+                for line in iter(process.stdout.readline, ""):
+                    record = parse_result_line(line)
+                    if record is None:
+                        continue
+                    if record["type"] == "testcase":
+                        on_testcase(record)
+                    else:
+                        summary = record
+                        break
+            except BaseException:
+                # 回调出错时该任务的剩余输出还未读取,继续使用会被下一个任务当成自己的结果,直接丢弃进程
+                process.kill()
+                self.stop()
+                raise
+            finally:
+                timer.cancel()
+
+            if summary is not None:
+                return summary
+            # 没有拿到 summary: 超时被杀或崩溃,丢弃该进程,下个任务重新拉起
+            returncode = process.wait()
+            stderr = self._stderr_text()
+            self.stop()
+            if timed_out.is_set():
+                raise subprocess.TimeoutExpired(self.binary, timeout)
+            logging.error(f"Judger daemon exited with code {returncode}: {stderr}")
+            raise subprocess.CalledProcessError(returncode, self.binary, stderr=stderr)
+
+
+_judger_daemon = None
+
+
+def get_judger_daemon():
+    """返回当前进程的常驻评测机,JUDGER_DAEMON 关闭时返回 None
+
+    每个评测 worker 进程各自持有一个常驻评测机;评测机路径变化时重建。
+    """
+    global _judger_daemon
+    if not app.config['JUDGER_DAEMON']:
+        return None
+    binary = judger_binary()
+    cwd = os.getenv('JUDGER_PATH')
+    if _judger_daemon is None or _judger_daemon.binary != binary or _judger_daemon.cwd != cwd:
+        stop_judger_daemon()
+        _judger_daemon = JudgerDaemon(binary, cwd, max_jobs=app.config['JUDGER_DAEMON_MAX_JOBS'])
+    return _judger_daemon
+
+
+def stop_judger_daemon():
+    global _judger_daemon
+    if _judger_daemon is not None:
+        _judger_daemon.stop()
+        _judger_daemon = None
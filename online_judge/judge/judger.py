@@ -0,0 +1,330 @@
+from online_judge import app, db
+from online_judge.models.submissions import Submission, TestcaseResult
+from online_judge.judge.compile_cache import CompileCache, get_compile_cache, COMPILED_LANGUAGES
+from online_judge.judge.broker import submission_broker
+from online_judge.judge.daemon import judger_binary, get_judger_daemon
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+import os
+import re
+import json
+import shutil
+import logging
+import tempfile
+import threading
+import subprocess
+from werkzeug.utils import secure_filename
+
+
+def clean_compile_error(message):
+    # 使用正则表达式移除路径前缀（保留行号）
+    return re.sub(r'/.*(/src\.cpp)', r'src.cpp', message).strip()
+
+
+def parse_result_line(line):
+    """解析评测机结构化输出(JSON lines)中的一行
+
+    评测机以 ``--output-format jsonl`` 运行时每行输出一条记录:
+        {"type": "testcase", "index": 1, "status": "Accepted", "time_ms": 12.0, "memory_bytes": 1024}
+        {"type": "summary", "status": "Accepted", "time_ms": 15.0, "memory_bytes": 2048, "message": ""}
+    编译错误时只输出 status 为 CompileError 的 summary,message 为编译信息。
+
+    Returns:
+        dict | None: 解析后的记录,空行或无法识别的行返回 None
+    """
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        record = json.loads(line)
+    except ValueError:
+        logging.warning(f"Unrecognized judger output: {line}")
+        return None
+    if not isinstance(record, dict) or record.get("type") not in ("testcase", "summary"):
+        return None
+    return record
+
+
+def stream_verdict(command, cwd, on_testcase, timeout=30):
+    """运行评测机并逐行消费结构化输出
+
+    每解析到一个测试点结果就调用 on_testcase(record),评测结束后返回 summary 记录。
+
+    Raises:
+        subprocess.TimeoutExpired: 评测超时
+        subprocess.CalledProcessError: 评测机非零退出
+        ValueError: 评测机没有输出 summary
+    """
+    summary = None
+    with tempfile.TemporaryFile() as stderr_file:
+        process = subprocess.Popen(command, cwd=cwd, stdout=subprocess.PIPE, stderr=stderr_file, text=True)
+        timed_out = threading.Event()
+
+        def kill():
+            timed_out.set()
+            process.kill()
+
+        timer = threading.Timer(timeout, kill)
+        timer.start()
+        try:
+            for line in process.stdout:
+                record = parse_result_line(line)
+                if record is None:
+                    continue
+                if record["type"] == "testcase":
+                    on_testcase(record)
+                else:
+                    summary = record
+            returncode = process.wait()
+        finally:
+            timer.cancel()
+            process.stdout.close()
+
+        if timed_out.is_set():
+            raise subprocess.TimeoutExpired(command, timeout)
+        if returncode != 0:
+            stderr_file.seek(0)
+            raise subprocess.CalledProcessError(returncode, command,
+                                                stderr=stderr_file.read().decode('utf-8', 'replace'))
+    if summary is None:
+        raise ValueError("judger produced no summary")
+    return summary
+
+
+def process_verdict(verdict):
+    if "CompileError" in verdict:
+        # 使用正则表达式匹配完整错误信息
+        print(f"status =\n {verdict}")
+        match = re.search(r'CompileError\("(.*?)"\)', verdict, re.DOTALL)
+        error_message = match.group(1)
+        # 处理转义字符并过滤路径
+        formatted_error = bytes(error_message, 'utf-8').decode('unicode_escape')
+        # 处理行末的转义符
+        return "CompileError",clean_compile_error(formatted_error),0,0
+    else:
+        status = "SystemError"
+        time_used = 0  # 单位：ms
+        memory_used = 0 # 单位：bytes
+
+        # 使用多行模式解析
+        lines = [line.strip() for line in verdict.split('\n') if line.strip()]
+        
+        # 解析状态（取第三行）
+        if len(lines) >= 3:
+            status = lines[2]
+        
+        # 解析时间和内存（取第四行）
+        if len(lines) >= 4:
+            time_pattern = r"Max time:\s*([\d.]+)(ms|s)"
+            mem_pattern = r"Max memory:\s*(\d+)\s*bytes"
+            
+            # 解析时间
+            time_match = re.search(time_pattern, lines[3])
+            if time_match:
+                value, unit = time_match.groups()
+                time_used = float(value) * 1000 if unit == "s" else float(value)
+            
+            # 解析内存
+            mem_match = re.search(mem_pattern, lines[3])
+            if mem_match:
+                memory_used = int(mem_match.group(1))
+
+        return status, "", time_used, memory_used  # 时间转为整数毫秒
+
+
+def run_structured(run, submission_id, lease_held=None):
+    """以结构化输出模式运行评测机,测试点结果边评测边写入 testcase_result 表
+
+    Args:
+        run (callable): run(on_testcase) 运行评测并返回 summary 记录,
+            由 stream_verdict(单次进程)或 JudgerDaemon.run_job(常驻进程)实现
+        submission_id (int): 提交记录ID
+        lease_held (callable, optional): 清空旧结果前确认任务租约,租约已丢失时不写入测试点结果
+
+    Returns:
+        tuple: (status, information, time_used, memory_used),与 process_verdict 一致
+    """
+    writable = lease_held is None or lease_held()
+    if writable:
+        TestcaseResult.clear(submission_id)
+        db.session.commit()
+
+    def on_testcase(record):
+        if not writable:
+            return
+        values = {
+            "status": record.get("status", "SystemError"),
+            "time_used": float(record.get("time_ms", 0)),
+            "memory_used": int(record.get("memory_bytes", 0)),
+        }
+        # 租约过期后新旧 worker 可能同时评测同一提交,同一测试点以后写入的为准,不违反唯一约束
+        db.session.execute(
+            sqlite_insert(TestcaseResult)
+            .values(submission_id=submission_id, case_index=int(record["index"]), **values)
+            .on_conflict_do_update(index_elements=["submission_id", "case_index"], set_=values)
+        )
+        # 逐条提交,前端可在评测过程中看到进度
+        db.session.commit()
+        submission_broker.notify(submission_id)
+
+    summary = run(on_testcase)
+    status = summary.get("status", "SystemError")
+    if status == "CompileError":
+        return status, clean_compile_error(summary.get("message", "")), 0, 0
+    return status, "", float(summary.get("time_ms", 0)), int(summary.get("memory_bytes", 0))
+
+
+def Judge(submission_id, workspace=None, update_stats=True, context=None, lease_held=None):
+    """执行代码评测的核心函数
+    
+    Args:
+        submission_id (int): 提交记录ID
+        workspace (str, optional): 临时工作区的父目录,默认使用系统临时目录
+        update_stats (bool): 写回结果时是否更新题目计数和比赛成绩,批量重测时为 False
+        context (AdmissionContext, optional): 提交时解析的比赛信息,传给结果写回以免重复查询
+        lease_held (callable, optional): 写回前调用,返回 False 表示任务租约已丢失
+            (任务已被回收给其他 worker),此时放弃本次评测结果
+
+    Returns:
+        str | None: 编译缓存命中情况,"hit"/"miss",不涉及编译缓存时为 None
+    """
+    submission = None
+    cache_state = None
+
+    def write_back(status, **kwargs):
+        if lease_held is not None and not lease_held():
+            logging.warning(f"Lease lost for submission {submission_id}, discarding verdict {status}")
+            return
+        submission.update_result_from_pending(status, update_stats=update_stats, **kwargs)
+
+    try:
+        # 获取提交记录
+        submission = Submission.get_with_source(submission_id)
+        if not submission:
+            logging.error(f"Submission {submission_id} not found")
+            return
+        # 任务已被抢占,通知订阅者进入评测阶段
+        submission_broker.notify(submission_id)
+
+        # 相同源码曾经编译失败时直接返回缓存的编译错误,不再调用评测机;
+        # 曾经编译成功时把缓存的可执行文件交给评测机,跳过编译
+        cache = get_compile_cache() if submission.language in COMPILED_LANGUAGES else None
+        entry = None
+        if cache is not None:
+            cache_key = CompileCache.key(submission.code, submission.language, app.config['JUDGE_COMPILE_FLAGS'])
+            entry = cache.get(cache_key)
+            if entry is not None and entry["status"] == "CompileError":
+                write_back("CompileError", ce_info=entry["message"])
+                return "hit"
+            if not app.config['COMPILE_CACHE_BINARIES']:
+                entry = None
+            cache_state = "miss"
+
+        # 校验评测环境
+        workspace_folder = os.getenv('JUDGER_PATH')
+        if not workspace_folder or not os.path.isdir(workspace_folder):
+            logging.error(f"Invalid JUDGER_PATH: {workspace_folder}")
+            write_back("SystemError", ce_info=f"Invalid JUDGER_PATH: {workspace_folder}")
+            return
+
+        # 创建临时工作区
+        with tempfile.TemporaryDirectory(dir=workspace) as tmp_dir:
+            # 准备源代码文件
+            ext_mapping = {
+                'cpp': 'cpp',
+                'python': 'py'
+            }
+            file_ext = ext_mapping.get(submission.language, 'txt')
+            src_filename = secure_filename(f"submission_{submission_id}.{file_ext}")
+            src_path = os.path.join(tmp_dir, src_filename)
+            
+            try:
+                with open(src_path, 'w', encoding='utf-8') as f:
+                    f.write(submission.code)
+            except Exception as e:
+                logging.error(f"Failed to write code: {str(e)}")
+                write_back("SystemError", ce_info="代码保存失败")
+                return
+
+            # 构建评测命令
+            command = [
+                judger_binary(),
+                "judge",
+                "--problem-slug", str(submission.problem_id),
+                "--language", submission.language,
+                "--src-path", src_path,
+            ]
+            job = {"problem_slug": str(submission.problem_id), "language": submission.language,
+                   "src_path": src_path}
+
+            # --binary-path 指向的文件已存在时评测机直接运行它,否则编译后把可执行文件写到该路径
+            binary_path = None
+            if cache is not None and app.config['COMPILE_CACHE_BINARIES']:
+                binary_path = os.path.join(tmp_dir, f"submission_{submission_id}.bin")
+                if entry is not None:
+                    try:
+                        # 复制到工作区,评测期间缓存条目被淘汰也不受影响
+                        shutil.copyfile(entry["binary"], binary_path)
+                        os.chmod(binary_path, 0o755)
+                        cache_state = "hit"
+                    except OSError:
+                        logging.warning(f"Cached binary for submission {submission_id} disappeared")
+                command += ["--binary-path", binary_path]
+                job["binary_path"] = binary_path
+
+            # 执行评测
+            daemon = get_judger_daemon()
+            if daemon is not None:
+                # 常驻评测机只支持结构化输出
+                status, information, time_used, memory_used = run_structured(
+                    lambda on_testcase: daemon.run_job(job, on_testcase, timeout=30), submission_id, lease_held)
+            elif app.config['JUDGER_OUTPUT_FORMAT'] == 'jsonl':
+                command += ["--output-format", "jsonl"]
+                status, information, time_used, memory_used = run_structured(
+                    lambda on_testcase: stream_verdict(command, workspace_folder, on_testcase, timeout=30),
+                    submission_id, lease_held)
+            else:
+                result = subprocess.run(
+                    command,
+                    cwd=workspace_folder,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                    text=True,
+                    timeout=30,  # 设置超时时间
+                    check=True   # 非零退出码触发异常
+                )
+                status, information, time_used, memory_used = process_verdict(result.stdout)
+            if cache is not None and cache_state == "miss" and status != "CompileError" \
+                    and binary_path is not None and os.path.isfile(binary_path):
+                cache.put(cache_key, "Compiled", binary=binary_path)
+            if status == "CompileError":
+                if cache is not None:
+                    cache.put(cache_key, status, information)
+                # 清理路径信息
+                write_back(
+                    status,
+                    time_used=0,
+                    memory_used=0,
+                    ce_info=information,
+                    context=context,
+                )
+            else:
+                write_back(
+                    status,
+                    time_used=time_used,
+                    memory_used=memory_used,
+                    context=context,
+                )
+            return cache_state
+
+    except Exception as e:
+        # logging.critical(f"Critical error in Judge: {str(e)}", exc_info=True)
+        print(f"Critical error in Judge: {str(e)}")
+    
+        if submission:
+            # 失败的语句会使会话进入待回滚状态,先回滚再写回
+            db.session.rollback()
+            write_back("SystemError", ce_info="system error")
+    finally:
+        # 确保数据库会话关闭
+        db.session.remove()
+        submission_broker.notify(submission_id)
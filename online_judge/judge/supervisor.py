@@ -0,0 +1,107 @@
+from online_judge import app, db
+from online_judge.models.judge_queue import JudgeTask
+from online_judge.judge.worker import run_worker, default_worker_id
+import os
+import time
+import shutil
+import signal
+import logging
+import tempfile
+import multiprocessing
+
+
+def physical_cpu_count():
+    """物理核心数,读取 /proc/cpuinfo 失败时退回逻辑核心数"""
+    try:
+        cores = set()
+        physical_id = core_id = None
+        with open('/proc/cpuinfo') as f:
+            for line in f:
+                key, _, value = line.partition(':')
+                key = key.strip()
+                if key == 'physical id':
+                    physical_id = value.strip()
+                elif key == 'core id':
+                    core_id = value.strip()
+                elif not key and physical_id is not None and core_id is not None:
+                    cores.add((physical_id, core_id))
+                    physical_id = core_id = None
+        if physical_id is not None and core_id is not None:
+            cores.add((physical_id, core_id))
+        if cores:
+            return len(cores)
+    except OSError:
+        pass
+    return os.cpu_count() or 1
+
+
+def _worker_process(worker_id, stop_event):
+    # 中断信号由 supervisor 统一处理,子进程只响应 stop_event
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    workspace = tempfile.mkdtemp(prefix=f"judge-{worker_id}-")
+    try:
+        with app.app_context():
+            # 不复用父进程 fork 过来的数据库连接
+            db.engine.dispose(close=False)
+            run_worker(worker_id=worker_id, stop_event=stop_event, workspace=workspace)
+    finally:
+        shutil.rmtree(workspace, ignore_errors=True)
+
+
+class JudgeSupervisor:
+    """启动并看护多个评测 worker 进程
+
+    每个 worker 是独立进程,拥有独立的临时工作区;worker 异常退出后会被重新拉起。
+    supervisor 定期输出吞吐量(verdicts/minute)和各通道的等待时间。
+    """
+
+    def __init__(self, workers=None, report_interval=None, report=None):
+        self.workers = workers or app.config['JUDGE_WORKERS'] or physical_cpu_count()
+        self.report_interval = report_interval or app.config['JUDGE_REPORT_INTERVAL']
+        self.report = report or logging.info
+        self.stop_event = multiprocessing.Event()
+        self.processes = {}
+
+    def _spawn(self, index):
+        worker_id = f"{default_worker_id()}-w{index}"
+        process = multiprocessing.Process(target=_worker_process, args=(worker_id, self.stop_event),
+                                          name=worker_id, daemon=False)
+        process.start()
+        self.processes[index] = process
+
+    def stop(self):
+        self.stop_event.set()
+
+    def report_stats(self):
+        stats = JudgeTask.stats(window_seconds=self.report_interval)
+        db.session.remove()
+        lanes = stats["lanes"]
+        self.report(
+            f"judge throughput {stats['verdicts_per_minute']:.1f} verdicts/min | "
+            f"contest: queued={lanes['contest']['queued']} avg_wait={lanes['contest']['avg_wait']:.2f}s | "
+            f"practice: queued={lanes['practice']['queued']} avg_wait={lanes['practice']['avg_wait']:.2f}s"
+        )
+        return stats
+
+    def run(self):
+        """阻塞运行直到 stop() 被调用,退出前等待所有 worker 完成当前任务"""
+        for index in range(self.workers):
+            self._spawn(index)
+        self.report(f"judge supervisor started with {self.workers} workers")
+
+        next_report = time.monotonic() + self.report_interval
+        try:
+            while not self.stop_event.wait(1):
+                for index, process in list(self.processes.items()):
+                    if not process.is_alive():
+                        self.report(f"judge worker {process.name} exited with {process.exitcode}, restarting")
+                        self._spawn(index)
+                if time.monotonic() >= next_report:
+                    self.report_stats()
+                    next_report = time.monotonic() + self.report_interval
+        finally:
+            self.stop_event.set()
+            for process in self.processes.values():
+                process.join()
+        self.report("judge supervisor stopped")
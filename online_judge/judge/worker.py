@@ -0,0 +1,160 @@
+from online_judge import app, db
+from online_judge.models.submissions import Submission
+from online_judge.models.judge_queue import JudgeTask
+from online_judge.models.rejudge import RejudgeJob
+from online_judge.judge.judger import Judge
+from online_judge.judge.daemon import stop_judger_daemon
+import os
+import time
+import socket
+import logging
+import threading
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class LeaseKeeper(threading.Thread):
+    """评测期间在后台线程中定时续约,避免长时间评测的任务被误回收"""
+
+    def __init__(self, task_id, worker_id, lease_seconds):
+        super().__init__(daemon=True)
+        self.task_id = task_id
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        self.lost = False
+        self._stop_event = threading.Event()
+
+    def run(self):
+        interval = max(self.lease_seconds / 3, 1)
+        while not self._stop_event.wait(interval):
+            # 线程内使用独立的应用上下文,从而拥有独立的数据库会话
+            with app.app_context():
+                try:
+                    if not JudgeTask.heartbeat(self.task_id, self.worker_id, self.lease_seconds):
+                        self.lost = True
+                        logging.warning(f"Lease lost for judge task {self.task_id}")
+                        return
+                finally:
+                    db.session.remove()
+
+    def held(self):
+        """写回结果前在当前会话中再确认一次租约,后台线程尚未发现的过期也能拦下"""
+        if not self.lost and not JudgeTask.heartbeat(self.task_id, self.worker_id, self.lease_seconds):
+            self.lost = True
+            logging.warning(f"Lease lost for judge task {self.task_id}")
+        return not self.lost
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def process_task(task, worker_id, workspace=None, context=None):
+    """评测一个已抢占的任务并标记完成
+
+    context 为提交时解析的 AdmissionContext(仅 JUDGE_INLINE 模式),写回时不再查询比赛信息
+    """
+    lease_seconds = app.config['JUDGE_LEASE_SECONDS']
+    # Judge() 结束时会关闭会话,先取出需要的字段
+    task_id, submission_id, attempts = task.id, task.submission_id, task.attempts
+    rejudge_job_id = task.rejudge_job_id
+
+    submission = db.session.get(Submission, submission_id)
+    if submission is None or submission.status != "Pending":
+        # 上一个 worker 已写回结果但未来得及标记完成,直接收尾,避免重复评测
+        finish_task(task_id, worker_id, rejudge_job_id)
+        return
+
+    if attempts > app.config['JUDGE_MAX_ATTEMPTS']:
+        logging.error(f"Submission {submission_id} exceeded max judge attempts")
+        submission.update_result_from_pending("SystemError", ce_info="judge attempts exceeded",
+                                              update_stats=rejudge_job_id is None)
+        finish_task(task_id, worker_id, rejudge_job_id)
+        return
+
+    keeper = LeaseKeeper(task_id, worker_id, lease_seconds)
+    keeper.start()
+    try:
+        cache_state = Judge(submission_id, workspace=workspace, update_stats=rejudge_job_id is None,
+                            context=context, lease_held=keeper.held)
+    finally:
+        keeper.stop()
+    if keeper.lost:
+        # 任务已被回收给其他 worker,结果已放弃,由新的持有者完成任务
+        return
+    finish_task(task_id, worker_id, rejudge_job_id, compile_cache=cache_state)
+
+
+def finish_task(task_id, worker_id, rejudge_job_id=None, compile_cache=None):
+    """标记任务完成,属于批量重测的任务同时推进重测进度"""
+    if JudgeTask.complete(task_id, worker_id, compile_cache=compile_cache) and rejudge_job_id is not None:
+        RejudgeJob.task_done(rejudge_job_id)
+
+
+def judge_inline(submission_id, context=None):
+    """在当前进程中立即评测指定提交(JUDGE_INLINE 模式)"""
+    worker_id = f"inline-{default_worker_id()}"
+    task = JudgeTask.acquire(worker_id, app.config['JUDGE_LEASE_SECONDS'], submission_id=submission_id)
+    if task is None:
+        return
+    process_task(task, worker_id, context=context)
+
+
+def run_worker(worker_id=None, poll_interval=None, max_jobs=None, stop_event=None, workspace=None):
+    """评测 worker 主循环
+
+    不断从队列抢占任务并评测,直到 stop_event 被设置或处理完 max_jobs 个任务。
+    正在评测的任务会先完成再退出。
+
+    Args:
+        worker_id (str, optional): worker 标识,默认 "<hostname>-<pid>"
+        poll_interval (float, optional): 队列为空时的轮询间隔(秒)
+        max_jobs (int, optional): 处理多少个任务后退出,默认不限
+        stop_event (threading.Event, optional): 外部停止信号
+        workspace (str, optional): 本 worker 独占的临时工作区父目录
+
+    Returns:
+        int: 处理的任务数
+    """
+    worker_id = worker_id or default_worker_id()
+    if poll_interval is None:
+        poll_interval = app.config['JUDGE_POLL_INTERVAL']
+    lease_seconds = app.config['JUDGE_LEASE_SECONDS']
+    starvation_seconds = app.config['JUDGE_PRACTICE_MAX_WAIT']
+    starvation_every = app.config['JUDGE_PRACTICE_BOOST_EVERY']
+    stop_event = stop_event or threading.Event()
+
+    handled = 0
+    last_requeue = None
+    try:
+        while not stop_event.is_set():
+            # 回收过期租约需要写锁,每个租约周期最多执行一次
+            if last_requeue is None or time.monotonic() - last_requeue >= lease_seconds:
+                JudgeTask.requeue_expired()
+                last_requeue = time.monotonic()
+            task = JudgeTask.acquire(worker_id, lease_seconds, starvation_seconds=starvation_seconds,
+                                    starvation_every=starvation_every)
+            if task is None:
+                db.session.remove()
+                stop_event.wait(poll_interval)
+                continue
+
+            task_id = task.id
+            try:
+                process_task(task, worker_id, workspace=workspace)
+            except Exception as e:
+                logging.error(f"Judge worker {worker_id} failed on task {task_id}: {str(e)}")
+                db.session.rollback()
+                JudgeTask.release(task_id, worker_id)
+            finally:
+                db.session.remove()
+
+            handled += 1
+            if max_jobs and handled >= max_jobs:
+                break
+    finally:
+        # worker 退出时关闭本进程的常驻评测机
+        stop_judger_daemon()
+    return handled
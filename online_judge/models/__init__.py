@@ -1,5 +1,9 @@
 from .contests import *
 from .submissions import *
 from .problems import *
+from .progress import *
 from .homework import *
-from .questions import *
\ No newline at end of file
+from .questions import *
+from .judge_queue import *
+from .rejudge import *
+from .archive import *
@@ -0,0 +1,226 @@
+from online_judge import app, db, archive_db_path
+from online_judge.models.contests import Contest
+from online_judge.models.submissions import Submission, SourceBlob, TestcaseResult
+from online_judge.models.judge_queue import JudgeTask
+from sqlalchemy import Enum
+from sqlalchemy import DateTime
+from sqlalchemy import select, and_, or_, exists, inspect, func
+from sqlalchemy.orm import deferred, undefer_group
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from datetime import datetime, timedelta
+import os
+import heapq
+
+# 每批归档的提交数
+ARCHIVE_BATCH_SIZE = 500
+
+
+class ArchivedSubmission(db.Model):
+    """归档库(SQLALCHEMY_BINDS['archive'])中的旧提交,列与 submission 相同,id 保持不变
+
+    源代码仍按 code_hash 存放在主库的 source_blob 中,归档不复制源代码。
+    """
+    __bind_key__ = 'archive'
+    __tablename__ = 'archived_submission'
+
+    id = db.Column(db.Integer, primary_key=True)
+    language = db.Column(Enum("cpp","python", name="language_type"))
+    user_id = db.Column(db.Integer)
+    problem_id = db.Column(db.Integer)
+    submit_time = db.Column(DateTime)
+    contest_id = db.Column(db.Integer, nullable=True)
+
+    status = db.Column(Enum("Pending","Accepted","WrongAnswer","TimeLimitExceeded","IdlenessLimitExceeded",
+        "RuntimeError","SystemError","CompileError", name="status_type"))
+    time_used = db.Column(db.Float)
+    memory_used = db.Column(db.Integer)
+    compile_error_info = deferred(db.Column(db.Text), group="source")
+
+    code_hash = db.Column(db.String(64))
+    code_size = db.Column(db.Integer)
+    data_version = db.Column(db.Integer, default=0)
+    archive_time = db.Column(DateTime)
+
+    __table_args__ = (
+        # 与 submission 相同的访问模式
+        db.Index('idx_archived_submission_user_problem', 'user_id', 'problem_id', 'submit_time'),
+        db.Index('idx_archived_submission_contest_user', 'contest_id', 'user_id', 'submit_time'),
+        db.Index('idx_archived_submission_problem_status', 'problem_id', 'status', 'submit_time'),
+        db.Index('idx_archived_submission_submit_time', 'submit_time'),
+    )
+
+    def __repr__(self):
+        return "<ArchivedSubmission %r>" % self.id
+
+    @property
+    def code(self):
+        blob = db.session.get(SourceBlob, self.code_hash)
+        return blob.text if blob is not None else None
+
+    @staticmethod
+    def get_with_source(submission_id):
+        return db.session.get(ArchivedSubmission, submission_id, options=[undefer_group("source")])
+
+
+class ArchivedTestcaseResult(db.Model):
+    """归档提交的测试点结果"""
+    __bind_key__ = 'archive'
+    __tablename__ = 'archived_testcase_result'
+
+    id = db.Column(db.Integer, primary_key=True)
+    submission_id = db.Column(db.Integer, index=True)
+    case_index = db.Column(db.Integer)
+    status = db.Column(db.String(32))
+    time_used = db.Column(db.Float)
+    memory_used = db.Column(db.Integer)
+
+    def __repr__(self):
+        return "<ArchivedTestcaseResult submission_id=%r case=%r status=%r>" % \
+               (self.submission_id, self.case_index, self.status)
+
+    to_dict = TestcaseResult.to_dict
+
+    @staticmethod
+    def for_submission(submission_id):
+        return ArchivedTestcaseResult.query.filter_by(submission_id=submission_id) \
+            .order_by(ArchivedTestcaseResult.case_index).all()
+
+
+_archive_state = {"signature": None, "available": False}
+
+
+def archive_available():
+    """归档库中是否有已归档的提交
+
+    归档库文件不存在、尚未执行 upgrade_schema 建表或还没有归档过提交时返回 False,
+    读取路径据此跳过归档库查询。检查结果按文件的修改时间和大小缓存,
+    只在 archive_submissions 写入归档库后才重新检查,平时每次调用只有一次 stat。
+    """
+    try:
+        stat = os.stat(archive_db_path)
+    except OSError:
+        return False
+    signature = (stat.st_mtime_ns, stat.st_size)
+    if signature != _archive_state["signature"]:
+        available = inspect(db.engines['archive']).has_table(ArchivedSubmission.__tablename__) \
+            and db.session.query(ArchivedSubmission.id).first() is not None
+        _archive_state.update(signature=signature, available=available)
+    return _archive_state["available"]
+
+
+def submission_models():
+    """需要读取的提交表: 主库,以及有归档数据时的归档库"""
+    if archive_available():
+        return (Submission, ArchivedSubmission)
+    return (Submission,)
+
+
+def find_submission(submission_id):
+    """按ID读取提交(包括源代码),主库没有时读取归档库
+
+    Returns:
+        tuple: (submission, testcases),都找不到时为 (None, [])
+    """
+    submission = Submission.get_with_source(submission_id)
+    if submission is not None:
+        return submission, TestcaseResult.for_submission(submission_id)
+    if not archive_available():
+        return None, []
+    submission = ArchivedSubmission.get_with_source(submission_id)
+    if submission is not None:
+        return submission, ArchivedTestcaseResult.for_submission(submission_id)
+    return None, []
+
+
+def merge_tiers(*tiers, key, reverse=False):
+    """按同一顺序合并主库和归档库的查询结果
+
+    各部分都已按 key 排好序,逐行归并,不会读出多余的行。归档中途中断时同一提交可能同时存在于两边,
+    key 中包含 id 时重复的两行相邻,只保留一条。
+    """
+    last_id = None
+    for row in heapq.merge(*tiers, key=key, reverse=reverse):
+        if row.id == last_id:
+            continue
+        last_id = row.id
+        yield row
+
+
+def archivable_filter(cutoff, now):
+    """可以归档的提交: 早于 cutoff、已评测完成、不属于未结束的比赛、没有未完成的评测任务"""
+    return and_(
+        Submission.submit_time < cutoff,
+        Submission.status != "Pending",
+        # 练习提交的 contest_id 为 0(旧数据可能为空)
+        or_(Submission.contest_id.is_(None), Submission.contest_id == 0,
+            exists().where(Contest.id == Submission.contest_id, Contest.end_time < now)),
+        ~exists().where(JudgeTask.submission_id == Submission.id, JudgeTask.state != "done"),
+    )
+
+
+def archive_submissions(days=None, batch_size=ARCHIVE_BATCH_SIZE, now=None):
+    """把超过 days 天的提交分批移到归档库
+
+    每批先写入归档库并提交,再从主库删除提交、测试点结果和已完成的评测任务;
+    两个库之间没有分布式事务,中途中断时重复执行即可(归档库按 id 忽略已存在的行)。
+    迁移前仍内联存放的源代码会先写入 source_blob。
+
+    submission 表的主键没有 AUTOINCREMENT,SQLite 会从现存的最大 id 继续分配,
+    因此主库中 id 最大的提交永远不归档,已归档的 id 不会被新提交重新使用。
+    测试点结果的 id 会随重测重新分配,归档时不保留原 id。
+
+    Returns:
+        int: 归档的提交数
+    """
+    if not now:
+        now = datetime.now()
+    if days is None:
+        days = app.config['SUBMISSION_ARCHIVE_DAYS']
+    cutoff = now - timedelta(days=days)
+    code_column = Submission.__table__.c.code
+    columns = [column for column in Submission.__table__.c if column.key != "code"]
+
+    max_id = db.session.query(func.max(Submission.id)).scalar()
+    if max_id is None:
+        return 0
+
+    archived = 0
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            select(*columns, code_column)
+            .where(Submission.id > last_id, Submission.id < max_id, archivable_filter(cutoff, now))
+            .order_by(Submission.id)
+            .limit(batch_size)
+        ).mappings().all()
+        if not rows:
+            break
+        last_id = rows[-1]["id"]
+        ids = [row["id"] for row in rows]
+
+        values = []
+        for row in rows:
+            row = dict(row)
+            code = row.pop("code")
+            if row["code_size"] is None and code is not None:
+                blob = SourceBlob.compress(code)
+                SourceBlob.store(blob)
+                row.update(code_hash=blob["hash"], code_size=blob["size"])
+            values.append(dict(row, archive_time=now))
+        db.session.execute(sqlite_insert(ArchivedSubmission).on_conflict_do_nothing(index_elements=["id"]), values)
+        cases = db.session.query(TestcaseResult.submission_id, TestcaseResult.case_index,
+                                 TestcaseResult.status, TestcaseResult.time_used, TestcaseResult.memory_used) \
+            .filter(TestcaseResult.submission_id.in_(ids)).all()
+        # 上次中断时可能已写入部分测试点结果,先清掉再整批写入
+        ArchivedTestcaseResult.query.filter(ArchivedTestcaseResult.submission_id.in_(ids)) \
+            .delete(synchronize_session=False)
+        if cases:
+            db.session.execute(sqlite_insert(ArchivedTestcaseResult), [dict(case._mapping) for case in cases])
+        db.session.commit()
+
+        TestcaseResult.query.filter(TestcaseResult.submission_id.in_(ids)).delete(synchronize_session=False)
+        JudgeTask.query.filter(JudgeTask.submission_id.in_(ids)).delete(synchronize_session=False)
+        Submission.query.filter(Submission.id.in_(ids)).delete(synchronize_session=False)
+        db.session.commit()
+        archived += len(ids)
+    return archived
@@ -1,28 +1,168 @@
 from flask import jsonify
-from online_judge import db
+from online_judge import app, db
 from online_judge.models.problems import Problem
 from sqlalchemy import DateTime
 from datetime import datetime
 from sqlalchemy import exc
+from sqlalchemy import update, insert, func, case, and_, or_, select, literal
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from itertools import islice
 import time
 import json
 
 PENALTY_PER_ATTEMPT = 20
+# 错误次数分布的最后一档,错误次数不少于该值的通过者计入同一档
+ATTEMPT_HISTOGRAM_MAX = 10
 
 contest_problem = db.Table('contest_problem',
     db.Column('contest_id', db.Integer, db.ForeignKey('contest.id'), primary_key=True),
     db.Column('problem_id', db.Integer, db.ForeignKey('problem.id'), primary_key=True),
+    # 主键 (contest_id, problem_id) 覆盖按比赛查询,按题目反查比赛需要单独的索引
+    db.Index('idx_contest_problem_problem', 'problem_id'),
 )
 
+def chunked(iterable, size):
+    """把可迭代对象按 size 个一组依次产出列表,不会一次展开整个序列"""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def assign_ranks(ranklist):
+    """为已排序的排行榜的每一行写入 rank,通过题数和罚时都相同的用户名次相同"""
+    rank = 0
+    previous = None
+    for position, row in enumerate(ranklist):
+        key = (row["score"], row["penalty"])
+        if key != previous:
+            rank = position + 1
+            previous = key
+        row["rank"] = rank
+    return ranklist
+
+class ContestUserProblem(db.Model):
+    """参赛者在比赛中某一题目的成绩,每个 (比赛, 用户, 题目) 一行
+
+    solve_time 为通过时距比赛开始的分钟数,未通过时为 -1;
+    attempts 为通过前的错误提交次数。
+    """
+    __tablename__ = 'contest_user_problem'
+
+    id = db.Column(db.Integer, primary_key=True)
+    contest_id = db.Column(db.Integer, db.ForeignKey("contest.id"))
+    user_id = db.Column(db.Integer)
+    problem_id = db.Column(db.Integer)
+    attempts = db.Column(db.Integer, default=0)
+    solve_time = db.Column(db.Integer, default=-1)
+    first_ac_submission_id = db.Column(db.Integer, nullable=True)
+
+    __table_args__ = (
+        db.UniqueConstraint('contest_id', 'user_id', 'problem_id', name='uq_contest_user_problem'),
+    )
+
+    def __init__(self, contest_id, user_id, problem_id, attempts=0, solve_time=-1, first_ac_submission_id=None):
+        self.contest_id = contest_id
+        self.user_id = user_id
+        self.problem_id = problem_id
+        self.attempts = attempts
+        self.solve_time = solve_time
+        self.first_ac_submission_id = first_ac_submission_id
+
+    def __repr__(self):
+        return "<ContestUserProblem contest_id=%r user_id=%r problem_id=%r attempts=%r solve_time=%r>" % \
+               (self.contest_id, self.user_id, self.problem_id, self.attempts, self.solve_time)
+
+    @staticmethod
+    def from_details(contest_id, user_id, score_details):
+        """把 score_details 格式的字典转换为行对象"""
+        return [
+            ContestUserProblem(contest_id, user_id, int(pid),
+                               attempts=int(detail.get("attempts", 0)),
+                               solve_time=int(detail.get("solve_time", -1)),
+                               first_ac_submission_id=detail.get("first_ac_submission"))
+            for pid, detail in score_details.items()
+        ]
+
+    @staticmethod
+    def replace_contest(contest_id, details_by_user):
+        """用重新计算的结果替换整场比赛的成绩(不提交事务)
+
+        Args:
+            contest_id (int): 比赛ID
+            details_by_user (dict): user_id -> score_details 格式的字典
+        """
+        ContestUserProblem.query.filter_by(contest_id=contest_id).delete(synchronize_session=False)
+        rows = []
+        for user_id, score_details in details_by_user.items():
+            rows.extend(ContestUserProblem.from_details(contest_id, user_id, score_details))
+        db.session.bulk_save_objects(rows)
+        ContestProblemStat.recompute(contest_id)
+        Contest.bump_ranklist_version(contest_id)
+
+    @staticmethod
+    def migrate_score_details(batch_size=500):
+        """把 contest_user.score_details 中的 JSON 成绩迁移到 contest_user_problem 表
+
+        已存在的行保持不变,可以重复执行。
+
+        Returns:
+            int: 新写入的行数
+        """
+        migrated = 0
+        last_id = 0
+        while True:
+            changed_contests = set()
+            contest_users = db.session.query(ContestUser.id, ContestUser.contest_id, ContestUser.user_id,
+                                             ContestUser.score_details) \
+                .filter(ContestUser.id > last_id) \
+                .order_by(ContestUser.id) \
+                .limit(batch_size) \
+                .all()
+            if not contest_users:
+                break
+            last_id = contest_users[-1].id
+            for contest_user in contest_users:
+                try:
+                    score_details = json.loads(contest_user.score_details or "{}")
+                except ValueError:
+                    continue
+                for row in ContestUserProblem.from_details(contest_user.contest_id, contest_user.user_id,
+                                                           score_details):
+                    result = db.session.execute(
+                        sqlite_insert(ContestUserProblem)
+                        .values(contest_id=row.contest_id, user_id=row.user_id, problem_id=row.problem_id,
+                                attempts=row.attempts, solve_time=row.solve_time,
+                                first_ac_submission_id=row.first_ac_submission_id)
+                        .on_conflict_do_nothing(index_elements=['contest_id', 'user_id', 'problem_id'])
+                    )
+                    if result.rowcount:
+                        migrated += result.rowcount
+                        changed_contests.add(contest_user.contest_id)
+            # 每次递增版本号都要写入事件,这里按比赛合并为一条 reset
+            for contest_id in changed_contests:
+                Contest.bump_ranklist_version(contest_id)
+            db.session.commit()
+        return migrated
+
+
 class ContestUser(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     contest_id = db.Column(db.Integer, db.ForeignKey("contest.id"), index=True)
     user_id = db.Column(db.Integer, index=True)
+    # 已废弃: 成绩改存 contest_user_problem 表,仅保留供 migrate_score_details 迁移旧数据
     score_details = db.Column(db.Text)
 
     # score = db.Column(db.Integer)
     # time_spent = db.Column(db.Integer)
 
+    __table_args__ = (
+        # 使用唯一索引而不是表约束,已有的表可以通过 dedupe_contest_users 命令补建
+        db.Index('uq_contest_user', 'contest_id', 'user_id', unique=True),
+    )
+
     def __init__(self, contest_id, user_id):
         self.contest_id = contest_id
         self.user_id = user_id
@@ -32,8 +172,8 @@ class ContestUser(db.Model):
         # self.time_spent = 0
 
     def __repr__(self):
-        return "<ContestPlayer contest_id:%s user_id=%s score_details=%s>" % \
-               (self.contest_id, self.user_id, self.score_details)
+        return "<ContestPlayer contest_id:%s user_id=%s>" % (self.contest_id, self.user_id)
+
     def calculate_score(self,problem_ids):
         """
         Return (score,penalty) by given problem_ids
@@ -42,19 +182,80 @@ class ContestUser(db.Model):
         Returns:
             score,penalty
         """
-        score = 0
-        penalty = 0
-        score_details = json.loads(self.score_details)
-        for problem_id in problem_ids:
-            pid = str(problem_id)
-            if pid in score_details:
-                if score_details[pid]["solve_time"] != -1:
-                    score += 1
-                    penalty += score_details[pid]["solve_time"] + score_details[pid]["attempts"] * PENALTY_PER_ATTEMPT
-        return score,penalty
-
-    def update_score(self, submission):
-        score_details = json.loads(self.score_details)
+        solved = ContestUserProblem.solve_time != -1
+        score, penalty = db.session.query(
+            func.count(ContestUserProblem.id),
+            func.sum(ContestUserProblem.solve_time + ContestUserProblem.attempts * PENALTY_PER_ATTEMPT),
+        ).filter(ContestUserProblem.contest_id == self.contest_id,
+                 ContestUserProblem.user_id == self.user_id,
+                 ContestUserProblem.problem_id.in_(problem_ids),
+                 solved).one()
+        return score, penalty or 0
+
+    def update_score(self, submission, contest_start_time=None, commit=True):
+        """根据一条已评测的提交更新成绩
+
+        先用 INSERT ... ON CONFLICT DO NOTHING 保证该题的成绩行存在,
+        再用带 ``solve_time = -1`` 条件的原子更新累加错误次数或记录通过时间,
+        已通过的题目不再变化。整个过程不需要先读出旧成绩。
+
+        Args:
+            submission (Submission): 已写入评测结果的提交
+            contest_start_time (datetime, optional): 比赛开始时间,调用方已查询过时传入以免重复查询
+            commit (bool): 是否立即提交事务,由调用方统一提交时传 False
+        """
+        ContestUser.record_verdict(self.contest_id, self.user_id, submission, contest_start_time=contest_start_time)
+        if commit:
+            db.session.commit()
+
+    @staticmethod
+    def record_verdict(contest_id, user_id, submission, contest_start_time=None):
+        """update_score 的实现,调用方已确认参赛资格时无需先加载 ContestUser(不提交事务)
+
+        成绩发生变化时同时写入一条 scoreboard_event,供实时排行榜推送增量,并增量更新题目统计。
+        """
+        key = {"contest_id": contest_id, "user_id": user_id, "problem_id": submission.problem_id}
+        first_try = db.session.execute(
+            sqlite_insert(ContestUserProblem)
+            .values(attempts=0, solve_time=-1, **key)
+            .on_conflict_do_nothing(index_elements=list(key))
+        ).rowcount == 1
+        row = update(ContestUserProblem).where(
+            ContestUserProblem.contest_id == contest_id,
+            ContestUserProblem.user_id == user_id,
+            ContestUserProblem.problem_id == submission.problem_id,
+            ContestUserProblem.solve_time == -1,
+        )
+        solve_time = None
+        if submission.status == "Accepted":
+            if contest_start_time is None:
+                contest_start_time = db.session.query(Contest.start_time).filter(Contest.id == contest_id).scalar()
+            solve_time = int((submission.submit_time.replace(tzinfo=None) - contest_start_time).total_seconds() // 60)
+            row = row.values(solve_time=solve_time, first_ac_submission_id=submission.id)
+        else:
+            row = row.values(attempts=ContestUserProblem.attempts + 1)
+        # RETURNING 取回更新后的错误次数,统计通过前错误次数的分布时不需要再读一次
+        changed = db.session.execute(row.returning(ContestUserProblem.attempts)).first()
+        if changed is not None:
+            ScoreboardEvent.record_delta(contest_id, user_id, submission.problem_id, submission.submit_time)
+            ContestProblemStat.record_verdict(contest_id, submission.problem_id, first_try,
+                                              solve_time=solve_time, attempts=changed.attempts,
+                                              user_id=user_id, submission_id=submission.id)
+            # 已通过题目的重复提交不改变成绩,不让排行榜缓存和 ETag 失效
+            Contest.bump_ranklist_version(contest_id, scoreboard_reset=False)
+
+    @staticmethod
+    def apply_submission(score_details, submission, contest_start_time):
+        """把一条提交计入 score_details 格式的字典,已通过的题目不再变化(用于重放计算)
+
+        Args:
+            score_details (dict): 待更新的成绩详情
+            submission: 带有 id/problem_id/status/submit_time 属性的提交(可以是只查询了这几列的行)
+            contest_start_time (datetime): 比赛开始时间,用于计算通过时间
+
+        Returns:
+            bool: score_details 是否发生变化
+        """
         pid = str(submission.problem_id)
         if pid not in score_details:
             score_details[pid] = {}
@@ -62,28 +263,76 @@ class ContestUser(db.Model):
             score_details[pid]["attempts"]=0
         else:
             if score_details[pid]["solve_time"] != -1: # Have accepted
-                return
-            
+                return False
+
         if submission.status == "Accepted":
-            contest_start_time = Contest.query.filter_by(id=self.contest_id).first().start_time
             score_details[pid]["solve_time"] = (submission.submit_time-contest_start_time).total_seconds() // 60
-            # self.time_spent += score_details["solve_time"] + score_details[pid]["attempts"] * PENALTY_PER_ATTEMPT
-            # self.score += 1
+            score_details[pid]["first_ac_submission"] = submission.id
         else:
             score_details[pid]["attempts"] += 1
-
-        self.score_details = json.dumps(score_details)
-        # print(f"test === {self.score_details}")
-        self.save()
+        return True
 
     def get_score_details(self):
-        return json.loads(self.score_details)
+        """返回 {"<problem_id>": {"solve_time": 120, "attempts": 1}, ...} 格式的成绩详情"""
+        return ContestUser.score_details_for(self.contest_id, [self.user_id]).get(self.user_id, {})
+
+    @staticmethod
+    def score_details_for(contest_id, user_ids=None):
+        """一次查询取出比赛中多个用户的成绩详情
+
+        Returns:
+            dict: user_id -> {"<problem_id>": {"solve_time": ..., "attempts": ...}}
+        """
+        query = db.session.query(ContestUserProblem.user_id, ContestUserProblem.problem_id,
+                                 ContestUserProblem.solve_time, ContestUserProblem.attempts) \
+            .filter(ContestUserProblem.contest_id == contest_id)
+        if user_ids is not None:
+            query = query.filter(ContestUserProblem.user_id.in_(user_ids))
+        details = {}
+        for user_id, problem_id, solve_time, attempts in query:
+            details.setdefault(user_id, {})[str(problem_id)] = {"solve_time": solve_time, "attempts": attempts}
+        return details
 
     def save(self):
         db.session.add(self)
         db.session.commit()
 
+    @staticmethod
+    def remove(contest_id, user_ids):
+        """移除一批参赛者及其成绩(不提交事务,不重算统计)
+
+        Returns:
+            int: 实际移除的人数
+        """
+        removed = ContestUser.query.filter(
+            ContestUser.contest_id == contest_id,
+            ContestUser.user_id.in_(user_ids)
+        ).delete(synchronize_session=False)
+        ContestUserProblem.query.filter(
+            ContestUserProblem.contest_id == contest_id,
+            ContestUserProblem.user_id.in_(user_ids)
+        ).delete(synchronize_session=False)
+        return removed
+
+    @staticmethod
+    def deduplicate():
+        """删除重复的 (比赛, 用户) 记录,只保留最早的一条,并补建唯一索引
+
+        Returns:
+            int: 删除的记录数
+        """
+        keep = select(func.min(ContestUser.id)).group_by(ContestUser.contest_id, ContestUser.user_id)
+        removed = ContestUser.query.filter(ContestUser.id.notin_(keep)).delete(synchronize_session=False)
+        db.session.commit()
+        for index in ContestUser.__table__.indexes:
+            index.create(db.engine, checkfirst=True)
+        return removed
+
     def delete(self):
+        ContestUserProblem.query.filter_by(contest_id=self.contest_id, user_id=self.user_id) \
+            .delete(synchronize_session=False)
+        ContestProblemStat.recompute(self.contest_id)
+        Contest.bump_ranklist_version(self.contest_id)
         db.session.delete(self)
         db.session.commit()
 
@@ -98,6 +347,8 @@ class Contest(db.Model):
     holder_name = db.Column(db.String(80))
 
     information = db.Column(db.Text)
+    # 排行榜版本号,成绩、参赛者或题目变化时递增,用于排行榜缓存和 ETag
+    ranklist_version = db.Column(db.Integer, default=0)
     problems = db.relationship('Problem', 
                             secondary=contest_problem,
                             backref=db.backref('contests', lazy='dynamic'),
@@ -110,31 +361,88 @@ class Contest(db.Model):
         self.holder_id = holder_id
         self.holder_name = holder_name
         self.information = information
+        self.ranklist_version = 0
+
+    @staticmethod
+    def bump_ranklist_version(contest_id, scoreboard_reset=True):
+        """原子递增排行榜版本号(不提交事务),与成绩变化在同一事务中提交
+
+        scoreboard_reset 为 True 时同时写入一条 reset 事件,实时排行榜的订阅者会重新获取整个排行榜;
+        单条评测结果的写回改为写入增量事件。每次递增都必须写入一条事件,排行榜缓存依此增量更新。
+        """
+        db.session.execute(
+            update(Contest)
+            .where(Contest.id == contest_id)
+            .values(ranklist_version=func.coalesce(Contest.ranklist_version, 0) + 1)
+            .execution_options(synchronize_session=False)
+        )
+        if scoreboard_reset:
+            ScoreboardEvent.record_reset(contest_id)
 
     def add_users(self, user_ids):
-        existing_ids = { 
-            cu.user_id for cu in ContestUser.query.filter_by(contest_id=self.id)
-                                                .filter(ContestUser.user_id.in_(user_ids))
-                                                .with_entities(ContestUser.user_id)
-                                                .all() 
-        }
-        
-        new_users = [
-            ContestUser(contest_id=self.id, user_id=uid)
-            for uid in user_ids if uid not in existing_ids
-        ]
-        
-        if new_users:
-            db.session.bulk_save_objects(new_users)
-            db.session.commit()
+        self.import_users(user_ids, mode="add")
 
     def delete_users(self, user_ids):
-        if user_ids:
-            ContestUser.query.filter(
-                ContestUser.contest_id == self.id,
-                ContestUser.user_id.in_(user_ids)
-            ).delete(synchronize_session=False)
-            db.session.commit()
+        self.import_users(user_ids, mode="remove")
+
+    def import_users(self, user_ids, mode="add", chunk_size=None):
+        """按固定大小的块导入参赛者,在一个事务中完成并提交
+
+        user_ids 可以是生成器,名单不会整体展开成一条 IN 语句;
+        每条语句最多 chunk_size 个用户,不超过 SQLite 的绑定参数上限。
+        已是参赛者的用户由唯一索引忽略,不需要先查询。
+
+        Args:
+            user_ids (iterable[int]): 用户ID,允许重复
+            mode (str): add 只添加; remove 只移除; replace 使参赛者与名单一致
+            chunk_size (int, optional): 默认 ROSTER_IMPORT_CHUNK_SIZE
+
+        Returns:
+            dict: {"added": 新增人数, "removed": 移除人数, "total": 导入后的参赛人数}
+        """
+        if mode not in ("add", "remove", "replace"):
+            raise ValueError(f"Unknown import mode: {mode}")
+        if not chunk_size:
+            chunk_size = app.config['ROSTER_IMPORT_CHUNK_SIZE']
+        added = removed = 0
+        listed = set()  # replace 模式下名单中的用户
+
+        for chunk in chunked(user_ids, chunk_size):
+            if mode == "remove":
+                removed += ContestUser.remove(self.id, chunk)
+                continue
+            # 通过连接直接 executemany,rowcount 为实际插入的行数
+            added += db.session.connection().execute(
+                sqlite_insert(ContestUser).on_conflict_do_nothing(index_elements=['contest_id', 'user_id']),
+                [{"contest_id": self.id, "user_id": user_id} for user_id in chunk]
+            ).rowcount
+            if mode == "replace":
+                listed.update(chunk)
+
+        if mode == "replace":
+            # 按主键分批扫描现有参赛者,移除不在名单中的用户
+            last_id = 0
+            while True:
+                rows = db.session.query(ContestUser.id, ContestUser.user_id) \
+                    .filter(ContestUser.contest_id == self.id, ContestUser.id > last_id) \
+                    .order_by(ContestUser.id) \
+                    .limit(chunk_size) \
+                    .all()
+                if not rows:
+                    break
+                last_id = rows[-1].id
+                stale = [row.user_id for row in rows if row.user_id not in listed]
+                if stale:
+                    removed += ContestUser.remove(self.id, stale)
+
+        if removed:
+            ContestProblemStat.recompute(self.id)
+        if added or removed:
+            Contest.bump_ranklist_version(self.id)
+        db.session.commit()
+        total = db.session.query(func.count(ContestUser.id)).filter(ContestUser.contest_id == self.id).scalar()
+        return {"added": added, "removed": removed, "total": total}
+
     def get_current_users(self):
         return [u.user_id for u in 
                 ContestUser.query.filter_by(contest_id=self.id)
@@ -159,13 +467,14 @@ class Contest(db.Model):
             raise PermissionError(f"No permission to add problem {problem_id}")
 
         # 检查是否已关联
-        if self.problems.filter(contest_problem.c.problem_id == problem_id).first():
+        if self.has_problem(problem_id):
             return  # 已存在则跳过
 
         try:
             # 原子操作更新使用次数
             problem.used_times += 1
             self.problems.append(problem)
+            Contest.bump_ranklist_version(self.id)
             db.session.commit()
         except exc.SQLAlchemyError as e:
             db.session.rollback()
@@ -197,6 +506,7 @@ class Contest(db.Model):
             for p in original_problems:
                 p.used_times -= 1
             self.problems = []
+            Contest.bump_ranklist_version(self.id)
 
             # 添加新题目
             for pid in problem_ids:
@@ -211,36 +521,90 @@ class Contest(db.Model):
             raise RuntimeError(f"Update failed: {str(e)}")
 
     def get_problems(self):
-        return [p.id for p in self.problems.all()]  # 通过关系直接获取
+        """比赛的题目ID列表,只查询关联表,不加载题目对象"""
+        return [problem_id for problem_id, in
+                db.session.query(contest_problem.c.problem_id)
+                .filter(contest_problem.c.contest_id == self.id)
+                .order_by(contest_problem.c.problem_id)]
+
+    def has_problem(self, problem_id):
+        return Contest.contains_problem(self.id, problem_id)
+
+    @staticmethod
+    def contains_problem(contest_id, problem_id):
+        """比赛是否包含该题目,使用关联表主键上的 EXISTS 查询"""
+        return db.session.query(
+            select(contest_problem.c.problem_id)
+            .where(contest_problem.c.contest_id == contest_id, contest_problem.c.problem_id == problem_id)
+            .exists()
+        ).scalar()
+
+    @staticmethod
+    def is_problem_used(problem_id):
+        """题目是否被任意比赛使用,通过 problem_id 索引反查,与比赛数量无关"""
+        return db.session.query(
+            select(contest_problem.c.contest_id)
+            .where(contest_problem.c.problem_id == problem_id)
+            .exists()
+        ).scalar()
     
-    def get_ranklist(self):
-        sorted_users = []
-        contest_users = ContestUser.query.filter_by(contest_id=self.id)
-        problem_ids = self.get_problems()
-        # 计算每个用户的分数和惩罚,并存储在一个临时列表中
-        for user in contest_users:
-            score, penalty = user.calculate_score(problem_ids)
-            sorted_users.append({
-                "user_id": user.user_id,
-                "score": score,
-                "penalty": penalty,
-                "score_details": user.get_score_details(),
-            })
-        
-        # 按照规则排序用户列表
-        sorted_users = sorted(sorted_users, key=lambda x: (-x["score"], x["penalty"]))
-        
+    def get_ranklist(self, user_ids=None):
+        """按 通过题数降序、罚时升序、user_id 升序 排列的排行榜
+
+        分数和罚时由一条 SQL 聚合算出,只统计当前属于比赛的题目;
+        成绩详情再用一条查询取出,不需要逐个解析 JSON。
+
+        Args:
+            user_ids (iterable, optional): 只计算这些参赛者的行,用于增量更新缓存的排行榜
+        """
+        solved = and_(ContestUserProblem.solve_time != -1,
+                      ContestUserProblem.problem_id.in_(
+                          select(contest_problem.c.problem_id).where(contest_problem.c.contest_id == self.id)))
+        score = func.coalesce(func.sum(case((solved, 1), else_=0)), 0)
+        penalty = func.coalesce(func.sum(case(
+            (solved, ContestUserProblem.solve_time + ContestUserProblem.attempts * PENALTY_PER_ATTEMPT),
+            else_=0)), 0)
+        query = db.session.query(ContestUser.user_id, score.label("score"), penalty.label("penalty")) \
+            .outerjoin(ContestUserProblem, and_(ContestUserProblem.contest_id == ContestUser.contest_id,
+                                                ContestUserProblem.user_id == ContestUser.user_id)) \
+            .filter(ContestUser.contest_id == self.id)
+        if user_ids is not None:
+            user_ids = list(user_ids)
+            query = query.filter(ContestUser.user_id.in_(user_ids))
+        rows = query.group_by(ContestUser.id, ContestUser.user_id) \
+            .order_by(score.desc(), penalty.asc(), ContestUser.user_id) \
+            .all()
+        score_details = ContestUser.score_details_for(self.id, user_ids)
+
         # 构建JSON结果
         result = []
-        for user_data in sorted_users:
+        for user_id, user_score, user_penalty in rows:
             result.append({
-                "user_id": user_data["user_id"],
-                "score": user_data["score"],
-                "penalty": user_data["penalty"],
-                "score_details": user_data["score_details"]
+                "user_id": user_id,
+                "score": user_score,
+                "penalty": user_penalty,
+                "score_details": score_details.get(user_id, {})
             })
         return result
 
+    def get_standings(self, now=None):
+        """带名次的排行榜,比赛结束后读取最终成绩快照
+
+        比赛结束后第一次读取时生成快照,之后直接读取快照;
+        结束后仍有成绩变化(如重测、比赛结束前的提交稍后才评测完)时版本号改变,快照随之重建。
+        """
+        if not self.is_ended(now):
+            return assign_ranks(self.get_ranklist())
+        standings = ContestStanding.load(self)
+        if standings is None:
+            standings = ContestStanding.snapshot(self)
+        return standings
+
+    def is_ended(self, now=None):
+        if not now:
+            now = datetime.now()
+        return self.end_time < now
+
     def __repr__(self):
         return "<Contest %r>" % self.title
 
@@ -264,4 +628,322 @@ class Contest(db.Model):
             now = datetime.now()
         return self.start_time <= now and now <= self.end_time
 
-   
+
+class ContestStanding(db.Model):
+    """已结束比赛的最终成绩快照,每场比赛一行
+
+    standings 为带名次的完整排行榜(JSON),version 为生成快照时比赛的 ranklist_version,
+    与比赛当前版本不一致时快照失效。
+    """
+    __tablename__ = 'contest_standing'
+
+    contest_id = db.Column(db.Integer, db.ForeignKey("contest.id"), primary_key=True)
+    version = db.Column(db.Integer)
+    standings = db.Column(db.Text)
+    create_time = db.Column(DateTime)
+
+    def __repr__(self):
+        return "<ContestStanding contest_id=%r version=%r>" % (self.contest_id, self.version)
+
+    @staticmethod
+    def load(contest):
+        """读取与比赛当前版本一致的快照,不存在或已失效时返回 None"""
+        standing = db.session.get(ContestStanding, contest.id)
+        if standing is None or standing.version != (contest.ranklist_version or 0):
+            return None
+        return json.loads(standing.standings)
+
+    @staticmethod
+    def snapshot(contest, commit=True):
+        """计算并保存比赛的最终成绩快照
+
+        版本号在计算之前读取,计算期间有新的写回时快照只会比版本号更新,下次读取时重新生成。
+        比赛刚结束时多个请求可能同时生成快照,使用 INSERT ... ON CONFLICT DO UPDATE 写入,
+        不会因主键冲突失败;已有更新版本的快照时保留较新的一份。
+
+        Args:
+            contest (Contest): 已结束的比赛
+            commit (bool): 是否立即提交事务,由调用方统一提交时传 False
+
+        Returns:
+            list[dict]: 带名次的排行榜
+        """
+        version = contest.ranklist_version or 0
+        standings = assign_ranks(contest.get_ranklist())
+        statement = sqlite_insert(ContestStanding).values(contest_id=contest.id, version=version,
+                                                          standings=json.dumps(standings), create_time=datetime.now())
+        db.session.execute(statement.on_conflict_do_update(
+            index_elements=['contest_id'],
+            set_={"version": statement.excluded.version, "standings": statement.excluded.standings,
+                  "create_time": statement.excluded.create_time},
+            where=ContestStanding.version <= statement.excluded.version,
+        ))
+        if commit:
+            db.session.commit()
+        return standings
+
+    @staticmethod
+    def backfill(now=None):
+        """为所有已结束但没有有效快照的比赛生成快照
+
+        Returns:
+            int: 新生成的快照数
+        """
+        if not now:
+            now = datetime.now()
+        stale = db.session.query(Contest) \
+            .outerjoin(ContestStanding, ContestStanding.contest_id == Contest.id) \
+            .filter(Contest.end_time < now,
+                    (ContestStanding.contest_id.is_(None))
+                    | (ContestStanding.version != func.coalesce(Contest.ranklist_version, 0))) \
+            .all()
+        for contest in stale:
+            ContestStanding.snapshot(contest)
+        return len(stale)
+
+
+class ScoreboardEvent(db.Model):
+    """排行榜变化事件,id 递增,作为实时排行榜推送的游标
+
+    kind 为 delta 时记录某个参赛者某道题目的最新成绩(与 contest_user_problem 同一事务写入);
+    kind 为 reset 时表示排行榜整体变化(重测、增删参赛者或题目),订阅者需要重新获取整个排行榜。
+    submit_time 为引起变化的提交时间,用于封榜判断。
+    """
+    __tablename__ = 'scoreboard_event'
+
+    id = db.Column(db.Integer, primary_key=True)
+    contest_id = db.Column(db.Integer, db.ForeignKey("contest.id"))
+    kind = db.Column(db.String(16))
+    user_id = db.Column(db.Integer, nullable=True)
+    problem_id = db.Column(db.Integer, nullable=True)
+    solve_time = db.Column(db.Integer, nullable=True)
+    attempts = db.Column(db.Integer, nullable=True)
+    submit_time = db.Column(DateTime, nullable=True)
+    create_time = db.Column(DateTime)
+
+    __table_args__ = (
+        db.Index('idx_scoreboard_event_contest', 'contest_id', 'id'),
+    )
+
+    def __repr__(self):
+        return "<ScoreboardEvent id=%r contest_id=%r kind=%r>" % (self.id, self.contest_id, self.kind)
+
+    def to_dict(self):
+        return {
+            "event_id": self.id,
+            "kind": self.kind,
+            "user_id": self.user_id,
+            "problem_id": self.problem_id,
+            "solve_time": self.solve_time,
+            "attempts": self.attempts,
+        }
+
+    @staticmethod
+    def record_delta(contest_id, user_id, problem_id, submit_time):
+        """从 contest_user_problem 中复制该题的最新成绩作为增量事件(不提交事务,不需要先读出成绩)"""
+        db.session.execute(
+            insert(ScoreboardEvent).from_select(
+                ["contest_id", "kind", "user_id", "problem_id", "solve_time", "attempts", "submit_time",
+                 "create_time"],
+                select(ContestUserProblem.contest_id, literal("delta"), ContestUserProblem.user_id,
+                       ContestUserProblem.problem_id, ContestUserProblem.solve_time, ContestUserProblem.attempts,
+                       literal(submit_time.replace(tzinfo=None), DateTime), literal(datetime.now(), DateTime))
+                .where(ContestUserProblem.contest_id == contest_id,
+                       ContestUserProblem.user_id == user_id,
+                       ContestUserProblem.problem_id == problem_id)
+            )
+        )
+
+    @staticmethod
+    def record_reset(contest_id):
+        db.session.execute(
+            insert(ScoreboardEvent).values(contest_id=contest_id, kind="reset", create_time=datetime.now())
+        )
+
+
+class ContestProblemStat(db.Model):
+    """比赛中每道题目的统计,每个 (比赛, 题目) 一行
+
+    评测写回时与 contest_user_problem 在同一事务中增量更新,每条评测结果只执行常数条语句;
+    重测、删除参赛者等批量变化时由 contest_user_problem 整场重算。
+
+    tried_count 为提交过该题的参赛者人数, solved_count 为通过人数;
+    submission_count 为计入成绩的提交数(通过前的错误提交和首次通过);
+    solve_time_sum 为通过时间之和(分钟),用于计算平均通过时间;
+    first_solve_* 为最早通过的参赛者,通过时间相同时取提交ID较小者。
+    """
+    __tablename__ = 'contest_problem_stat'
+
+    id = db.Column(db.Integer, primary_key=True)
+    contest_id = db.Column(db.Integer, db.ForeignKey("contest.id"))
+    problem_id = db.Column(db.Integer)
+    tried_count = db.Column(db.Integer, default=0)
+    solved_count = db.Column(db.Integer, default=0)
+    submission_count = db.Column(db.Integer, default=0)
+    solve_time_sum = db.Column(db.Integer, default=0)
+    first_solve_user_id = db.Column(db.Integer, nullable=True)
+    first_solve_time = db.Column(db.Integer, nullable=True)
+    first_solve_submission_id = db.Column(db.Integer, nullable=True)
+
+    __table_args__ = (
+        db.UniqueConstraint('contest_id', 'problem_id', name='uq_contest_problem_stat'),
+    )
+
+    def __repr__(self):
+        return "<ContestProblemStat contest_id=%r problem_id=%r solved=%r/%r>" % \
+               (self.contest_id, self.problem_id, self.solved_count, self.tried_count)
+
+    def to_dict(self, histogram=None):
+        return {
+            "problem_id": self.problem_id,
+            "tried": self.tried_count or 0,
+            "solved": self.solved_count or 0,
+            "submissions": self.submission_count or 0,
+            "average_solve_time": self.solve_time_sum / self.solved_count if self.solved_count else None,
+            "first_solve": {
+                "user_id": self.first_solve_user_id,
+                "solve_time": self.first_solve_time,
+                "submission_id": self.first_solve_submission_id,
+            } if self.first_solve_user_id is not None else None,
+            "attempts": histogram or {},
+        }
+
+    @staticmethod
+    def record_verdict(contest_id, problem_id, first_try, solve_time=None, attempts=0, user_id=None,
+                       submission_id=None):
+        """把一条改变了成绩的评测结果计入统计(不提交事务,不读取统计行)
+
+        Args:
+            contest_id (int): 比赛ID
+            problem_id (int): 题目ID
+            first_try (bool): 是否为该参赛者在该题上的第一条评测结果
+            solve_time (int, optional): 通过时间(分钟),未通过时为 None
+            attempts (int): 更新后的通过前错误次数
+            user_id (int, optional): 通过者
+            submission_id (int, optional): 通过的提交ID
+        """
+        stat = ContestProblemStat
+        tried = 1 if first_try else 0
+        solved = 1 if solve_time is not None else 0
+        values = {"tried_count": tried, "solved_count": solved, "submission_count": 1,
+                  "solve_time_sum": solve_time or 0}
+        increments = {name: getattr(stat, name) + value for name, value in values.items()}
+        if solve_time is not None:
+            values.update(first_solve_user_id=user_id, first_solve_time=solve_time,
+                          first_solve_submission_id=submission_id)
+            # SET 中的表达式都读取更新前的值,三列使用同一个条件
+            earlier = or_(stat.first_solve_time.is_(None),
+                          stat.first_solve_time > solve_time,
+                          and_(stat.first_solve_time == solve_time, stat.first_solve_submission_id > submission_id))
+            increments.update(
+                first_solve_user_id=case((earlier, user_id), else_=stat.first_solve_user_id),
+                first_solve_time=case((earlier, solve_time), else_=stat.first_solve_time),
+                first_solve_submission_id=case((earlier, submission_id), else_=stat.first_solve_submission_id),
+            )
+        db.session.execute(
+            sqlite_insert(stat)
+            .values(contest_id=contest_id, problem_id=problem_id, **values)
+            .on_conflict_do_update(index_elements=["contest_id", "problem_id"], set_=increments)
+        )
+        if solve_time is not None:
+            bucket = ContestProblemAttemptBucket
+            db.session.execute(
+                sqlite_insert(bucket)
+                .values(contest_id=contest_id, problem_id=problem_id,
+                        attempts=min(attempts, ATTEMPT_HISTOGRAM_MAX), solved_count=1)
+                .on_conflict_do_update(index_elements=["contest_id", "problem_id", "attempts"],
+                                       set_={"solved_count": bucket.solved_count + 1})
+            )
+
+    @staticmethod
+    def recompute(contest_id):
+        """按 contest_user_problem 重算整场比赛的题目统计(不提交事务)"""
+        ContestProblemStat.query.filter_by(contest_id=contest_id).delete(synchronize_session=False)
+        ContestProblemAttemptBucket.query.filter_by(contest_id=contest_id).delete(synchronize_session=False)
+
+        row = ContestUserProblem
+        solved = row.solve_time != -1
+        totals = db.session.query(
+            row.problem_id,
+            func.count(row.id),
+            func.sum(case((solved, 1), else_=0)),
+            func.sum(row.attempts),
+            func.sum(case((solved, row.solve_time), else_=0)),
+        ).filter(row.contest_id == contest_id).group_by(row.problem_id)
+        stats = {}
+        for problem_id, tried_count, solved_count, attempts, solve_time_sum in totals:
+            stats[problem_id] = ContestProblemStat(
+                contest_id=contest_id, problem_id=problem_id, tried_count=tried_count,
+                solved_count=solved_count, submission_count=attempts + solved_count,
+                solve_time_sum=solve_time_sum)
+
+        first_solves = db.session.query(row.problem_id, row.user_id, row.solve_time, row.first_ac_submission_id) \
+            .filter(row.contest_id == contest_id, solved) \
+            .order_by(row.problem_id, row.solve_time, row.first_ac_submission_id)
+        for problem_id, user_id, solve_time, submission_id in first_solves:
+            stat = stats[problem_id]
+            if stat.first_solve_user_id is None:
+                stat.first_solve_user_id = user_id
+                stat.first_solve_time = solve_time
+                stat.first_solve_submission_id = submission_id
+
+        bucket = case((row.attempts >= ATTEMPT_HISTOGRAM_MAX, ATTEMPT_HISTOGRAM_MAX), else_=row.attempts)
+        buckets = [
+            ContestProblemAttemptBucket(contest_id=contest_id, problem_id=problem_id, attempts=attempts,
+                                        solved_count=solved_count)
+            for problem_id, attempts, solved_count in
+            db.session.query(row.problem_id, bucket, func.count(row.id))
+            .filter(row.contest_id == contest_id, solved)
+            .group_by(row.problem_id, bucket)
+        ]
+        db.session.bulk_save_objects(list(stats.values()) + buckets)
+
+    @staticmethod
+    def for_contest(contest):
+        """比赛当前各题目的统计,按题目ID排序,没有提交的题目各项为 0"""
+        problem_ids = contest.get_problems()
+        stats = {stat.problem_id: stat for stat in
+                 ContestProblemStat.query.filter(ContestProblemStat.contest_id == contest.id)}
+        histograms = {}
+        for bucket in ContestProblemAttemptBucket.query.filter(ContestProblemAttemptBucket.contest_id == contest.id):
+            histograms.setdefault(bucket.problem_id, {})[str(bucket.attempts)] = bucket.solved_count
+        return [stats.get(problem_id, ContestProblemStat(contest_id=contest.id, problem_id=problem_id))
+                .to_dict(histograms.get(problem_id)) for problem_id in problem_ids]
+
+    @staticmethod
+    def backfill(contest_id=None):
+        """重算全部(或指定)比赛的题目统计,用于已有数据的迁移
+
+        Returns:
+            int: 重算的比赛数
+        """
+        query = db.session.query(Contest.id)
+        if contest_id is not None:
+            query = query.filter(Contest.id == contest_id)
+        contest_ids = [contest_id for contest_id, in query.order_by(Contest.id)]
+        for contest_id in contest_ids:
+            ContestProblemStat.recompute(contest_id)
+            db.session.commit()
+        return len(contest_ids)
+
+
+class ContestProblemAttemptBucket(db.Model):
+    """通过某题的参赛者按通过前错误次数的分布,每个 (比赛, 题目, 错误次数) 一行
+
+    错误次数不少于 ATTEMPT_HISTOGRAM_MAX 的通过者计入 attempts = ATTEMPT_HISTOGRAM_MAX 一档。
+    """
+    __tablename__ = 'contest_problem_attempt_bucket'
+
+    id = db.Column(db.Integer, primary_key=True)
+    contest_id = db.Column(db.Integer, db.ForeignKey("contest.id"))
+    problem_id = db.Column(db.Integer)
+    attempts = db.Column(db.Integer)
+    solved_count = db.Column(db.Integer, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint('contest_id', 'problem_id', 'attempts', name='uq_contest_problem_attempt_bucket'),
+    )
+
+    def __repr__(self):
+        return "<ContestProblemAttemptBucket contest_id=%r problem_id=%r attempts=%r solved=%r>" % \
+               (self.contest_id, self.problem_id, self.attempts, self.solved_count)
@@ -0,0 +1,275 @@
+from online_judge import db
+from sqlalchemy import Enum
+from sqlalchemy import DateTime
+from sqlalchemy import update, func, case, and_
+from datetime import datetime, timedelta
+
+
+class JudgeTask(db.Model):
+    """持久化评测队列中的一个任务
+
+    每条提交对应一条任务记录。worker 通过带条件的 UPDATE 抢占任务(租约),
+    评测期间定时续约;worker 崩溃后租约过期,任务会被重新放回队列。
+
+    任务分为两条通道: contest(正在进行的比赛,高优先级)和
+    practice(练习/重测,低优先级)。
+    """
+    __tablename__ = 'judge_task'
+
+    id = db.Column(db.Integer, primary_key=True)
+    submission_id = db.Column(db.Integer, db.ForeignKey("submission.id"), unique=True, index=True)
+    state = db.Column(Enum("queued", "running", "done", name="judge_task_state"))
+    lane = db.Column(Enum("contest", "practice", name="judge_lane_type"))
+    worker_id = db.Column(db.String(80))
+    lease_expires = db.Column(DateTime)
+    attempts = db.Column(db.Integer)
+    compile_cache = db.Column(Enum("hit", "miss", name="compile_cache_state"), nullable=True)
+    # 所属的批量重测任务,普通提交为空
+    rejudge_job_id = db.Column(db.Integer, nullable=True, index=True)
+
+    enqueue_time = db.Column(DateTime)
+    start_time = db.Column(DateTime)
+    finish_time = db.Column(DateTime)
+
+    __table_args__ = (
+        db.Index('idx_judge_task_state_enqueue', 'state', 'enqueue_time'),
+        db.Index('idx_judge_task_finish', 'finish_time'),
+        db.Index('idx_judge_task_start', 'start_time'),
+    )
+
+    def __init__(self, submission_id, lane="practice"):
+        self.submission_id = submission_id
+        self.lane = lane
+        self.state = "queued"
+        self.attempts = 0
+        self.enqueue_time = datetime.now()
+
+    def __repr__(self):
+        return "<JudgeTask submission_id=%r state=%r>" % (self.submission_id, self.state)
+
+    @staticmethod
+    def lane_for(contest, now=None):
+        """正在进行的比赛走 contest 通道,其余(练习、赛后提交)走 practice 通道
+
+        contest 可以是 Contest 或提交时解析的 AdmissionContext
+        """
+        if contest is not None and contest.is_running(now):
+            return "contest"
+        return "practice"
+
+    @staticmethod
+    def enqueue(submission_id, lane="practice", commit=True):
+        """将提交放入评测队列,已存在的任务会被重置为排队状态"""
+        task = JudgeTask.query.filter_by(submission_id=submission_id).first()
+        if task is None:
+            task = JudgeTask(submission_id, lane=lane)
+            db.session.add(task)
+        else:
+            task.lane = lane
+            task.state = "queued"
+            task.worker_id = None
+            task.lease_expires = None
+            task.attempts = 0
+            task.compile_cache = None
+            task.rejudge_job_id = None
+            task.enqueue_time = datetime.now()
+            task.start_time = None
+            task.finish_time = None
+        if commit:
+            db.session.commit()
+        return task
+
+    @staticmethod
+    def acquire(worker_id, lease_seconds, submission_id=None, starvation_seconds=None, starvation_every=4):
+        """抢占一个排队中的任务
+
+        先读出候选任务,再用 ``WHERE state='queued'`` 的条件更新抢占,
+        多个 worker 同时抢同一任务时只有一个能更新成功。
+
+        候选顺序: contest 任务 > practice 任务,同一优先级内先进先出。
+        防饿死: 最近被抢占的 starvation_every 个任务中没有 practice 任务时,
+        等待超过 starvation_seconds 的 practice 任务可以排到 contest 任务之前,
+        即每 starvation_every 个 contest 任务最多插入一个超时的 practice 任务,
+        大量积压的重测任务不会挤占比赛通道。
+
+        Args:
+            worker_id (str): 抢占者标识
+            lease_seconds (int): 租约时长(秒)
+            submission_id (int, optional): 只抢占指定提交的任务
+            starvation_seconds (float, optional): practice 任务的最长等待时间;
+                None 表示不做防饿死处理
+            starvation_every (int): 每抢占多少个任务最多提前一个超时的 practice 任务
+
+        Returns:
+            JudgeTask | None: 抢到的任务,队列为空时返回 None
+        """
+        while True:
+            query = db.session.query(JudgeTask.id).filter(JudgeTask.state == "queued")
+            if submission_id is not None:
+                query = query.filter(JudgeTask.submission_id == submission_id)
+            now = datetime.now()
+            whens = []
+            if starvation_seconds is not None and JudgeTask.practice_due(starvation_every):
+                starved_before = now - timedelta(seconds=starvation_seconds)
+                whens.append((and_(JudgeTask.lane == "practice",
+                                   JudgeTask.enqueue_time < starved_before), 0))
+            whens.append((JudgeTask.lane == "contest", 1))
+            priority = case(*whens, else_=2)
+            candidate = query.order_by(priority, JudgeTask.enqueue_time, JudgeTask.id).first()
+            if candidate is None:
+                db.session.commit()
+                return None
+
+            result = db.session.execute(
+                update(JudgeTask)
+                .where(JudgeTask.id == candidate.id, JudgeTask.state == "queued")
+                .values(state="running",
+                        worker_id=worker_id,
+                        lease_expires=now + timedelta(seconds=lease_seconds),
+                        attempts=JudgeTask.attempts + 1,
+                        start_time=now)
+            )
+            db.session.commit()
+            if result.rowcount == 1:
+                return db.session.get(JudgeTask, candidate.id)
+
+    @staticmethod
+    def practice_due(window):
+        """最近被抢占的 window 个任务中没有 practice 任务时返回 True"""
+        recent = db.session.query(JudgeTask.lane) \
+            .filter(JudgeTask.start_time.isnot(None)) \
+            .order_by(JudgeTask.start_time.desc(), JudgeTask.id.desc()) \
+            .limit(window) \
+            .all()
+        return all(lane != "practice" for lane, in recent)
+
+    @staticmethod
+    def heartbeat(task_id, worker_id, lease_seconds):
+        """续约,返回 False 表示租约已丢失(任务已被回收或完成)"""
+        result = db.session.execute(
+            update(JudgeTask)
+            .where(JudgeTask.id == task_id,
+                   JudgeTask.worker_id == worker_id,
+                   JudgeTask.state == "running")
+            .values(lease_expires=datetime.now() + timedelta(seconds=lease_seconds))
+        )
+        db.session.commit()
+        return result.rowcount == 1
+
+    @staticmethod
+    def complete(task_id, worker_id, compile_cache=None):
+        result = db.session.execute(
+            update(JudgeTask)
+            .where(JudgeTask.id == task_id,
+                   JudgeTask.worker_id == worker_id,
+                   JudgeTask.state == "running")
+            .values(state="done", lease_expires=None, finish_time=datetime.now(),
+                    compile_cache=compile_cache)
+        )
+        db.session.commit()
+        return result.rowcount == 1
+
+    @staticmethod
+    def release(task_id, worker_id):
+        """worker 正常退出时把未完成的任务放回队列"""
+        result = db.session.execute(
+            update(JudgeTask)
+            .where(JudgeTask.id == task_id,
+                   JudgeTask.worker_id == worker_id,
+                   JudgeTask.state == "running")
+            .values(state="queued", worker_id=None, lease_expires=None)
+        )
+        db.session.commit()
+        return result.rowcount == 1
+
+    @staticmethod
+    def requeue_expired(now=None):
+        """回收租约已过期的任务(worker 崩溃或失联),返回回收数量"""
+        if not now:
+            now = datetime.now()
+        result = db.session.execute(
+            update(JudgeTask)
+            .where(JudgeTask.state == "running", JudgeTask.lease_expires < now)
+            .values(state="queued", worker_id=None, lease_expires=None)
+        )
+        db.session.commit()
+        return result.rowcount
+
+    @staticmethod
+    def depth(by_lane=False):
+        """返回各状态的任务数量,如 {"queued": 3, "running": 1}
+
+        by_lane 为 True 时按通道拆分,如 {"contest": {"queued": 2, "running": 1}, ...}
+        """
+        rows = db.session.query(JudgeTask.lane, JudgeTask.state, func.count(JudgeTask.id)) \
+            .filter(JudgeTask.state != "done") \
+            .group_by(JudgeTask.lane, JudgeTask.state) \
+            .all()
+        if by_lane:
+            counts = {lane: {"queued": 0, "running": 0} for lane in ("contest", "practice")}
+            for lane, state, count in rows:
+                counts[lane][state] = count
+            return counts
+        counts = {"queued": 0, "running": 0}
+        for lane, state, count in rows:
+            counts[state] += count
+        return counts
+
+    @staticmethod
+    def stats(window_seconds=60, now=None):
+        """统计最近 window_seconds 内的评测吞吐量和各通道等待时间
+
+        Returns:
+            dict: 格式如
+                {
+                    "window_seconds": 60,
+                    "verdicts_per_minute": 42.0,
+                    "lanes": {
+                        "contest": {"finished": 30, "avg_wait": 0.8, "max_wait": 2.1,
+                                    "queued": 2, "running": 1},
+                        "practice": {...}
+                    }
+                }
+            等待时间单位为秒,指任务从入队到开始评测的时间。
+        """
+        if not now:
+            now = datetime.now()
+        since = now - timedelta(seconds=window_seconds)
+        rows = db.session.query(JudgeTask.lane, JudgeTask.enqueue_time, JudgeTask.start_time) \
+            .filter(JudgeTask.state == "done", JudgeTask.finish_time >= since) \
+            .all()
+
+        depth = JudgeTask.depth(by_lane=True)
+        lanes = {}
+        for lane in ("contest", "practice"):
+            waits = [(start - enqueue).total_seconds() for l, enqueue, start in rows
+                     if l == lane and enqueue and start]
+            lanes[lane] = {
+                "finished": len(waits),
+                "avg_wait": sum(waits) / len(waits) if waits else 0,
+                "max_wait": max(waits) if waits else 0,
+                "queued": depth[lane]["queued"],
+                "running": depth[lane]["running"],
+            }
+        return {
+            "window_seconds": window_seconds,
+            "verdicts_per_minute": len(rows) * 60 / window_seconds,
+            "lanes": lanes,
+        }
+
+    @staticmethod
+    def compile_cache_stats():
+        """编译缓存的命中/未命中次数及命中率"""
+        rows = db.session.query(JudgeTask.compile_cache, func.count(JudgeTask.id)) \
+            .filter(JudgeTask.compile_cache.isnot(None)) \
+            .group_by(JudgeTask.compile_cache) \
+            .all()
+        counts = {"hit": 0, "miss": 0}
+        for state, count in rows:
+            counts[state] = count
+        total = counts["hit"] + counts["miss"]
+        return {
+            "hits": counts["hit"],
+            "misses": counts["miss"],
+            "hit_ratio": counts["hit"] / total if total else 0,
+        }
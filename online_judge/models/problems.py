@@ -1,4 +1,5 @@
 from online_judge import db
+from sqlalchemy import update
 
 problem_tag = db.Table('problem_tag',
     db.Column('problem_id', db.Integer, db.ForeignKey('problem.id')),
@@ -21,6 +22,7 @@ class Problem(db.Model):
     submit_num = db.Column(db.Integer)
     is_public = db.Column(db.Boolean)
     used_times = db.Column(db.Integer)
+    data_version = db.Column(db.Integer, default=0)  # 测试数据版本,每次替换测试数据后加一
 
     tags = db.relationship('Tag', secondary='problem_tag', backref='problems')
 
@@ -41,6 +43,7 @@ class Problem(db.Model):
         self.submit_num = submit_num
         self.is_public = is_public
         self.used_times = 0
+        self.data_version = 0
 
     def __repr__(self):
         return "<Problem %r>" % self.title
@@ -49,6 +52,15 @@ class Problem(db.Model):
         db.session.add(self)
         db.session.commit()
 
+    def bump_data_version(self):
+        """测试数据替换后递增数据版本,旧版本数据上的评测结果不再用于重复提交去重"""
+        db.session.execute(
+            update(Problem)
+            .where(Problem.id == self.id)
+            .values(data_version=Problem.data_version + 1)
+        )
+        db.session.commit()
+
     def is_allowed_edit(self, user=None):
         if not user:
             return False
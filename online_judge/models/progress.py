@@ -0,0 +1,67 @@
+from online_judge import db
+from sqlalchemy import DateTime
+from sqlalchemy import case, or_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+
+class UserProblemProgress(db.Model):
+    """用户在每道题目上的进度,每个 (用户, 题目) 一行
+
+    评测写回时与题目计数在同一事务中增量更新;重测结束时按提交记录(包括归档库)重算相关题目。
+    有这一行即尝试过该题, first_ac_time 不为空即已通过。
+    attempts 为计入题目提交数的提交次数(不含编译错误和系统错误)。
+    """
+    __tablename__ = 'user_problem_progress'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer)
+    problem_id = db.Column(db.Integer)
+    attempts = db.Column(db.Integer, default=0)
+    first_ac_time = db.Column(DateTime, nullable=True)  # 最早通过的提交时间
+
+    __table_args__ = (
+        # 按用户批量查询一组题目
+        db.Index('uq_user_problem_progress', 'user_id', 'problem_id', unique=True),
+    )
+
+    def __repr__(self):
+        return "<UserProblemProgress user_id=%r problem_id=%r>" % (self.user_id, self.problem_id)
+
+    @staticmethod
+    def record_verdict(user_id, problem_id, accepted, submit_time):
+        """把一条计入题目提交数的评测结果计入进度(不提交事务,不读取进度行)"""
+        progress = UserProblemProgress
+        first_ac_time = submit_time if accepted else None
+        increments = {"attempts": progress.attempts + 1}
+        if accepted:
+            earlier = or_(progress.first_ac_time.is_(None), progress.first_ac_time > submit_time)
+            increments["first_ac_time"] = case((earlier, submit_time), else_=progress.first_ac_time)
+        db.session.execute(
+            sqlite_insert(progress)
+            .values(user_id=user_id, problem_id=problem_id, attempts=1, first_ac_time=first_ac_time)
+            .on_conflict_do_update(index_elements=["user_id", "problem_id"], set_=increments)
+        )
+
+    @staticmethod
+    def for_user(user_id, problem_ids=None):
+        """用户的进度,一条查询取得
+
+        Args:
+            user_id (int): 用户ID
+            problem_ids (list[int], optional): 只查询这些题目,为空时返回全部
+
+        Returns:
+            dict: {"solved": [题目ID], "attempted": [尝试过但未通过的题目ID], "first_ac_time": {题目ID: 时间}}
+        """
+        query = db.session.query(UserProblemProgress.problem_id, UserProblemProgress.first_ac_time) \
+            .filter(UserProblemProgress.user_id == user_id)
+        if problem_ids is not None:
+            query = query.filter(UserProblemProgress.problem_id.in_(problem_ids))
+        result = {"solved": [], "attempted": [], "first_ac_time": {}}
+        for problem_id, first_ac_time in query.order_by(UserProblemProgress.problem_id):
+            if first_ac_time is None:
+                result["attempted"].append(problem_id)
+            else:
+                result["solved"].append(problem_id)
+                result["first_ac_time"][problem_id] = first_ac_time
+        return result
@@ -0,0 +1,224 @@
+from online_judge import app, db
+from online_judge.models.contests import ScoreboardEvent, assign_ranks
+from bisect import bisect_left, insort
+from collections import OrderedDict
+import os
+import json
+import logging
+import tempfile
+import threading
+
+
+def latest_event_id(contest_id):
+    return db.session.query(db.func.max(ScoreboardEvent.id)) \
+        .filter(ScoreboardEvent.contest_id == contest_id).scalar() or 0
+
+
+class RanklistEntry:
+    """一场比赛的排行榜,按 (-通过题数, 罚时, user_id) 有序保存
+
+    keys 为有序的 (-score, penalty, user_id) 列表,rows 为 user_id -> 排行榜行。
+    单个参赛者成绩变化时只需删除旧 key 并二分插入新 key,不需要重新计算整个排行榜;
+    名次为 key 中 (-score, penalty) 前缀的二分位置,同样不需要逐行计算。
+
+    version 为对应的 contest.ranklist_version,event_id 为已应用的最后一条 scoreboard_event。
+    """
+
+    def __init__(self, version, ranklist, event_id=None):
+        self.version = version
+        self.event_id = event_id
+        self.rows = {row["user_id"]: row for row in ranklist}
+        self.keys = sorted(self.key(row) for row in ranklist)
+        self._ranklist = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(row):
+        return (-row["score"], row["penalty"], row["user_id"])
+
+    def _rank(self, key):
+        # (-score, penalty) 是 key 的前缀,比所有同分同罚时的 key 都小
+        return bisect_left(self.keys, key[:2]) + 1
+
+    def _row(self, key):
+        return dict(self.rows[key[2]], rank=self._rank(key))
+
+    def __len__(self):
+        return len(self.keys)
+
+    @property
+    def ranklist(self):
+        """带名次的完整排行榜,每个版本只生成一次"""
+        with self._lock:
+            if self._ranklist is None:
+                self._ranklist = assign_ranks([dict(self.rows[key[2]]) for key in self.keys])
+            return self._ranklist
+
+    def update(self, version, event_id, rows, user_ids):
+        """用 user_ids 这些参赛者的最新成绩原地更新排行榜
+
+        Args:
+            version (int): 更新后的排行榜版本号
+            event_id (int): 已应用的最后一条事件,早于当前 event_id 的更新(并发请求读到的旧数据)被忽略
+            rows (list[dict]): 这些参赛者最新的排行榜行,已退出比赛的参赛者没有对应行
+            user_ids (iterable): 成绩发生变化的参赛者
+        """
+        with self._lock:
+            if self.event_id is not None and event_id < self.event_id:
+                return
+            for user_id in user_ids:
+                old = self.rows.pop(user_id, None)
+                if old is not None:
+                    del self.keys[bisect_left(self.keys, self.key(old))]
+            for row in rows:
+                self.rows[row["user_id"]] = row
+                insort(self.keys, self.key(row))
+            self.version = max(self.version, version)
+            self.event_id = event_id
+            self._ranklist = None
+
+    def page(self, page, size):
+        """第 page 页(从 1 开始)的排行榜"""
+        start = (page - 1) * size
+        with self._lock:
+            return [self._row(key) for key in self.keys[start:start + size]]
+
+    def lookup(self, user_id):
+        """用户当前的排行榜行(带名次),不在排行榜中时返回 None"""
+        with self._lock:
+            row = self.rows.get(user_id)
+            return None if row is None else self._row(self.key(row))
+
+    def around(self, user_id, neighbours):
+        """用户所在位置及其前后各 neighbours 名,用户不在排行榜中时返回 None
+
+        Returns:
+            tuple: (position, rank, rows)
+        """
+        with self._lock:
+            row = self.rows.get(user_id)
+            if row is None:
+                return None
+            key = self.key(row)
+            position = bisect_left(self.keys, key)
+            start = max(position - neighbours, 0)
+            return position, self._rank(key), [self._row(k) for k in self.keys[start:position + neighbours + 1]]
+
+
+class RanklistCache:
+    """按比赛缓存排行榜,以 contest.ranklist_version 作为失效依据
+
+    评测写回、重测、增删参赛者或题目时会在同一事务中递增 ranklist_version 并写入一条 scoreboard_event,
+    缓存条目的版本号与数据库中的版本号不一致时读取之后的事件:
+    全部为增量(delta)时只重新读取成绩变化的参赛者并原地更新排行榜;
+    有整体变化(reset)或比赛已结束时重新计算,已结束的比赛直接读取最终成绩快照。
+    因此不需要主动清除缓存。
+
+    进程内最多保存 max_entries 场比赛(最近最少使用淘汰)。
+    设置 shared_dir 后,完整计算的结果同时以 ``<shared_dir>/<contest_id>-<version>.json`` 写入共享目录,
+    多个 web 进程部署时只有第一个进程需要计算,之后各进程各自增量更新。
+    """
+
+    def __init__(self, max_entries=128, shared_dir=None):
+        self.max_entries = max_entries
+        self.shared_dir = shared_dir or None
+        self._entries = OrderedDict()  # contest_id -> RanklistEntry
+        self._lock = threading.Lock()
+        if self.shared_dir:
+            os.makedirs(self.shared_dir, exist_ok=True)
+
+    def _shared_path(self, contest_id, version):
+        return os.path.join(self.shared_dir, f"{contest_id}-{version}.json")
+
+    def _load_shared(self, contest_id, version):
+        """返回 (event_id, ranklist),文件不存在或格式不符时返回 None"""
+        try:
+            with open(self._shared_path(contest_id, version), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return data["event_id"], data["ranklist"]
+        except (OSError, ValueError, TypeError, KeyError):
+            return None
+
+    def _store_shared(self, contest_id, version, event_id, ranklist):
+        try:
+            # 先写临时文件再改名,其他进程不会读到写了一半的文件
+            fd, tmp_path = tempfile.mkstemp(dir=self.shared_dir, suffix=".tmp")
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({"event_id": event_id, "ranklist": ranklist}, f)
+            os.replace(tmp_path, self._shared_path(contest_id, version))
+            # 旧版本的文件不会再被读取
+            for name in os.listdir(self.shared_dir):
+                if name.startswith(f"{contest_id}-") and name != f"{contest_id}-{version}.json":
+                    os.remove(os.path.join(self.shared_dir, name))
+        except OSError as e:
+            logging.warning(f"Failed to store shared ranklist of contest {contest_id}: {str(e)}")
+
+    def get(self, contest):
+        """返回比赛当前版本的排行榜,版本未变化时直接使用缓存
+
+        Args:
+            contest (Contest): 比赛对象,其 ranklist_version 应为本次请求中读取的最新值
+
+        Returns:
+            tuple: (version, ranklist)
+        """
+        entry = self.get_entry(contest)
+        return entry.version, entry.ranklist
+
+    def get_entry(self, contest):
+        """与 get 相同,返回带名次索引的 RanklistEntry"""
+        version = contest.ranklist_version or 0
+        with self._lock:
+            entry = self._entries.get(contest.id)
+            if entry is not None and entry.version == version:
+                self._entries.move_to_end(contest.id)
+                return entry
+
+        if entry is not None and entry.event_id is not None and not contest.is_ended():
+            if self._apply_deltas(contest, entry, version):
+                return entry
+
+        # 版本号和事件游标先于成绩读取,计算期间有新的写回时缓存内容只会比版本号更新,
+        # 下一次请求读到新版本号后会补上这之后的事件
+        loaded = self._load_shared(contest.id, version) if self.shared_dir else None
+        if loaded is not None:
+            event_id, ranklist = loaded
+        else:
+            event_id = latest_event_id(contest.id)
+            ranklist = contest.get_standings()
+            if self.shared_dir:
+                self._store_shared(contest.id, version, event_id, ranklist)
+
+        entry = RanklistEntry(version, ranklist, event_id)
+        with self._lock:
+            self._entries[contest.id] = entry
+            self._entries.move_to_end(contest.id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    @staticmethod
+    def _apply_deltas(contest, entry, version):
+        """把 entry.event_id 之后的增量事件应用到缓存的排行榜上
+
+        只重新读取成绩变化的参赛者,每条评测结果的代价与参赛人数无关。
+
+        Returns:
+            bool: 是否已更新;有 reset 事件或没有新事件(版本号与事件不对应)时返回 False,由调用方重新计算
+        """
+        events = db.session.query(ScoreboardEvent.id, ScoreboardEvent.kind, ScoreboardEvent.user_id) \
+            .filter(ScoreboardEvent.contest_id == contest.id, ScoreboardEvent.id > entry.event_id) \
+            .order_by(ScoreboardEvent.id) \
+            .all()
+        if not events or any(event.kind != "delta" for event in events):
+            return False
+        user_ids = {event.user_id for event in events}
+        entry.update(version, events[-1].id, contest.get_ranklist(user_ids=user_ids), user_ids)
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+ranklist_cache = RanklistCache(app.config['RANKLIST_CACHE_SIZE'], app.config['RANKLIST_CACHE_DIR'])
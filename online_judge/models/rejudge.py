@@ -0,0 +1,308 @@
+from online_judge import db
+from online_judge.models.contests import Contest, ContestUser, ContestUserProblem, ContestStanding
+from online_judge.models.problems import Problem
+from online_judge.models.progress import UserProblemProgress
+from online_judge.models.submissions import Submission, TestcaseResult
+from online_judge.models.judge_queue import JudgeTask
+from online_judge.models.archive import merge_tiers, submission_models
+from sqlalchemy import Enum
+from sqlalchemy import DateTime
+from sqlalchemy import update, func, case, select
+from datetime import datetime
+
+# 每批重置/入队的提交数
+REJUDGE_BATCH_SIZE = 500
+
+# 不计入题目提交数和比赛罚时的状态
+UNCOUNTED_STATUS = ("Pending", "CompileError", "SystemError")
+
+
+class RejudgeJob(db.Model):
+    """一次批量重测任务
+
+    创建时把匹配的提交分批重置为 Pending 并放入 practice 通道,
+    重测期间的写回不更新题目计数和比赛成绩;
+    最后一个任务完成时统一重算一次题目计数、用户做题进度和相关比赛的成绩。
+    已移入归档库的提交不重测,重算时按原结果计入。
+    """
+    __tablename__ = 'rejudge_job'
+
+    id = db.Column(db.Integer, primary_key=True)
+    problem_id = db.Column(db.Integer, nullable=True, index=True)
+    contest_id = db.Column(db.Integer, nullable=True, index=True)
+    user_id = db.Column(db.Integer)
+    state = db.Column(Enum("running", "done", name="rejudge_job_state"))
+    total = db.Column(db.Integer)
+    done = db.Column(db.Integer)
+
+    create_time = db.Column(DateTime)
+    finish_time = db.Column(DateTime)
+
+    def __init__(self, user_id, problem_id=None, contest_id=None):
+        self.user_id = user_id
+        self.problem_id = problem_id
+        self.contest_id = contest_id
+        self.state = "running"
+        self.total = 0
+        self.done = 0
+        self.create_time = datetime.now()
+
+    def __repr__(self):
+        return "<RejudgeJob id=%r done=%r/%r>" % (self.id, self.done, self.total)
+
+    def _submission_filter(self):
+        if self.problem_id is not None:
+            return Submission.problem_id == self.problem_id
+        return Submission.contest_id == self.contest_id
+
+    def to_dict(self, now=None):
+        """重测进度,eta_seconds 按已完成部分的平均速度估算"""
+        if not now:
+            now = datetime.now()
+        eta = None
+        if self.state == "done":
+            eta = 0
+        elif self.done:
+            elapsed = (now - self.create_time).total_seconds()
+            eta = elapsed / self.done * (self.total - self.done)
+        return {
+            "id": self.id,
+            "problem_id": self.problem_id,
+            "contest_id": self.contest_id,
+            "state": self.state,
+            "total": self.total,
+            "done": self.done,
+            "eta_seconds": eta,
+            "create_time": self.create_time.isoformat() if self.create_time else None,
+            "finish_time": self.finish_time.isoformat() if self.finish_time else None,
+        }
+
+    @staticmethod
+    def running_for(problem_id=None, contest_id=None):
+        return RejudgeJob.query.filter_by(problem_id=problem_id, contest_id=contest_id, state="running").first()
+
+    @staticmethod
+    def create(user_id, problem_id=None, contest_id=None, batch_size=REJUDGE_BATCH_SIZE):
+        """创建重测任务并把匹配的提交分批入队
+
+        只按批读取提交 id,不会把源代码加载到内存。每批单独提交事务,
+        worker 可以在后续批次入队的同时开始评测。
+
+        Args:
+            user_id (int): 发起者
+            problem_id (int, optional): 重测该题目的全部提交
+            contest_id (int, optional): 重测该比赛的全部提交
+            batch_size (int): 每批处理的提交数
+
+        Returns:
+            RejudgeJob: 新建的任务
+        """
+        job = RejudgeJob(user_id, problem_id=problem_id, contest_id=contest_id)
+        # 只重测发起时已有的提交;入队期间新到的提交走正常评测,不计入 total
+        max_id = db.session.query(func.max(Submission.id)).scalar() or 0
+        job.total = db.session.query(func.count(Submission.id)) \
+            .filter(job._submission_filter(), Submission.id <= max_id).scalar()
+        db.session.add(job)
+        db.session.commit()
+        job_id = job.id
+
+        last_id = 0
+        while True:
+            ids = [row.id for row in db.session.query(Submission.id)
+                   .filter(job._submission_filter(), Submission.id > last_id, Submission.id <= max_id)
+                   .order_by(Submission.id)
+                   .limit(batch_size)]
+            if not ids:
+                break
+            last_id = ids[-1]
+            RejudgeJob._enqueue_batch(job_id, ids)
+
+        if job.total == 0:
+            RejudgeJob.finalize(job_id)
+        return job
+
+    @staticmethod
+    def _enqueue_batch(job_id, submission_ids):
+        now = datetime.now()
+        db.session.execute(
+            update(Submission)
+            .where(Submission.id.in_(submission_ids))
+            .values(status="Pending", time_used=0, memory_used=0, compile_error_info="",
+                    data_version=select(Problem.data_version)
+                    .where(Problem.id == Submission.problem_id)
+                    .scalar_subquery())
+            .execution_options(synchronize_session=False)
+        )
+        TestcaseResult.query.filter(TestcaseResult.submission_id.in_(submission_ids)) \
+            .delete(synchronize_session=False)
+
+        existing = {row.submission_id for row in db.session.query(JudgeTask.submission_id)
+                    .filter(JudgeTask.submission_id.in_(submission_ids))}
+        db.session.execute(
+            update(JudgeTask)
+            .where(JudgeTask.submission_id.in_(existing))
+            .values(state="queued", lane="practice", rejudge_job_id=job_id, worker_id=None,
+                    lease_expires=None, attempts=0, compile_cache=None,
+                    enqueue_time=now, start_time=None, finish_time=None)
+            .execution_options(synchronize_session=False)
+        )
+        new_tasks = []
+        for submission_id in submission_ids:
+            if submission_id not in existing:
+                task = JudgeTask(submission_id, lane="practice")
+                task.rejudge_job_id = job_id
+                new_tasks.append(task)
+        db.session.bulk_save_objects(new_tasks)
+        db.session.commit()
+
+    @staticmethod
+    def task_done(job_id):
+        """记录一个重测任务完成,最后一个任务完成时统一重算统计
+
+        计数使用原子递增;只有把状态从 running 改为 done 成功的一方执行重算,
+        多个 worker 同时完成最后几个任务时也只重算一次。
+
+        Returns:
+            bool: 本次调用是否触发了重算
+        """
+        db.session.execute(
+            update(RejudgeJob)
+            .where(RejudgeJob.id == job_id)
+            .values(done=RejudgeJob.done + 1)
+        )
+        db.session.commit()
+        return RejudgeJob.finalize(job_id)
+
+    @staticmethod
+    def finalize(job_id):
+        result = db.session.execute(
+            update(RejudgeJob)
+            .where(RejudgeJob.id == job_id, RejudgeJob.state == "running", RejudgeJob.done >= RejudgeJob.total)
+            .values(state="done", finish_time=datetime.now())
+        )
+        if result.rowcount != 1:
+            db.session.commit()
+            return False
+
+        job = db.session.get(RejudgeJob, job_id)
+        scope = db.session.query(Submission.problem_id, Submission.contest_id) \
+            .filter(job._submission_filter()).distinct().all()
+        problem_ids = {problem_id for problem_id, _ in scope if problem_id is not None}
+        contest_ids = {contest_id for _, contest_id in scope if contest_id}
+        if job.contest_id is not None:
+            contest_ids.add(job.contest_id)
+
+        recompute_problem_counters(problem_ids)
+        recompute_user_progress(problem_ids)
+        for contest_id in contest_ids:
+            recompute_contest_scores(contest_id)
+            # 已结束的比赛在同一事务中重建最终成绩快照
+            contest = db.session.get(Contest, contest_id)
+            if contest is not None and contest.is_ended():
+                db.session.refresh(contest)
+                ContestStanding.snapshot(contest, commit=False)
+        db.session.commit()
+        return True
+
+
+def recompute_problem_counters(problem_ids):
+    """按提交记录(包括归档库)重算题目的提交数和通过数(不提交事务)"""
+    if not problem_ids:
+        return
+    counters = {}
+    for model in submission_models():
+        rows = db.session.query(
+            model.problem_id,
+            func.count(model.id),
+            func.sum(case((model.status == "Accepted", 1), else_=0)),
+        ).filter(model.problem_id.in_(problem_ids), model.status.notin_(UNCOUNTED_STATUS)) \
+            .group_by(model.problem_id) \
+            .all()
+        for problem_id, submit_num, accept_num in rows:
+            total_submit, total_accept = counters.get(problem_id, (0, 0))
+            counters[problem_id] = (total_submit + submit_num, total_accept + (accept_num or 0))
+    for problem_id in problem_ids:
+        submit_num, accept_num = counters.get(problem_id, (0, 0))
+        db.session.execute(
+            update(Problem)
+            .where(Problem.id == problem_id)
+            .values(submit_num=submit_num, accept_num=accept_num)
+        )
+
+
+def recompute_user_progress(problem_ids=None, user_id=None):
+    """按提交记录(包括归档库)重建用户做题进度(不提交事务)
+
+    Args:
+        problem_ids (set[int], optional): 只重建这些题目,为 None 时不限
+        user_id (int, optional): 只重建该用户,为 None 时不限
+
+    Returns:
+        int: 写入的进度行数
+    """
+    if problem_ids is not None and not problem_ids:
+        return 0
+    progress = {}
+    for model in submission_models():
+        query = db.session.query(
+            model.user_id,
+            model.problem_id,
+            func.count(model.id),
+            func.min(case((model.status == "Accepted", model.submit_time))),
+        ).filter(model.problem_id.isnot(None), model.status.notin_(UNCOUNTED_STATUS))
+        if problem_ids is not None:
+            query = query.filter(model.problem_id.in_(problem_ids))
+        if user_id is not None:
+            query = query.filter(model.user_id == user_id)
+        for row_user_id, problem_id, attempts, first_ac_time in query.group_by(model.user_id, model.problem_id):
+            key = (row_user_id, problem_id)
+            if key in progress:
+                total_attempts, total_first_ac = progress[key]
+                attempts += total_attempts
+                first_ac_time = min(filter(None, (first_ac_time, total_first_ac)), default=None)
+            progress[key] = (attempts, first_ac_time)
+
+    stale = UserProblemProgress.query
+    if problem_ids is not None:
+        stale = stale.filter(UserProblemProgress.problem_id.in_(problem_ids))
+    if user_id is not None:
+        stale = stale.filter(UserProblemProgress.user_id == user_id)
+    stale.delete(synchronize_session=False)
+    if progress:
+        db.session.connection().execute(
+            UserProblemProgress.__table__.insert(),
+            [{"user_id": row_user_id, "problem_id": problem_id, "attempts": attempts, "first_ac_time": first_ac_time}
+             for (row_user_id, problem_id), (attempts, first_ac_time) in progress.items()]
+        )
+    return len(progress)
+
+
+def contest_submission_rows(model, contest_id, end_time):
+    return db.session.query(model.id, model.user_id, model.problem_id, model.status, model.submit_time) \
+        .filter(model.contest_id == contest_id,
+                model.problem_id.isnot(None),
+                model.submit_time <= end_time,
+                model.status.notin_(UNCOUNTED_STATUS)) \
+        .order_by(model.submit_time, model.id)
+
+
+def recompute_contest_scores(contest_id):
+    """按比赛期间的提交记录(包括归档库)按时间顺序重放,重建所有参赛者的成绩(不提交事务)
+
+    只查询计算所需的列,不加载源代码。
+    """
+    contest_times = db.session.query(Contest.start_time, Contest.end_time) \
+        .filter(Contest.id == contest_id).first()
+    if contest_times is None:
+        return
+    score_details = {}
+    rows = merge_tiers(*(contest_submission_rows(model, contest_id, contest_times.end_time)
+                         for model in submission_models()),
+                       key=lambda row: (row.submit_time, row.id))
+    for row in rows:
+        details = score_details.setdefault(row.user_id, {})
+        ContestUser.apply_submission(details, row, contest_times.start_time)
+
+    participants = {user_id for user_id, in db.session.query(ContestUser.user_id).filter_by(contest_id=contest_id)}
+    ContestUserProblem.replace_contest(contest_id, {user_id: details for user_id, details in score_details.items()
+                                                    if user_id in participants})
@@ -0,0 +1,202 @@
+from online_judge import app, db
+from online_judge.models.contests import Contest, ContestUser, ContestProblemStat, ScoreboardEvent, assign_ranks, \
+    PENALTY_PER_ATTEMPT, ATTEMPT_HISTOGRAM_MAX
+from online_judge.models.ranklist_cache import RanklistEntry
+from online_judge.models.submissions import Submission
+from online_judge.models.rejudge import UNCOUNTED_STATUS
+from collections import deque
+from datetime import datetime, timedelta
+import time
+import threading
+
+
+def freeze_start(contest):
+    """封榜开始时间,SCOREBOARD_FREEZE_MINUTES 为 0 时不封榜,返回 None"""
+    minutes = app.config['SCOREBOARD_FREEZE_MINUTES']
+    if minutes <= 0:
+        return None
+    return contest.end_time - timedelta(minutes=minutes)
+
+
+def is_frozen(contest, now=None):
+    """当前是否处于封榜期间(封榜开始后、比赛结束前)"""
+    start = freeze_start(contest)
+    if start is None:
+        return False
+    if not now:
+        now = datetime.now()
+    return start <= now < contest.end_time
+
+
+def is_frozen_event(contest, event, now=None):
+    """增量事件是否由封榜期间的提交引起且尚未到公布时间"""
+    start = freeze_start(contest)
+    return event["kind"] == "delta" and start is not None and event["submit_time"] is not None \
+        and event["submit_time"] >= start and is_frozen(contest, now)
+
+
+class FrozenState:
+    """封榜时的排行榜和题目统计,由封榜前的提交重放得到"""
+
+    def __init__(self, freeze_start, event_id, entry, stats):
+        self.freeze_start = freeze_start
+        self.event_id = event_id  # 已检查过的最新事件 id
+        self.entry = entry        # RanklistEntry,支持分页和名次查询
+        self.stats = stats        # 格式同 ContestProblemStat.for_contest
+
+
+_frozen_states = {}  # contest_id -> FrozenState
+_frozen_lock = threading.Lock()
+
+
+def frozen_stats(contest, problem_ids, score_details):
+    """按封榜前的成绩计算各题目统计,格式与 ContestProblemStat.for_contest 相同"""
+    stats = []
+    for problem_id in problem_ids:
+        rows = [details[str(problem_id)] for details in score_details.values() if str(problem_id) in details]
+        solved = [row for row in rows if row["solve_time"] != -1]
+        stat = ContestProblemStat(contest_id=contest.id, problem_id=problem_id, tried_count=len(rows),
+                                  solved_count=len(solved),
+                                  submission_count=sum(row["attempts"] for row in rows) + len(solved),
+                                  solve_time_sum=sum(int(row["solve_time"]) for row in solved))
+        histogram = {}
+        for row in solved:
+            bucket = str(min(row["attempts"], ATTEMPT_HISTOGRAM_MAX))
+            histogram[bucket] = histogram.get(bucket, 0) + 1
+        if solved:
+            first = min(solved, key=lambda row: (row["solve_time"], row["first_ac_submission"]))
+            stat.first_solve_user_id = first["user_id"]
+            stat.first_solve_time = int(first["solve_time"])
+            stat.first_solve_submission_id = first["first_ac_submission"]
+        stats.append(stat.to_dict(histogram))
+    return stats
+
+
+def affects_frozen_view(contest_id, start, after_id, until_id):
+    """(after_id, until_id] 之间是否有改变封榜视图的事件: reset 事件或封榜前提交的评测结果"""
+    return db.session.query(ScoreboardEvent.id) \
+        .filter(ScoreboardEvent.contest_id == contest_id,
+                ScoreboardEvent.id > after_id, ScoreboardEvent.id <= until_id,
+                db.or_(ScoreboardEvent.kind != "delta", ScoreboardEvent.submit_time.is_(None),
+                       ScoreboardEvent.submit_time < start)) \
+        .first() is not None
+
+
+def frozen_state(contest):
+    """封榜时的排行榜和题目统计: 按时间顺序重放封榜前的提交
+
+    结果按比赛缓存,所有请求和订阅者共用一份。封榜后提交的评测结果不影响封榜视图,
+    只有 reset 事件和封榜前提交的评测结果(如积压的评测、重测)才会使缓存失效,
+    因此封榜期间每次请求只需检查上次之后新增的事件。
+    """
+    start = freeze_start(contest)
+    latest = ScoreboardFeed.latest_id(contest.id)
+    with _frozen_lock:
+        cached = _frozen_states.get(contest.id)
+    if cached is not None and cached.freeze_start == start:
+        if cached.event_id == latest or not affects_frozen_view(contest.id, start, cached.event_id, latest):
+            with _frozen_lock:
+                cached.event_id = max(cached.event_id, latest)
+            return cached
+
+    problem_ids = contest.get_problems()
+    user_ids = [user_id for user_id, in db.session.query(ContestUser.user_id)
+                .filter(ContestUser.contest_id == contest.id)]
+    score_details = {user_id: {} for user_id in user_ids}
+    rows = db.session.query(Submission.id, Submission.user_id, Submission.problem_id, Submission.status,
+                            Submission.submit_time) \
+        .filter(Submission.contest_id == contest.id,
+                Submission.problem_id.isnot(None),
+                Submission.submit_time < start,
+                Submission.status.notin_(UNCOUNTED_STATUS)) \
+        .order_by(Submission.submit_time, Submission.id)
+    for row in rows:
+        if row.user_id in score_details:
+            ContestUser.apply_submission(score_details[row.user_id], row, contest.start_time)
+
+    contest_problems = {str(problem_id) for problem_id in problem_ids}
+    ranklist = []
+    for user_id in user_ids:
+        details = {pid: {"solve_time": int(detail["solve_time"]), "attempts": detail["attempts"]}
+                   for pid, detail in score_details[user_id].items()}
+        solved = [detail for pid, detail in details.items() if pid in contest_problems and detail["solve_time"] != -1]
+        ranklist.append({
+            "user_id": user_id,
+            "score": len(solved),
+            "penalty": sum(detail["solve_time"] + detail["attempts"] * PENALTY_PER_ATTEMPT for detail in solved),
+            "score_details": details,
+        })
+        for detail in score_details[user_id].values():
+            detail["user_id"] = user_id
+    # 同分同罚时按 user_id 排列,与 get_ranklist 一致
+    ranklist = assign_ranks(sorted(ranklist, key=lambda row: (-row["score"], row["penalty"], row["user_id"])))
+    state = FrozenState(start, latest, RanklistEntry(latest, ranklist),
+                        frozen_stats(contest, problem_ids, score_details))
+    with _frozen_lock:
+        _frozen_states[contest.id] = state
+    return state
+
+
+def frozen_ranklist(contest):
+    """封榜时的排行榜"""
+    return frozen_state(contest).entry.ranklist
+
+
+class ScoreboardFeed:
+    """按比赛共享的排行榜事件读取
+
+    同一比赛的所有订阅者共用一份最近事件的缓冲区,每个 poll_interval 内只查询一次数据库;
+    订阅者的游标早于缓冲区时直接查询数据库。每个比赛有自己的锁,不同比赛的查询互不阻塞。
+    """
+
+    def __init__(self, poll_interval=1.0, buffer_size=1000):
+        self.poll_interval = poll_interval
+        self.buffer_size = buffer_size
+        self._lock = threading.Lock()  # 只保护 _contests 字典本身
+        self._contests = {}  # contest_id -> {"lock", "floor", "last_id", "fetched_at", "events"}
+
+    @staticmethod
+    def latest_id(contest_id):
+        return db.session.query(db.func.max(ScoreboardEvent.id)) \
+            .filter(ScoreboardEvent.contest_id == contest_id).scalar() or 0
+
+    @staticmethod
+    def _query(contest_id, after_id):
+        events = []
+        for event in ScoreboardEvent.query.filter(ScoreboardEvent.contest_id == contest_id,
+                                                  ScoreboardEvent.id > after_id) \
+                .order_by(ScoreboardEvent.id):
+            data = event.to_dict()
+            data["submit_time"] = event.submit_time
+            events.append(data)
+        return events
+
+    def events_after(self, contest_id, after_id):
+        """返回 id 大于 after_id 的事件(按 id 升序)
+
+        Returns:
+            list[dict]: ScoreboardEvent.to_dict() 并附带 submit_time
+        """
+        with self._lock:
+            state = self._contests.get(contest_id)
+            if state is None:
+                state = {"lock": threading.Lock(), "floor": after_id, "last_id": after_id, "fetched_at": None,
+                         "events": deque(maxlen=self.buffer_size)}
+                self._contests[contest_id] = state
+        with state["lock"]:
+            now = time.monotonic()
+            if after_id >= state["floor"] and \
+                    (state["fetched_at"] is None or now - state["fetched_at"] >= self.poll_interval):
+                for event in self._query(contest_id, state["last_id"]):
+                    if len(state["events"]) == state["events"].maxlen:
+                        state["floor"] = state["events"][0]["event_id"]
+                    state["events"].append(event)
+                    state["last_id"] = event["event_id"]
+                state["fetched_at"] = now
+            if after_id >= state["floor"]:
+                return [event for event in state["events"] if event["event_id"] > after_id]
+        # 游标早于缓冲区,不占用比赛的锁直接查询
+        return self._query(contest_id, after_id)
+
+
+scoreboard_feed = ScoreboardFeed(app.config['SCOREBOARD_POLL_INTERVAL'])
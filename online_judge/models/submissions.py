@@ -1,14 +1,29 @@
 from online_judge import db
-from online_judge.models.contests import Contest,ContestUser
+from online_judge.models.contests import Contest,ContestUser,contest_problem
 from online_judge.models.problems import Problem
+from online_judge.models.progress import UserProblemProgress
 from sqlalchemy import Enum
 from sqlalchemy import DateTime
+from sqlalchemy import update, select, and_, null
+from sqlalchemy.orm import deferred, undefer_group, joinedload
+from sqlalchemy import event
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from datetime import datetime, timedelta
+import hashlib
 import time
+import zlib
+
+# 源代码的 zlib 压缩级别
+SOURCE_COMPRESS_LEVEL = 6
 
 
 class Submission(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    code = db.Column(db.Text)
+    # 源代码按 code_hash 压缩存放在 source_blob 表,相同代码只存一份,通过 code 属性透明读写;
+    # code 列只保存迁移前的旧数据(code_size 为空的行),新提交不再写入
+    _code = deferred(db.Column("code", db.Text), group="source")
+    code_size = db.Column(db.Integer, nullable=True)  # 源代码的 UTF-8 字节数
+    # 源代码和编译信息默认延迟加载,只有详情接口和评测机通过 get_with_source 读取
     language = db.Column(Enum("cpp","python", name="language_type"))
     user_id = db.Column(db.Integer, index=True)
     problem_id = db.Column(db.Integer, db.ForeignKey("problem.id"), index=True)
@@ -19,10 +34,27 @@ class Submission(db.Model):
         "RuntimeError","SystemError","CompileError", name="status_type"))
     time_used = db.Column(db.Float)
     memory_used = db.Column(db.Integer)
-    compile_error_info = db.Column(db.Text)
+    compile_error_info = deferred(db.Column(db.Text), group="source")
+
+    code_hash = db.Column(db.String(64))
+    data_version = db.Column(db.Integer, default=0)  # 提交时题目的测试数据版本
+
+    blob = db.relationship("SourceBlob", primaryjoin="foreign(Submission.code_hash) == SourceBlob.hash",
+                           viewonly=True, lazy="select")
+
+    __table_args__ = (
+        db.Index('idx_submission_dedup', 'user_id', 'problem_id', 'code_hash'),
+        # 筛选接口按 (submit_time, id) 倒序分页,常用的筛选组合都以 submit_time 结尾,
+        # SQLite 索引隐含 rowid(即 id),游标位置和排序都可以直接从索引读取
+        db.Index('idx_submission_user_problem', 'user_id', 'problem_id', 'submit_time'),
+        db.Index('idx_submission_contest_user', 'contest_id', 'user_id', 'submit_time'),
+        db.Index('idx_submission_problem_status', 'problem_id', 'status', 'submit_time'),
+        db.Index('idx_submission_submit_time', 'submit_time'),
+    )
 
-    def __init__(self, code, language, user_id, problem_id, contest_id, submit_time):
+    def __init__(self, code, language, user_id, problem_id, contest_id, submit_time, data_version=0):
         self.code = code
+        self.data_version = data_version
         self.language = language
         self.user_id = user_id
         self.problem_id = problem_id
@@ -41,30 +73,316 @@ class Submission(db.Model):
         db.session.add(self)
         db.session.commit()
 
-    def update_result_from_pending(self, status, time_used=0, memory_used=0,ce_info=""):
+    @property
+    def code(self):
+        source = getattr(self, "_source", None)
+        if source is not None:  # 本对象设置过源代码(可能尚未写入数据库)
+            return source
+        if self.code_size is None:  # 迁移前的旧数据
+            return self._code
+        return self.blob.text if self.blob is not None else None
+
+    @code.setter
+    def code(self, code):
+        # 插入提交前由 before_insert 事件写入 source_blob
+        self._source = code
+        self.code_hash = Submission.hash_code(code)
+        self.code_size = len(code.encode('utf-8'))
+
+    @staticmethod
+    def get_with_source(submission_id):
+        """按ID读取提交,同一条查询中加载源代码和编译信息
+
+        其他查询只读取元数据列,访问 code/compile_error_info 时才会单独查询。
+        """
+        return db.session.get(Submission, submission_id,
+                              options=[undefer_group("source"), joinedload(Submission.blob)])
+
+    @staticmethod
+    def migrate_sources(batch_size=500):
+        """把 submission.code 中的旧源代码分批移入 source_blob,并清空 code 列
+
+        可以重复执行,已迁移的行(code 为空)不会再读取。
+
+        Returns:
+            dict: {"submissions": 迁移的提交数, "inline_bytes": 原来内联存放的字节数,
+                   "blobs": 新增的 blob 数, "blob_bytes": 新增 blob 压缩后的字节数}
+        """
+        report = {"submissions": 0, "inline_bytes": 0, "blobs": 0, "blob_bytes": 0}
+        code_column = Submission.__table__.c.code
+        last_id = 0
+        while True:
+            rows = db.session.query(Submission.id, code_column) \
+                .filter(Submission.id > last_id, code_column.isnot(None)) \
+                .order_by(Submission.id) \
+                .limit(batch_size) \
+                .all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+            for submission_id, code in rows:
+                data = code.encode('utf-8')
+                blob = SourceBlob.compress(code)
+                if SourceBlob.store(blob):
+                    report["blobs"] += 1
+                    report["blob_bytes"] += len(blob["data"])
+                db.session.execute(
+                    update(Submission)
+                    .where(Submission.id == submission_id)
+                    .values(_code=None, code_hash=blob["hash"], code_size=len(data))
+                    .execution_options(synchronize_session=False)
+                )
+                report["submissions"] += 1
+                report["inline_bytes"] += len(data)
+            db.session.commit()
+        return report
+
+    @staticmethod
+    def hash_code(code):
+        return hashlib.sha256(code.encode('utf-8')).hexdigest()
+
+    def update_result_from_pending(self, status, time_used=0, memory_used=0,ce_info="", update_stats=True,
+                                   context=None):
+        """写回评测结果
+
+        提交记录、题目计数、用户做题进度和比赛成绩在同一个事务中更新并只提交一次。
+        计数使用 ``SET x = x + 1`` 的原子更新,多个评测进程并发写回时不会丢失;
+        提交记录使用 ``WHERE status = 'Pending'`` 的条件更新,保证同一提交只写回一次。
+        所有查询都放在写操作之前,缩短 SQLite 写锁的持有时间。
+
+        update_stats 为 False 时只写提交记录,题目计数、做题进度和比赛成绩由调用方统一重算(批量重测)。
+        context 为提交时解析的 AdmissionContext,传入时不再查询比赛和参赛者;
+        否则用一条联表查询取得。
+        """
         if self.status != "Pending":
             raise ValueError(f"the submission has been updated,error id={self.id}")
+        judged = status not in ("CompileError", "SystemError")
+        counted = update_stats and judged
+
+        # 先完成所有读取
+        count_contest = False
+        if counted and self.contest_id and self.problem_id is not None:
+            if context is None:
+                context = AdmissionContext.for_submission(self)
+            if context.contest_found and self.submit_time.replace(tzinfo=None) <= context.contest_end_time:
+                if not context.is_participant:
+                    raise IndexError(f"Contest-User is incorrect id={self.id},contest_id={self.contest_id},user_id={self.user_id}")
+                count_contest = True
+
+        values = {"status": status, "time_used": time_used, "memory_used": memory_used}
+        if not judged:
+            values["compile_error_info"] = ce_info
+        # ORM 批量更新会同步会话中 self 的属性
+        result = db.session.execute(
+            update(Submission)
+            .where(Submission.id == self.id, Submission.status == "Pending")
+            .values(**values)
+        )
+        if result.rowcount != 1:
+            db.session.rollback()
+            raise ValueError(f"the submission has been updated,error id={self.id}")
+
+        if counted:
+            #update problems info
+            db.session.execute(
+                update(Problem)
+                .where(Problem.id == self.problem_id)
+                .values(submit_num=Problem.submit_num + 1,
+                        accept_num=Problem.accept_num + (1 if status == "Accepted" else 0))
+            )
+            if self.problem_id is not None:
+                UserProblemProgress.record_verdict(self.user_id, self.problem_id, status == "Accepted",
+                                                   self.submit_time)
+            #update contests info
+            if count_contest:
+                ContestUser.record_verdict(self.contest_id, self.user_id, self,
+                                           contest_start_time=context.contest_start_time)
+
+        db.session.commit()
+
+
+class SourceBlob(db.Model):
+    """按内容寻址的源代码存储,主键为源代码的 SHA-256(与 submission.code_hash 相同)
+
+    data 为 zlib 压缩后的 UTF-8 源代码;重复提交、模板代码等相同内容只保存一份。
+    """
+    __tablename__ = 'source_blob'
+
+    hash = db.Column(db.String(64), primary_key=True)
+    size = db.Column(db.Integer)  # 压缩前的字节数
+    data = db.Column(db.LargeBinary)
+
+    def __repr__(self):
+        return "<SourceBlob %r size=%r>" % (self.hash, self.size)
+
+    @property
+    def text(self):
+        return zlib.decompress(self.data).decode('utf-8')
+
+    @staticmethod
+    def compress(code):
+        """返回可直接插入 source_blob 的列值"""
+        data = code.encode('utf-8')
+        return {"hash": hashlib.sha256(data).hexdigest(), "size": len(data),
+                "data": zlib.compress(data, SOURCE_COMPRESS_LEVEL)}
+
+    @staticmethod
+    def store(blob, connection=None):
+        """写入一个 blob,已存在相同内容时忽略(不提交事务)
+
+        Returns:
+            bool: 是否新写入
+        """
+        statement = sqlite_insert(SourceBlob).values(**blob).on_conflict_do_nothing(index_elements=["hash"])
+        return (connection or db.session).execute(statement).rowcount == 1
+
+
+@event.listens_for(Submission, "before_insert")
+def store_submission_source(mapper, connection, submission):
+    """插入提交前把源代码写入 source_blob,与提交在同一事务中"""
+    source = getattr(submission, "_source", None)
+    if source is not None:
+        SourceBlob.store(SourceBlob.compress(source), connection)
+
+
+class AdmissionContext:
+    """一次提交所需的题目、比赛和参赛者信息
+
+    提交接口用一条联表查询解析出全部信息完成合法性检查,并原样交给评测结果写回,
+    写回时不再重新查询比赛和参赛者。
+    """
+
+    def __init__(self, user_id, problem_id, contest_id, problem_found=False, problem_is_public=False,
+                 data_version=0, contest_start_time=None, contest_end_time=None, is_participant=False,
+                 in_contest=False, duplicate_id=None):
+        self.user_id = user_id
+        self.problem_id = problem_id
+        self.contest_id = contest_id or 0
+        self.problem_found = problem_found
+        self.problem_is_public = problem_is_public
+        self.data_version = data_version
+        self.contest_start_time = contest_start_time
+        self.contest_end_time = contest_end_time
+        self.is_participant = is_participant
+        self.in_contest = in_contest
+        self.duplicate_id = duplicate_id
+
+    @property
+    def contest_found(self):
+        return self.contest_start_time is not None
+
+    @staticmethod
+    def resolve(user_id, problem_id, contest_id=0, code_hash=None, language=None, submit_time=None,
+                dedup_window=0):
+        """一条查询解析题目可见性、参赛资格、比赛时段、题目是否属于比赛以及去重窗口内的相同提交
+
+        Args:
+            user_id (int): 提交者
+            problem_id (int): 题目ID
+            contest_id (int): 比赛ID,0 表示练习
+            code_hash, language, submit_time: 去重查找所需的信息
+            dedup_window (int): 去重窗口(秒),0 表示不查找相同提交
+
+        Returns:
+            AdmissionContext | None: 题目不存在时返回 None
+        """
+        duplicate = null()
+        if dedup_window > 0:
+            submit_time = submit_time.replace(tzinfo=None)
+            # 同一用户对同一题目、同一测试数据版本的相同代码的已出结果提交;
+            # SystemError 不是代码本身的结果,不参与去重
+            duplicate = select(Submission.id).where(
+                Submission.user_id == user_id,
+                Submission.problem_id == Problem.id,
+                Submission.code_hash == code_hash,
+                Submission.language == language,
+                Submission.data_version == Problem.data_version,
+                Submission.status.notin_(("Pending", "SystemError")),
+                Submission.submit_time >= submit_time - timedelta(seconds=dedup_window),
+                Submission.submit_time <= submit_time,
+            ).order_by(Submission.id.desc()).limit(1).scalar_subquery()
+
+        row = db.session.query(
+            Problem.is_public, Problem.data_version, Contest.start_time, Contest.end_time,
+            ContestUser.id.label("contest_user_id"), contest_problem.c.problem_id.label("in_contest"),
+            duplicate.label("duplicate_id"),
+        ).select_from(Problem) \
+            .outerjoin(Contest, Contest.id == (contest_id or 0)) \
+            .outerjoin(ContestUser, and_(ContestUser.contest_id == Contest.id, ContestUser.user_id == user_id)) \
+            .outerjoin(contest_problem, and_(contest_problem.c.contest_id == Contest.id,
+                                             contest_problem.c.problem_id == Problem.id)) \
+            .filter(Problem.id == problem_id) \
+            .first()
+        if row is None:
+            return None
+        return AdmissionContext(user_id, problem_id, contest_id, problem_found=True,
+                                problem_is_public=bool(row.is_public), data_version=row.data_version or 0,
+                                contest_start_time=row.start_time, contest_end_time=row.end_time,
+                                is_participant=row.contest_user_id is not None,
+                                in_contest=row.in_contest is not None, duplicate_id=row.duplicate_id)
+
+    @staticmethod
+    def for_submission(submission):
+        """评测 worker 写回时只需要比赛时段和参赛资格,一条查询取得"""
+        row = db.session.query(Contest.start_time, Contest.end_time, ContestUser.id.label("contest_user_id")) \
+            .outerjoin(ContestUser, and_(ContestUser.contest_id == Contest.id,
+                                         ContestUser.user_id == submission.user_id)) \
+            .filter(Contest.id == submission.contest_id) \
+            .first()
+        if row is None:
+            return AdmissionContext(submission.user_id, submission.problem_id, submission.contest_id)
+        return AdmissionContext(submission.user_id, submission.problem_id, submission.contest_id,
+                                contest_start_time=row.start_time, contest_end_time=row.end_time,
+                                is_participant=row.contest_user_id is not None)
+
+    def is_running(self, now=None):
+        """与 Contest.is_running 相同,供 JudgeTask.lane_for 使用"""
+        if not self.contest_found:
+            return False
+        if not now:
+            now = datetime.now()
+        return self.contest_start_time <= now and now <= self.contest_end_time
+
+
+class TestcaseResult(db.Model):
+    """单个测试点的评测结果,由评测机的结构化输出逐条写入"""
+    __tablename__ = 'testcase_result'
+
+    id = db.Column(db.Integer, primary_key=True)
+    submission_id = db.Column(db.Integer, db.ForeignKey("submission.id"), index=True)
+    case_index = db.Column(db.Integer)
+    status = db.Column(db.String(32))
+    time_used = db.Column(db.Float)      # 单位：ms
+    memory_used = db.Column(db.Integer)  # 单位：bytes
+
+    __table_args__ = (
+        db.UniqueConstraint('submission_id', 'case_index', name='uq_testcase_result_case'),
+    )
+
+    def __init__(self, submission_id, case_index, status, time_used=0, memory_used=0):
+        self.submission_id = submission_id
+        self.case_index = case_index
         self.status = status
         self.time_used = time_used
         self.memory_used = memory_used
-        if(self.status == "CompileError" or self.status == "SystemError"):
-            self.compile_error_info = ce_info
-            self.save()
-            return
-        #update problems info
-        problem = Problem.query.filter_by(id=self.problem_id).first()
-        problem.submit_num += 1
-        if self.status == "Accepted":
-            problem.accept_num += 1
-        problem.save()
-        self.save()
-        #update contests info
-
-        if self.contest_id is None or self.contest_id == 0:
-            return
-        contest_end_time = Contest.query.filter_by(id=self.contest_id).first().end_time
-        if self.problem_id != None and self.submit_time <= contest_end_time:
-            contestuser = ContestUser.query.filter_by(contest_id=self.contest_id,user_id=self.user_id).first()
-            if contestuser is None:
-                raise IndexError(f"Contest-User is incorrect id={self.id},contest_id={self.contest_id},user_id={self.user_id}")
-            contestuser.update_score(self)
+
+    def __repr__(self):
+        return "<TestcaseResult submission_id=%r case=%r status=%r>" % \
+               (self.submission_id, self.case_index, self.status)
+
+    def to_dict(self):
+        return {
+            "case_index": self.case_index,
+            "status": self.status,
+            "time_used": self.time_used,
+            "memory_used": self.memory_used,
+        }
+
+    @staticmethod
+    def clear(submission_id):
+        TestcaseResult.query.filter_by(submission_id=submission_id).delete(synchronize_session=False)
+
+    @staticmethod
+    def for_submission(submission_id):
+        return TestcaseResult.query.filter_by(submission_id=submission_id) \
+            .order_by(TestcaseResult.case_index).all()
@@ -253,7 +253,7 @@ class ContestAPITestCase(unittest.TestCase):
         resp = self.client.post('/api/contest/get_contest_user_solved_problem/1',
                             headers=self.get_headers('user'))
         self.assertEqual(resp.status_code, 200)
-        self.assertListEqual(resp.json, [])
+        self.assertListEqual(resp.json, [1])
     def test_get_contest_users_success(self):
         """测试成功获取比赛用户列表"""
         # 发送请求获取比赛1的用户
@@ -0,0 +1,117 @@
+import unittest
+from datetime import datetime
+from unittest import mock
+from sqlalchemy import update, insert
+from online_judge import db,app
+from online_judge.models import Contest, Problem, Submission, ContestUser, ContestStanding, RejudgeJob
+
+class User:
+    def __init__(self,id,username,power):
+        self.id=id
+        self.username=username
+        self.power=power
+
+class ContestStandingTestCase(unittest.TestCase):
+    def setUp(self):
+        app.config['TESTING'] = True
+
+        self.app_context = app.app_context()
+        self.app_context.push()
+        db.drop_all()
+        db.create_all()
+        self.setup_test_data()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def setup_test_data(self):
+        self.users = [User(id=1, username='admin', power=2)]
+        # 比赛1、2已结束,比赛3尚未结束
+        for title, end_time in [("Finished", datetime(2025, 1, 2, 8, 0, 0)),
+                                ("Finished 2", datetime(2025, 1, 2, 8, 0, 0)),
+                                ("Running", datetime(2100, 1, 1, 8, 0, 0))]:
+            db.session.add(Contest(title=title, start_time=datetime(2025, 1, 1, 8, 0, 0), end_time=end_time,
+                                   holder_id=1, holder_name="admin"))
+        db.session.add(Problem(title="Problem 1", statement="Statement", user_id=1, user_name="admin",
+                               difficulty=1, is_public=True))
+        for contest_id in (1, 2, 3):
+            db.session.add(ContestUser(contest_id=contest_id, user_id=2))
+            db.session.add(ContestUser(contest_id=contest_id, user_id=3))
+        db.session.commit()
+
+        for contest_id in (1, 2, 3):
+            Contest.query.filter_by(id=contest_id).first().update_problems(problem_ids=[1], current_user=self.users[0])
+
+    def _judge(self, status, user_id=2, contest_id=1):
+        submission = Submission(code="code", language="cpp", user_id=user_id, problem_id=1, contest_id=contest_id,
+                                submit_time=datetime(2025, 1, 1, 9, 0, 0))
+        submission.save()
+        submission.update_result_from_pending(status)
+
+    def _standings(self, contest_id):
+        with mock.patch.object(Contest, 'get_ranklist', autospec=True, side_effect=Contest.get_ranklist) as computed:
+            standings = Contest.query.filter_by(id=contest_id).first().get_standings()
+        return standings, computed.call_count
+
+    # 测试用例分割线 --------------------------------------------------------
+
+    def test_snapshot_after_end(self):
+        """比赛结束后第一次读取生成快照,之后直接读取快照"""
+        self._judge("Accepted", user_id=3)
+        standings, computed = self._standings(1)
+        self.assertEqual(computed, 1)
+        self.assertEqual([(row['rank'], row['user_id'], row['score']) for row in standings], [(1, 3, 1), (2, 2, 0)])
+        self.assertIsNotNone(db.session.get(ContestStanding, 1))
+
+        self.assertEqual(self._standings(1), (standings, 0))
+
+        # 未结束的比赛不生成快照
+        self.assertEqual(self._standings(3)[1], 1)
+        self.assertIsNone(db.session.get(ContestStanding, 3))
+
+    def test_concurrent_snapshot(self):
+        """快照已被其他请求写入时覆盖而不是主键冲突,较旧版本的快照不覆盖较新的"""
+        self._judge("Accepted")
+        contest = Contest.query.filter_by(id=1).first()
+        version = contest.ranklist_version
+        # 绕过会话写入,模拟另一个请求在本请求查询之后插入了快照
+        db.session.execute(insert(ContestStanding).values(contest_id=1, version=version - 1, standings="[]",
+                                                          create_time=datetime.now()))
+        standings = ContestStanding.snapshot(contest)
+        self.assertEqual(ContestStanding.load(contest), standings)
+
+        stale = mock.Mock(id=1, ranklist_version=version - 1, get_ranklist=lambda: [])
+        ContestStanding.snapshot(stale)
+        self.assertEqual(ContestStanding.load(contest), standings)
+
+    def test_rejudge_rebuilds_snapshot(self):
+        """重测完成时重建已结束比赛的快照"""
+        self._judge("Accepted")
+        self.assertEqual(self._standings(1)[0][0]['score'], 1)
+
+        job = RejudgeJob.create(user_id=1, contest_id=1)
+        job_id = job.id
+        # 跳过实际评测: 提交保持重置后的 Pending 状态,重算后不再计分
+        db.session.execute(update(RejudgeJob).where(RejudgeJob.id == job_id).values(done=RejudgeJob.total))
+        db.session.commit()
+        self.assertTrue(RejudgeJob.finalize(job_id))
+
+        standing = db.session.get(ContestStanding, 1)
+        self.assertEqual(standing.version, Contest.query.filter_by(id=1).first().ranklist_version)
+        standings, computed = self._standings(1)
+        self.assertEqual(computed, 0)
+        self.assertEqual([row['score'] for row in standings], [0, 0])
+
+    def test_backfill(self):
+        """回填只处理已结束且没有有效快照的比赛"""
+        self.assertEqual(ContestStanding.backfill(), 2)
+        self.assertEqual(ContestStanding.backfill(), 0)
+
+        self._judge("WrongAnswer", contest_id=2)
+        self.assertEqual(ContestStanding.backfill(), 1)
+        self.assertIsNone(db.session.get(ContestStanding, 3))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -19,6 +19,8 @@ class CreateProblemTestCase(unittest.TestCase):
         load_dotenv('.env')       # 可选的额外加载
 
         app.config['TESTING'] = True
+        self.old_judge_inline = app.config['JUDGE_INLINE']
+        app.config['JUDGE_INLINE'] = True  # 提交后直接评测,便于断言结果
         self.client = app.test_client()
         # 初始化数据库扩展
         
@@ -43,6 +45,7 @@ class CreateProblemTestCase(unittest.TestCase):
         
         # 释放应用上下文
         self.app_context.pop()
+        app.config['JUDGE_INLINE'] = self.old_judge_inline
 
 
     def setup_test_data(self):
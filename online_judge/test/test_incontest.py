@@ -1,4 +1,5 @@
 import unittest,json,io,zipfile
+from unittest import mock
 from datetime import datetime,timedelta
 from flask import Flask
 from dotenv import load_dotenv
@@ -19,6 +20,8 @@ class InContestTestCase(unittest.TestCase):
         load_dotenv('.env')       # 可选的额外加载
 
         app.config['TESTING'] = True
+        self.old_judge_inline = app.config['JUDGE_INLINE']
+        app.config['JUDGE_INLINE'] = True  # 提交后直接评测,便于断言结果
         self.client = app.test_client()
         # 初始化数据库扩展
         
@@ -43,6 +46,7 @@ class InContestTestCase(unittest.TestCase):
         
         # 释放应用上下文
         self.app_context.pop()
+        app.config['JUDGE_INLINE'] = self.old_judge_inline
 
 
     def setup_test_data(self):
@@ -121,6 +125,10 @@ class InContestTestCase(unittest.TestCase):
     # 辅助方法
     def get_headers(self, token_key):
         return {'token': self.tokens[token_key]}
+
+    def at(self, now):
+        """比赛提交以服务器时间为准,模拟在 now 时提交"""
+        return mock.patch('online_judge.api.problem.submit.server_time', return_value=now)
     
     # 测试用例分割线 --------------------------------------------------------
 
@@ -131,13 +139,13 @@ class InContestTestCase(unittest.TestCase):
             'contest_id': 1,
             'code': 'a, b = map(int, input().split())\nprint(a+b)',
             'language': 'python',
-            'submit_time': datetime(2025, 1, 1, 9, 0, 0)  
         }
         
         # 用户首次提交AC
-        resp = self.client.post('/api/problem/submit', 
-                              json=data, 
-                              headers=self.get_headers('user'))
+        with self.at(datetime(2025, 1, 1, 9, 0, 0)):
+            resp = self.client.post('/api/problem/submit', 
+                                  json=data, 
+                                  headers=self.get_headers('user'))
         
         self.assertEqual(resp.status_code, 200)
         # 验证分数记录
@@ -156,22 +164,22 @@ class InContestTestCase(unittest.TestCase):
     def test_multiple_attempts_before_ac(self):
         """测试多次错误后正确提交的罚时计算"""
         # 第一次WA提交
-        self.client.post('/api/problem/submit', json={
-            'problem_id': 1,
-            'contest_id': 1,
-            'code': 'print(1+2)',  # 错误代码
-            'language': 'python',
-            'submit_time': datetime(2025, 1, 1, 8, 0, 0)  
-        }, headers=self.get_headers('user'))
+        with self.at(datetime(2025, 1, 1, 8, 0, 0)):
+            self.client.post('/api/problem/submit', json={
+                'problem_id': 1,
+                'contest_id': 1,
+                'code': 'print(1+2)',  # 错误代码
+                'language': 'python',
+            }, headers=self.get_headers('user'))
         
         # 第二次AC提交
-        resp2 = self.client.post('/api/problem/submit', json={
-            'problem_id': 1,
-            'contest_id': 1,
-            'code': 'a, b = map(int, input().split())\nprint(a+b)',
-            'language': 'python',
-            'submit_time': datetime(2025, 1, 1, 9, 0, 0)  
-        }, headers=self.get_headers('user'))
+        with self.at(datetime(2025, 1, 1, 9, 0, 0)):
+            resp2 = self.client.post('/api/problem/submit', json={
+                'problem_id': 1,
+                'contest_id': 1,
+                'code': 'a, b = map(int, input().split())\nprint(a+b)',
+                'language': 'python',
+            }, headers=self.get_headers('user'))
         
         submission_id =resp2.json.get('submission_id')
         submission =  Submission.query.filter_by(id=submission_id).first()
@@ -189,23 +197,22 @@ class InContestTestCase(unittest.TestCase):
     def test_ranking_order(self):
         """测试多个用户的排行榜排序"""
         # 用户2提交AC
-        self.client.post('/api/problem/submit', json={
-            'problem_id': 1,
-            'contest_id': 1,
-            'code': 'a, b = map(int, input().split())\nprint(a+b)',
-            'language': 'python',
-            'submit_time': datetime(2025, 1, 1, 10, 0, 0)  
-
-        }, headers=self.get_headers('user'))
+        with self.at(datetime(2025, 1, 1, 10, 0, 0)):
+            self.client.post('/api/problem/submit', json={
+                'problem_id': 1,
+                'contest_id': 1,
+                'code': 'a, b = map(int, input().split())\nprint(a+b)',
+                'language': 'python',
+            }, headers=self.get_headers('user'))
         
         # 用户1提交AC（更早时间）
-        self.client.post('/api/problem/submit', json={
-            'problem_id': 1,
-            'contest_id': 1,
-            'code': 'a, b = map(int, input().split())\nprint(a+b)',
-            'language': 'python',
-            'submit_time': datetime(2025, 1, 1, 9, 0, 0)  # 提前1小时提交
-        }, headers=self.get_headers('admin'))
+        with self.at(datetime(2025, 1, 1, 9, 0, 0)):  # 提前1小时提交
+            self.client.post('/api/problem/submit', json={
+                'problem_id': 1,
+                'contest_id': 1,
+                'code': 'a, b = map(int, input().split())\nprint(a+b)',
+                'language': 'python',
+            }, headers=self.get_headers('admin'))
         
         ranklist = Contest.query.filter_by(id=1).first().get_ranklist()
         
@@ -217,13 +224,13 @@ class InContestTestCase(unittest.TestCase):
     def test_compile_error_handling(self):
         """测试编译错误不计入尝试次数"""
         # 提交包含语法错误的代码
-        self.client.post('/api/problem/submit', json={
-            'problem_id': 1,
-            'contest_id': 1,
-            'code': 'print("missing parenthesis"',
-            'language': 'cpp',
-            'submit_time': datetime(2025, 1, 1, 9, 0, 0) 
-        }, headers=self.get_headers('user'))
+        with self.at(datetime(2025, 1, 1, 9, 0, 0)):
+            self.client.post('/api/problem/submit', json={
+                'problem_id': 1,
+                'contest_id': 1,
+                'code': 'print("missing parenthesis"',
+                'language': 'cpp',
+            }, headers=self.get_headers('user'))
         
         contest_user = ContestUser.query.filter_by(contest_id=1, user_id=2).first()
         details = contest_user.get_score_details()
@@ -233,23 +240,24 @@ class InContestTestCase(unittest.TestCase):
         self.assertEqual(contest_user.calculate_score([1])[0], 0)
 
     def test_submission_outside_contest_time(self):
-        """测试比赛时间外的提交不计分"""
-        # 提交时间设置为比赛结束后
-        with app.test_request_context():
+        """测试比赛时间外的提交被拒绝且不计分,客户端伪造的提交时间不被采用"""
+        # 比赛结束后提交,客户端声称在比赛期间提交
+        with app.test_request_context(), self.at(datetime(2025, 1, 3, 8, 0, 0)):
             data = {
                 'problem_id': 1,
                 'contest_id': 1,
                 'code': 'a, b = map(int, input().split())\nprint(a+b)',
                 'language': 'python',
-                'submit_time': datetime(2025, 1, 3, 8, 0, 0)  # 比赛结束后
+                'submit_time': 'Wed, 01 Jan 2025 09:00:00 GMT'
             }
             
             resp = self.client.post('/api/problem/submit', 
                                   json=data, 
                                   headers=self.get_headers('user'))
             
-            submission = Submission.query.filter_by(id=resp.json['submission_id']).first()
-            self.assertEqual(submission.status, 'Accepted')
+            self.assertEqual(resp.status_code, 404)
+            self.assertEqual(resp.json['error'], "the contest is not running")
+            self.assertEqual(Submission.query.count(), 0)
             
             # 验证分数未更新
             contest_user = ContestUser.query.filter_by(contest_id=1, user_id=2).first()
@@ -0,0 +1,135 @@
+import unittest,os,sys,stat,tempfile,shutil,subprocess
+from datetime import datetime
+from online_judge import db,app
+from online_judge.models import Problem, Submission, JudgeTask, TestcaseResult
+from online_judge.judge import JudgerDaemon, judge_inline, judger_binary, stop_judger_daemon
+
+# 模拟常驻评测机: 逐行读取任务,源文件名中含 crash/hang 时分别模拟崩溃和卡死
+FAKE_JUDGER_SERVE = '''
+import sys, os, json, time
+assert sys.argv[1:] == ["serve", "--output-format", "jsonl"]
+for line in sys.stdin:
+    job = json.loads(line)
+    if "crash" in job["src_path"]:
+        sys.exit(3)
+    if "hang" in job["src_path"]:
+        time.sleep(60)
+    print(json.dumps({"type": "testcase", "index": 1, "status": "Accepted", "time_ms": 1.0, "memory_bytes": 64}), flush=True)
+    print(json.dumps({"type": "summary", "status": "Accepted", "time_ms": 1.0, "memory_bytes": 64,
+                      "pid": os.getpid(), "src_path": job["src_path"]}), flush=True)
+'''
+
+class JudgerDaemonTestCase(unittest.TestCase):
+    def setUp(self):
+        app.config['TESTING'] = True
+        self.old_config = {key: app.config[key] for key in
+                           ('JUDGER_DAEMON', 'JUDGER_PROFILE', 'JUDGER_BINARY', 'COMPILE_CACHE_DIR')}
+        self.old_judger_path = os.environ.get('JUDGER_PATH')
+        app.config['JUDGER_PROFILE'] = 'release'
+        app.config['JUDGER_BINARY'] = ''
+        app.config['COMPILE_CACHE_DIR'] = ''
+        self.judger_dir = tempfile.mkdtemp()
+        os.environ['JUDGER_PATH'] = self.judger_dir
+
+        self.binary = os.path.join(self.judger_dir, 'target', 'release', 'judger')
+        os.makedirs(os.path.dirname(self.binary))
+        with open(self.binary, 'w') as f:
+            f.write(f"#!{sys.executable}\n{FAKE_JUDGER_SERVE}")
+        os.chmod(self.binary, os.stat(self.binary).st_mode | stat.S_IEXEC)
+
+        self.app_context = app.app_context()
+        self.app_context.push()
+        db.drop_all()
+        db.create_all()
+
+    def tearDown(self):
+        stop_judger_daemon()
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        app.config.update(self.old_config)
+        if self.old_judger_path is None:
+            os.environ.pop('JUDGER_PATH')
+        else:
+            os.environ['JUDGER_PATH'] = self.old_judger_path
+        shutil.rmtree(self.judger_dir, ignore_errors=True)
+
+    def _run(self, daemon, src_path="submission_1.cpp", timeout=10):
+        cases = []
+        summary = daemon.run_job({"problem_slug": "1", "language": "cpp", "src_path": src_path},
+                                 cases.append, timeout=timeout)
+        self.assertEqual(len(cases), 1)
+        return summary
+
+    # 测试用例分割线 --------------------------------------------------------
+
+    def test_binary_path_is_configurable(self):
+        """评测机路径由 JUDGER_PROFILE/JUDGER_BINARY 决定"""
+        self.assertEqual(judger_binary(), self.binary)
+        app.config['JUDGER_BINARY'] = '/opt/judger/bin/judger'
+        self.assertEqual(judger_binary(), '/opt/judger/bin/judger')
+
+    def test_process_reused_and_recycled(self):
+        """多个任务复用同一进程,达到 max_jobs 后重启"""
+        daemon = JudgerDaemon(self.binary, self.judger_dir, max_jobs=2)
+        try:
+            first = self._run(daemon)
+            second = self._run(daemon)
+            third = self._run(daemon)
+        finally:
+            daemon.stop()
+        self.assertEqual(first['status'], 'Accepted')
+        self.assertEqual(first['pid'], second['pid'])
+        self.assertNotEqual(second['pid'], third['pid'])
+
+    def test_crash_and_timeout_restart(self):
+        """评测机崩溃或超时后,下一个任务使用新的进程"""
+        daemon = JudgerDaemon(self.binary, self.judger_dir)
+        try:
+            first = self._run(daemon)
+            with self.assertRaises(subprocess.CalledProcessError):
+                daemon.run_job({"problem_slug": "1", "language": "cpp", "src_path": "crash.cpp"}, print)
+            second = self._run(daemon)
+            with self.assertRaises(subprocess.TimeoutExpired):
+                daemon.run_job({"problem_slug": "1", "language": "cpp", "src_path": "hang.cpp"}, print,
+                               timeout=0.5)
+            third = self._run(daemon)
+        finally:
+            daemon.stop()
+        self.assertEqual(len({first['pid'], second['pid'], third['pid']}), 3)
+
+    def test_callback_error_discards_process(self):
+        """写回测试点出错时丢弃进程,下一个任务不会读到上一个任务剩余的输出"""
+        def fail(record):
+            raise RuntimeError("database is locked")
+
+        daemon = JudgerDaemon(self.binary, self.judger_dir)
+        try:
+            first = self._run(daemon, src_path="submission_1.cpp")
+            with self.assertRaises(RuntimeError):
+                daemon.run_job({"problem_slug": "1", "language": "cpp", "src_path": "submission_2.cpp"}, fail)
+            third = self._run(daemon, src_path="submission_3.cpp")
+        finally:
+            daemon.stop()
+        self.assertEqual(third['src_path'], "submission_3.cpp")
+        self.assertNotEqual(first['pid'], third['pid'])
+
+    def test_judge_uses_daemon(self):
+        """开启 JUDGER_DAEMON 后评测通过常驻评测机完成"""
+        app.config['JUDGER_DAEMON'] = True
+        db.session.add(Problem(title="Problem 1", statement="Statement 1", user_id=1, user_name="admin",
+                               difficulty=1, is_public=True))
+        submission = Submission(code="int main(){}", language="cpp", user_id=2, problem_id=1, contest_id=0,
+                                submit_time=datetime.now())
+        db.session.add(submission)
+        db.session.flush()
+        JudgeTask.enqueue(submission.id, commit=False)
+        db.session.commit()
+        submission_id = submission.id
+
+        judge_inline(submission_id)
+        self.assertEqual(Submission.query.filter_by(id=submission_id).first().status, 'Accepted')
+        self.assertEqual(len(TestcaseResult.for_submission(submission_id)), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -449,5 +449,13 @@ class ProblemAPITestCase(unittest.TestCase):
         self.assertEqual(response.status_code, 404)
         self.assertIn("题目正在被比赛使用中", response.json["error"])
 
+    def test_contest_problem_membership(self):
+        """测试按关联表查询题目是否属于比赛"""
+        self.assertTrue(Contest.contains_problem(1, 1))
+        self.assertFalse(Contest.contains_problem(2, 1))
+        self.assertFalse(Contest.contains_problem(999, 1))
+        self.assertTrue(Contest.is_problem_used(1))
+        self.assertFalse(Contest.is_problem_used(999))
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
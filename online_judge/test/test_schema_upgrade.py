@@ -0,0 +1,96 @@
+import unittest
+from sqlalchemy import inspect, text
+from online_judge import db,app
+from online_judge.models import Contest
+from online_judge.click.migrate import upgrade_schema
+
+# 旧版本数据库中没有的列
+LEGACY_MISSING_COLUMNS = {
+    "contest": ["ranklist_version"],
+    "problem": ["data_version"],
+    "submission": ["code_hash", "code_size", "data_version"],
+}
+
+class SchemaUpgradeTestCase(unittest.TestCase):
+    def setUp(self):
+        app.config['TESTING'] = True
+
+        self.app_context = app.app_context()
+        self.app_context.push()
+        db.drop_all()
+        db.create_all()
+        self.make_legacy_schema()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def make_legacy_schema(self):
+        """删除新增的列(及其上的索引),模拟升级前的数据库"""
+        inspector = inspect(db.engine)
+        with db.engine.begin() as connection:
+            for table, columns in LEGACY_MISSING_COLUMNS.items():
+                for index in inspector.get_indexes(table):
+                    if set(index["column_names"]) & set(columns):
+                        connection.execute(text(f'DROP INDEX "{index["name"]}"'))
+                for column in columns:
+                    connection.execute(text(f'ALTER TABLE "{table}" DROP COLUMN "{column}"'))
+            # 旧版本的 contest_user 没有唯一索引,可能有重复记录
+            connection.execute(text('DROP INDEX "uq_contest_user"'))
+            connection.execute(text(
+                "INSERT INTO problem (title, statement, user_id, user_name, difficulty, is_public, submit_num,"
+                " accept_num) VALUES ('Problem 1', 'Statement', 1, 'admin', 1, 1, 0, 0)"))
+            connection.execute(text(
+                "INSERT INTO contest (title, start_time, end_time, holder_id, holder_name)"
+                " VALUES ('Old Contest', '2025-01-01 08:00:00', '2025-01-01 13:00:00', 1, 'admin')"))
+            connection.execute(text(
+                "INSERT INTO contest_user (contest_id, user_id, score_details) VALUES (1, 2, :details)"),
+                {"details": '{"1": {"solve_time": 60, "attempts": 1, "first_ac_submission": 1}}'})
+            connection.execute(text("INSERT INTO contest_user (contest_id, user_id, score_details) VALUES (1, 2, '{}')"))
+            connection.execute(text(
+                "INSERT INTO submission (code, language, user_id, problem_id, contest_id, submit_time, status)"
+                " VALUES ('int main(){}', 'cpp', 2, 1, 0, '2025-01-01 09:00:00', 'Accepted')"))
+
+    # 测试用例分割线 --------------------------------------------------------
+
+    def test_upgrade_adds_missing_columns(self):
+        """为旧数据库补充新增的列并写入默认值,可以重复执行"""
+        added = upgrade_schema()
+        self.assertEqual(sorted(added), sorted(f"{table}.{column}" for table, columns
+                                               in LEGACY_MISSING_COLUMNS.items() for column in columns))
+        self.assertEqual(upgrade_schema(), [])
+
+        with db.engine.connect() as connection:
+            self.assertEqual(connection.execute(text("SELECT data_version FROM problem")).scalar(), 0)
+            self.assertEqual(connection.execute(text("SELECT ranklist_version FROM contest")).scalar(), 0)
+            row = connection.execute(text("SELECT data_version, code_hash, code_size FROM submission")).one()
+            self.assertEqual(tuple(row), (0, None, None))
+
+    def test_upgrade_creates_contest_user_index(self):
+        """升级后删除重复的参赛记录并建立唯一索引,导入参赛者可以直接使用"""
+        upgrade_schema()
+        self.assertIn("uq_contest_user", {index["name"] for index in inspect(db.engine).get_indexes("contest_user")})
+
+        contest = db.session.get(Contest, 1)
+        contest.add_users([2, 3])
+        self.assertEqual(sorted(contest.get_current_users()), [2, 3])
+
+    def test_migrate_commands_on_legacy_database(self):
+        """迁移命令可以直接在旧数据库上执行"""
+        runner = app.test_cli_runner()
+        result = runner.invoke(args=["migrate_score_details"])
+        self.assertEqual(result.exit_code, 0, result.output)
+        result = runner.invoke(args=["migrate_sources"])
+        self.assertEqual(result.exit_code, 0, result.output)
+
+        with db.engine.connect() as connection:
+            self.assertEqual(connection.execute(text("SELECT ranklist_version FROM contest")).scalar(), 1)
+            row = connection.execute(text(
+                "SELECT problem_id, solve_time, attempts FROM contest_user_problem")).one()
+            self.assertEqual(tuple(row), (1, 60, 1))
+            row = connection.execute(text("SELECT code, code_size FROM submission")).one()
+            self.assertEqual(tuple(row), (None, len("int main(){}")))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+import unittest
+from datetime import datetime
+from sqlalchemy import event
+from online_judge import db,app
+from online_judge.models import Contest, Problem, Submission, ContestUser
+
+class User:
+    def __init__(self,id,username,power):
+        self.id=id
+        self.username=username
+        self.power=power
+
+class VerdictWritebackTestCase(unittest.TestCase):
+    def setUp(self):
+        app.config['TESTING'] = True
+
+        self.app_context = app.app_context()
+        self.app_context.push()
+        db.drop_all()
+        db.create_all()
+        self.setup_test_data()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def setup_test_data(self):
+        self.users = [User(id=1, username='admin', power=2)]
+        db.session.add(Contest(
+            title="Admin's Contest",
+            start_time=datetime(2025, 1, 1, 8, 0, 0),
+            end_time=datetime(2025, 1, 2, 8, 0, 0),
+            holder_id=1,
+            holder_name="admin"
+        ))
+        db.session.add(Problem(title="Problem 1", statement="Statement 1", user_id=1, user_name="admin",
+                               difficulty=1, is_public=True))
+        db.session.add(ContestUser(contest_id=1, user_id=2))
+        db.session.commit()
+
+        contest1 = Contest.query.filter_by(id = 1).first()
+        contest1.update_problems(problem_ids=[1],current_user=self.users[0])
+
+    def _create_submission(self, submit_time, contest_id=1):
+        submission = Submission(code="code", language="cpp", user_id=2, problem_id=1, contest_id=contest_id,
+                                submit_time=submit_time)
+        submission.save()
+        return submission
+
+    def _count_commits(self, func):
+        commits = []
+        listener = lambda session: commits.append(1)
+        event.listen(db.session, "after_commit", listener)
+        try:
+            func()
+        finally:
+            event.remove(db.session, "after_commit", listener)
+        return len(commits)
+
+    # 测试用例分割线 --------------------------------------------------------
+
+    def test_contest_verdict_single_commit(self):
+        """比赛提交的结果写回只提交一次事务"""
+        wrong = self._create_submission(datetime(2025, 1, 1, 9, 0, 0))
+        accepted = self._create_submission(datetime(2025, 1, 1, 10, 0, 0))
+
+        self.assertEqual(self._count_commits(lambda: wrong.update_result_from_pending("WrongAnswer")), 1)
+        self.assertEqual(self._count_commits(lambda: accepted.update_result_from_pending("Accepted")), 1)
+
+        problem = Problem.query.filter_by(id=1).first()
+        self.assertEqual(problem.submit_num, 2)
+        self.assertEqual(problem.accept_num, 1)
+
+        details = ContestUser.query.filter_by(contest_id=1, user_id=2).first().get_score_details()
+        self.assertEqual(details['1']['attempts'], 1)
+        self.assertEqual(details['1']['solve_time'], 120)
+        self.assertEqual(Submission.query.filter_by(id=accepted.id).first().status, 'Accepted')
+
+    def test_compile_error_not_counted(self):
+        """编译错误不计入题目提交数和比赛罚时"""
+        submission = self._create_submission(datetime(2025, 1, 1, 9, 0, 0))
+        submission.update_result_from_pending("CompileError", ce_info="src.cpp: error")
+
+        self.assertEqual(Problem.query.filter_by(id=1).first().submit_num, 0)
+        self.assertEqual(ContestUser.query.filter_by(contest_id=1, user_id=2).first().get_score_details(), {})
+        self.assertEqual(Submission.query.filter_by(id=submission.id).first().compile_error_info, "src.cpp: error")
+
+    def test_counters_use_atomic_increment(self):
+        """计数基于数据库当前值递增,不会覆盖其他进程的更新"""
+        submission = self._create_submission(datetime(2025, 1, 1, 9, 0, 0), contest_id=0)
+        Problem.query.filter_by(id=1).first()  # 会话中缓存一个旧的题目对象
+
+        # 模拟另一个评测进程已经写回了一次结果
+        db.session.execute(db.text("UPDATE problem SET submit_num = 5, accept_num = 3 WHERE id = 1"))
+        db.session.commit()
+
+        submission.update_result_from_pending("Accepted")
+        problem = Problem.query.filter_by(id=1).first()
+        self.assertEqual(problem.submit_num, 6)
+        self.assertEqual(problem.accept_num, 4)
+
+    def test_double_writeback_rejected(self):
+        """同一提交只能写回一次,并发写回时后到者失败"""
+        submission = self._create_submission(datetime(2025, 1, 1, 9, 0, 0))
+        self.assertEqual(submission.status, "Pending")
+
+        # 另一个评测进程抢先写回了结果,本会话里的对象仍认为提交处于Pending
+        with db.engine.begin() as conn:
+            conn.execute(db.text("UPDATE submission SET status = 'Accepted' WHERE id = :id"),
+                         {"id": submission.id})
+
+        with self.assertRaises(ValueError):
+            submission.update_result_from_pending("WrongAnswer")
+
+        self.assertEqual(Problem.query.filter_by(id=1).first().submit_num, 0)
+        self.assertEqual(Submission.query.filter_by(id=submission.id).first().status, 'Accepted')
+        self.assertEqual(ContestUser.query.filter_by(contest_id=1, user_id=2).first().get_score_details(), {})
+
+if __name__ == '__main__':
+    unittest.main()